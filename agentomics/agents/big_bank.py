@@ -7,32 +7,25 @@ bank for macroeconomic simulations
 
 Author: Akhil Karra
 """
+import textwrap
+
 import langroid as lr
-import langroid.language_models as lm
 
 from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.prompt_format import (
+    DEFAULT_PROMPT_FORMAT,
+    PromptFormat,
+    render_state,
+)
 from agentomics.tools.big_bank_knobs import ResultBigBankKnobsTool
-
-
-class BigBank(lr.ChatAgent):
-    """Definition of a BigBank agent with access to a tool to set its knobs
-    after receiving inputs on economic conditions and behaviors on other banks"""
-    def __init__(self, config: lr.ChatAgentConfig):
-        super().__init__(config)
-        self.config = config
-        self.enable_message(ResultBigBankKnobsTool)
-
-
-def make_big_bank_task(model: str):
-    """Given the name of a local or hosted LLM, instantiate a BigBank task
-    to set up and connect the BigBank agent with its custom result tool"""
-    llm_config = lm.OpenAIGPTConfig(
-        chat_model=model or lm.OpenAIChatModel.GPT4o,
-        chat_context_length=131072
-    )
-    central_bank_config = lr.ChatAgentConfig(
-        llm=llm_config,
-        system_message="""You are BigBank, a large commercial bank working
+from agentomics.tools.repair import RepairingChatAgent
+from agentomics.tools.structured_output import (
+    structured_llm_config,
+    structured_output_instructions,
+)
+from agentomics.utils.logging import use_run_logs_dir
+
+SYSTEM_MESSAGE = """You are BigBank, a large commercial bank working
         with all kinds of clients from individuals of all economic well-beings
         to companies, corporations, and governments of various sizes and
         economic standings. You reside in a hypothetical country named
@@ -49,14 +42,53 @@ def make_big_bank_task(model: str):
         to analyze the current economic conditions and behavior of the other
         banks and come up with your own game plan on:
             1) what your new loan-to-deposit ratio will be and
-            2) what your new deposit interest rate will be.
+            2) what your new deposit interest rate will be."""
+
+# Free-text answer protocol, replaced by the JSON schema instructions under
+# structured output
+FREE_TEXT_INSTRUCTIONS = """
 
         When you are ready with these new measures, say the word "DONE" and use the `ResultBigBankKnobsTool`
         in the specified JSON format to give your new loan-to-deposit ratio and your new deposit interest rate. IMPORTANT: Make sure to give the heading
         `TOOL: result_big_bank_knobs_tool` to ensure the tool is used properly.
         """
+
+# Static preamble of every prompt. It comes before the variable state so
+# that the system message and preamble form a byte-identical prefix
+PROMPT_PREFIX = textwrap.dedent("""\
+    Below is the latest data. economic_variables is the header
+    given to the series that represent different economic variables over the
+    last quarters. central_bank_knobs is the header given to the series that
+    represent the different knobs that the central bank has manipulated in
+    the past. big_bank_knobs is the header given to the series that
+    represent the different knobs you, BigBank, have manipulated in the past. small_bank_knobs is the header given to the series
+    that represent the different knobs that a small commercial bank has manipulated in the past.
+    Analyze this new data and make your new decisions.
+""")
+
+
+class BigBank(RepairingChatAgent):
+    """Definition of a BigBank agent with access to a tool to set its knobs
+    after receiving inputs on economic conditions and behaviors on other banks"""
+    result_tool_cls = ResultBigBankKnobsTool
+
+    def __init__(self, config: lr.ChatAgentConfig, structured_output: bool = False):
+        super().__init__(config)
+        self.config = config
+        self.enable_message(ResultBigBankKnobsTool, force=structured_output and self._fn_call_available())
+
+
+def make_big_bank_task(model: str, structured_output: bool = False):
+    """Given the name of a local or hosted LLM, instantiate a BigBank task
+    to set up and connect the BigBank agent with its custom result tool.
+    With `structured_output`, the agent answers through function calling or
+    JSON mode instead of free text"""
+    llm_config = structured_llm_config(model, structured_output)
+    central_bank_config = lr.ChatAgentConfig(
+        llm=llm_config,
+        system_message=SYSTEM_MESSAGE + (structured_output_instructions(ResultBigBankKnobsTool) if structured_output else FREE_TEXT_INSTRUCTIONS)
     )
-    big_bank_agent = BigBank(central_bank_config)
+    big_bank_agent = BigBank(central_bank_config, structured_output)
     big_bank_task = lr.Task(
         big_bank_agent,
         "BigBank",
@@ -67,18 +99,9 @@ def make_big_bank_task(model: str):
     return big_bank_task
 
 
-def run_state(model_name, globals: ThreeBankGlobalState) -> ResultBigBankKnobsTool | None:
-    prompt = f"""Here is the latest data. economic_variables is the header
-    given to the series that represent different economic variables over the
-    last quarters. central_bank_knobs is the header given to the series that
-    represent the different knobs that the central bank has manipulated in
-    the past. big_bank_knobs is the header given to the series that
-    represent the different knobs you, BigBank, have manipulated in the past. small_bank_knobs is the header given to the series
-    that represent the different knobs that a small commercial bank has manipulated in the past.
-    {globals.print_subfields()}
-    Now analyze this new data and make your new decisions.
-    """
-    big_bank_task = make_big_bank_task(model_name)
+def run_state(model_name, globals: ThreeBankGlobalState, prompt_format: PromptFormat | None = DEFAULT_PROMPT_FORMAT, structured_output: bool = False) -> ResultBigBankKnobsTool | None:
+    prompt = PROMPT_PREFIX + render_state(globals, prompt_format)
+    big_bank_task = use_run_logs_dir(make_big_bank_task(model_name, structured_output=structured_output))
     return big_bank_task.run(prompt)
 
 
@@ -6,33 +6,25 @@ Specification for a CentralBank agent and task to define a central banking
 authority of a fictional country for macroeconomic simulations
 """
 
+import textwrap
+
 import langroid as lr
-import langroid.language_models as lm
 
 from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.prompt_format import (
+    DEFAULT_PROMPT_FORMAT,
+    PromptFormat,
+    render_state,
+)
 from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
-
-
-class CentralBank(lr.ChatAgent):
-    """Definition of a CentralBank agent with access to a tool to set its knobs
-    after receiving inputs on economic conditions and behaviors on other banks"""
-    def __init__(self, config: lr.ChatAgentConfig):
-        super().__init__(config)
-        self.config = config
-        self.enable_message(ResultCentralBankKnobsTool)
-
-
-def make_central_bank_task(model: str):
-    """Given the name of a local or hosted LLM, instantiate a CentralBank
-    task to set up and connect the CentralBank agent with its custom result
-    tool"""
-    llm_config = lm.OpenAIGPTConfig(
-        chat_model=model or lm.OpenAIChatModel.GPT4o,
-        chat_context_length=131072
-    )
-    central_bank_config = lr.ChatAgentConfig(
-        llm=llm_config,
-        system_message="""You are CentralBank, a
+from agentomics.tools.repair import RepairingChatAgent
+from agentomics.tools.structured_output import (
+    structured_llm_config,
+    structured_output_instructions,
+)
+from agentomics.utils.logging import use_run_logs_dir
+
+SYSTEM_MESSAGE = """You are CentralBank, a
         well-designed and comprehensive central banking authority for a
         country named Country X (which is a hypothetical country), which
         has an ideal and well-functioning government which believes in
@@ -46,11 +38,51 @@ def make_central_bank_task(model: str):
         banks and come up with your own game plan on:
             1) what your new target interest rate will be and
             2) what your new percent change in  securities holdings will be
-        Report your percentages in decimals, please.
+        Report your percentages in decimals, please."""
+
+# Free-text answer protocol, replaced by the JSON schema instructions under
+# structured output
+FREE_TEXT_INSTRUCTIONS = """
 
         When you are ready with these new measures, say the word "DONE" and use the `ResultCentralBankKnobsTool` in the specified JSON format to give your new target interest rate and your new total securities holdings. IMPORTANT: Make sure to give the heading `TOOL: result_central_bank_knobs_tool` to ensure the tool is used properly."""
+
+# Static preamble of every prompt. It comes before the variable state so
+# that the system message and preamble form a byte-identical prefix
+PROMPT_PREFIX = textwrap.dedent("""\
+    Below is the latest data. economic_variables is the header
+    given to the series that represent different economic variables over the
+    last quarters. central_bank_knobs is the header given to the series that
+    represent the different knobs that, you CentralBank, have manipulated in
+    the past. big_bank_knobs is the header given to the series that
+    represent the different knobs that a representative large commercial
+    bank can manipulate. small_bank_knobs is the header given to the series
+    that represent the different knobs that a small commercial bank has manipulated in the past.
+    Analyze this new data and make your new decision on the new target interest rate and your new total securities holdings.
+""")
+
+
+class CentralBank(RepairingChatAgent):
+    """Definition of a CentralBank agent with access to a tool to set its knobs
+    after receiving inputs on economic conditions and behaviors on other banks"""
+    result_tool_cls = ResultCentralBankKnobsTool
+
+    def __init__(self, config: lr.ChatAgentConfig, structured_output: bool = False):
+        super().__init__(config)
+        self.config = config
+        self.enable_message(ResultCentralBankKnobsTool, force=structured_output and self._fn_call_available())
+
+
+def make_central_bank_task(model: str, structured_output: bool = False):
+    """Given the name of a local or hosted LLM, instantiate a CentralBank
+    task to set up and connect the CentralBank agent with its custom result
+    tool. With `structured_output`, the agent answers through function
+    calling or JSON mode instead of free text"""
+    llm_config = structured_llm_config(model, structured_output)
+    central_bank_config = lr.ChatAgentConfig(
+        llm=llm_config,
+        system_message=SYSTEM_MESSAGE + (structured_output_instructions(ResultCentralBankKnobsTool) if structured_output else FREE_TEXT_INSTRUCTIONS)
     )
-    central_bank_agent = CentralBank(central_bank_config)
+    central_bank_agent = CentralBank(central_bank_config, structured_output)
     central_bank_task = lr.Task(
         central_bank_agent,
         "CentralBank",
@@ -61,19 +93,9 @@ def make_central_bank_task(model: str):
     return central_bank_task
 
 
-def run_state(model_name, globals: ThreeBankGlobalState) -> ResultCentralBankKnobsTool | None:
-    prompt = f"""Here is the latest data. economic_variables is the header
-    given to the series that represent different economic variables over the
-    last quarters. central_bank_knobs is the header given to the series that
-    represent the different knobs that, you CentralBank, have manipulated in
-    the past. big_bank_knobs is the header given to the series that
-    represent the different knobs that a representative large commercial
-    bank can manipulate. small_bank_knobs is the header given to the series
-    that represent the different knobs that a small commercial bank has manipulated in the past.
-    {globals.print_subfields()}
-    Now analyze this new data and make your new decision on the new target interest rate and your new total securities holdings.
-    """
-    central_bank_task = make_central_bank_task(model_name)
+def run_state(model_name, globals: ThreeBankGlobalState, prompt_format: PromptFormat | None = DEFAULT_PROMPT_FORMAT, structured_output: bool = False) -> ResultCentralBankKnobsTool | None:
+    prompt = PROMPT_PREFIX + render_state(globals, prompt_format)
+    central_bank_task = use_run_logs_dir(make_central_bank_task(model_name, structured_output=structured_output))
     return central_bank_task.run(prompt)
 
 
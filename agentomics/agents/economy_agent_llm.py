@@ -8,43 +8,25 @@ for macroeconomic simulations
 Author: Akhil Karra
 """
 
+import textwrap
+
 import langroid as lr
-import langroid.language_models as lm
 
 from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.prompt_format import (
+    DEFAULT_PROMPT_FORMAT,
+    PromptFormat,
+    render_state,
+)
 from agentomics.tools.econ_vars_tool import ResultEconVarsTool
-
-
-class EconomyAgent(lr.ChatAgent):
-    """Definition of an EconomyAgent agent with access to a tool to set the
-    economic variables after receiving inputs on the behaviors of all banks
-    in response to previous settings of the economic variables"""
-    def __init__(self, config: lr.ChatAgentConfig):
-        super().__init__(config)
-        self.config = config
-        self.enable_message(ResultEconVarsTool)
-
-    # def handle_message_fallback(self, _: str | lr.ChatDocument) -> str:
-    #     return f"""You may have either not used the `final_answer_tool` or
-    #     you may have tried to use it but you didn't format the JSON correctly.
-
-    #     Please note that to return your new decision, you MUST format your
-    #     new target loan-to-deposit ratio and new deposit interest rate using
-    #     the `ResultEconVarsTool` in the specified JSON format. Otherwise I will
-    #     not be able to properly parse this information. Thank you."""
-
-
-def make_economy_agent_llm_task(model: str):
-    """Given the name of a local or hosted LLM, instantiate an EconomyAgent
-    task to set up and connect the EconomyAgent agent with its custom result
-    tool"""
-    llm_config = lm.OpenAIGPTConfig(
-        chat_model=model or lm.OpenAIChatModel.GPT4o,
-        chat_context_length=131072
-    )
-    economy_agent_config = lr.ChatAgentConfig(
-        llm=llm_config,
-        system_message="""You are EconomyAgent and you specialize in
+from agentomics.tools.repair import RepairingChatAgent
+from agentomics.tools.structured_output import (
+    structured_llm_config,
+    structured_output_instructions,
+)
+from agentomics.utils.logging import use_run_logs_dir
+
+SYSTEM_MESSAGE = """You are EconomyAgent and you specialize in
         simulating the economic conditions of Country X, a
         hypothetical country. Country X believes in capitalism and free markets.
         The Government of Country X is a well-functioning, ideal government who
@@ -63,13 +45,54 @@ def make_economy_agent_llm_task(model: str):
             1) what the gdp growth rate percent change will be
             2) what the unemployment rate will be
             3) what the new inflation rate will be
-        Report your percentage answers as decimals.
+        Report your percentage answers as decimals."""
+
+# Free-text answer protocol, replaced by the JSON schema instructions under
+# structured output
+FREE_TEXT_INSTRUCTIONS = """
 
         When you are ready with these new measures, SAY THE WORD "DONE" and use the `ResultEconVarsTool`
         in the specified JSON format to give your new loan-to-deposit ratio and your new deposit interest rate. IMPORTANT: Make sure to give the heading
         `TOOL: result_econ_vars_tool` to ensure the tool is used properly. Thank you!"""
+
+# Static preamble of every prompt. It comes before the variable state so
+# that the system message and preamble form a byte-identical prefix
+PROMPT_PREFIX = textwrap.dedent("""\
+    Below is the latest data. economic_variables is the header
+    given to the series that represent different economic variables over the
+    last quarters. central_bank_knobs is the header given to the series that
+    represent the different knobs that the central bank has manipulated in
+    the past. big_bank_knobs is the header given to the series that
+    represent the different knobs a representative large commercial bank have manipulated in the past. small_bank_knobs is the header given to the series
+    that represent the different knobs that a representative small commercial bank has manipulated in the past. Any N/A value indicates a value that is
+    not availablefor that particular quarter.
+    Analyze this new data and make your new predictions.
+""")
+
+
+class EconomyAgent(RepairingChatAgent):
+    """Definition of an EconomyAgent agent with access to a tool to set the
+    economic variables after receiving inputs on the behaviors of all banks
+    in response to previous settings of the economic variables"""
+    result_tool_cls = ResultEconVarsTool
+
+    def __init__(self, config: lr.ChatAgentConfig, structured_output: bool = False):
+        super().__init__(config)
+        self.config = config
+        self.enable_message(ResultEconVarsTool, force=structured_output and self._fn_call_available())
+
+
+def make_economy_agent_llm_task(model: str, structured_output: bool = False):
+    """Given the name of a local or hosted LLM, instantiate an EconomyAgent
+    task to set up and connect the EconomyAgent agent with its custom result
+    tool. With `structured_output`, the agent answers through function
+    calling or JSON mode instead of free text"""
+    llm_config = structured_llm_config(model, structured_output)
+    economy_agent_config = lr.ChatAgentConfig(
+        llm=llm_config,
+        system_message=SYSTEM_MESSAGE + (structured_output_instructions(ResultEconVarsTool) if structured_output else FREE_TEXT_INSTRUCTIONS)
     )
-    economy_agent = EconomyAgent(economy_agent_config)
+    economy_agent = EconomyAgent(economy_agent_config, structured_output)
     economy_agent_task = lr.Task(
         economy_agent,
         "EconomyAgent",
@@ -80,19 +103,9 @@ def make_economy_agent_llm_task(model: str):
     return economy_agent_task
 
 
-def run_state(model_name, globals: ThreeBankGlobalState) -> ResultEconVarsTool | None:
-    prompt = f"""Here is the latest data. economic_variables is the header
-    given to the series that represent different economic variables over the
-    last quarters. central_bank_knobs is the header given to the series that
-    represent the different knobs that the central bank has manipulated in
-    the past. big_bank_knobs is the header given to the series that
-    represent the different knobs a representative large commercial bank have manipulated in the past. small_bank_knobs is the header given to the series
-    that represent the different knobs that a representative small commercial bank has manipulated in the past. Any N/A value indicates a value that is
-    not availablefor that particular quarter.
-    {globals.print_subfields()}
-    Now analyze this new data and make your new predictions.
-    """
-    economy_agent_task = make_economy_agent_llm_task(model_name)
+def run_state(model_name, globals: ThreeBankGlobalState, prompt_format: PromptFormat | None = DEFAULT_PROMPT_FORMAT, structured_output: bool = False) -> ResultEconVarsTool | None:
+    prompt = PROMPT_PREFIX + render_state(globals, prompt_format)
+    economy_agent_task = use_run_logs_dir(make_economy_agent_llm_task(model_name, structured_output=structured_output))
     with lr.utils.output.printing.silence_stdout():
         return economy_agent_task.run(prompt)
 
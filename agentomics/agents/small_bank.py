@@ -8,32 +8,25 @@ for macroeconomic simulations
 Author: Akhil Karra
 """
 
+import textwrap
+
 import langroid as lr
-import langroid.language_models as lm
 
 from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.prompt_format import (
+    DEFAULT_PROMPT_FORMAT,
+    PromptFormat,
+    render_state,
+)
+from agentomics.tools.repair import RepairingChatAgent
 from agentomics.tools.small_bank_knobs import ResultSmallBankKnobsTool
+from agentomics.tools.structured_output import (
+    structured_llm_config,
+    structured_output_instructions,
+)
+from agentomics.utils.logging import use_run_logs_dir
 
-
-class SmallBank(lr.ChatAgent):
-    """Definition of a SmallBank agent with access to a tool to set its knobs
-    after receiving inputs on economic conditions and behaviors on other banks"""
-    def __init__(self, config: lr.ChatAgentConfig):
-        super().__init__(config)
-        self.config = config
-        self.enable_message(ResultSmallBankKnobsTool)
-
-
-def make_small_bank_task(model: str):
-    """Given the name of a local or hosted LLM, instantiate a SmallBank task
-    to set up and connect the SmallBank agent with its custom result tool"""
-    llm_config = lm.OpenAIGPTConfig(
-        chat_model=model or lm.OpenAIChatModel.GPT4o,
-        chat_context_length=131072
-    )
-    small_bank_config = lr.ChatAgentConfig(
-        llm=llm_config,
-        system_message="""You are SmallBank, is a community bank
+SYSTEM_MESSAGE = """You are SmallBank, is a community bank
         representative of other community banks in Country X, a hypothetical
         country. Country X believes in capitalism and free markets. You are
         smart while adhering to the laws and regulations set by the Government
@@ -48,14 +41,56 @@ def make_small_bank_task(model: str):
         to analyze the current economic conditions and behavior of the other
         banks and come up with your own game plan on:
             1) what your new loan deposit rate will be and
-            2) what your new consumer loan focus will be.
+            2) what your new consumer loan focus will be."""
+
+# Free-text answer protocol, replaced by the JSON schema instructions under
+# structured output
+FREE_TEXT_INSTRUCTIONS = """
 
         When you are ready with these new measures, say the word "DONE" and use the `ResultSmallBankKnobsTool` in the specified JSON format to give your new loan deposit rate and your new consumer loan focus. Make sure
         to give the heading `TOOL: result_small_bank_knobs_tool` to ensure the tool
         is used properly.
         """
+
+# Static preamble of every prompt. It comes before the variable state so
+# that the system message and preamble form a byte-identical prefix
+PROMPT_PREFIX = textwrap.dedent("""\
+    Below is the latest data. economic_variables is the header
+    given to the series that represent different economic variables over the
+    last quarters. central_bank_knobs is the header given to the series that
+    represent the different knobs that the central banking authority can
+    manipulate. big_bank_knobs is the header given to the series that
+    represent the different knobs that a representative large commercial
+    bank can manipulate. small_bank_knobs is the header given to the series
+    that represent the different knobs that you, SmallBank, have manipulated
+    in the past.
+    Analyze this new data and make your new decision on the new
+    loan interest rate and consumer loan focus.
+""")
+
+
+class SmallBank(RepairingChatAgent):
+    """Definition of a SmallBank agent with access to a tool to set its knobs
+    after receiving inputs on economic conditions and behaviors on other banks"""
+    result_tool_cls = ResultSmallBankKnobsTool
+
+    def __init__(self, config: lr.ChatAgentConfig, structured_output: bool = False):
+        super().__init__(config)
+        self.config = config
+        self.enable_message(ResultSmallBankKnobsTool, force=structured_output and self._fn_call_available())
+
+
+def make_small_bank_task(model: str, structured_output: bool = False):
+    """Given the name of a local or hosted LLM, instantiate a SmallBank task
+    to set up and connect the SmallBank agent with its custom result tool.
+    With `structured_output`, the agent answers through function calling or
+    JSON mode instead of free text"""
+    llm_config = structured_llm_config(model, structured_output)
+    small_bank_config = lr.ChatAgentConfig(
+        llm=llm_config,
+        system_message=SYSTEM_MESSAGE + (structured_output_instructions(ResultSmallBankKnobsTool) if structured_output else FREE_TEXT_INSTRUCTIONS)
     )
-    small_bank_agent = SmallBank(small_bank_config)
+    small_bank_agent = SmallBank(small_bank_config, structured_output)
     small_bank_task = lr.Task(
         small_bank_agent,
         "SmallBank",
@@ -66,21 +101,9 @@ def make_small_bank_task(model: str):
     return small_bank_task
 
 
-def run_state(model_name, globals: ThreeBankGlobalState) -> ResultSmallBankKnobsTool | None:
-    prompt = f"""Here is the latest data. economic_variables is the header
-    given to the series that represent different economic variables over the
-    last quarters. central_bank_knobs is the header given to the series that
-    represent the different knobs that the central banking authority can
-    manipulate. big_bank_knobs is the header given to the series that
-    represent the different knobs that a representative large commercial
-    bank can manipulate. small_bank_knobs is the header given to the series
-    that represent the different knobs that you, SmallBank, have manipulated
-    in the past.
-    {globals.print_subfields()}
-    Now analyze this new data and make your new decision on the new
-    loan interest rate and consumer loan focus.
-    """
-    small_bank_task = make_small_bank_task(model_name)
+def run_state(model_name, globals: ThreeBankGlobalState, prompt_format: PromptFormat | None = DEFAULT_PROMPT_FORMAT, structured_output: bool = False) -> ResultSmallBankKnobsTool | None:
+    prompt = PROMPT_PREFIX + render_state(globals, prompt_format)
+    small_bank_task = use_run_logs_dir(make_small_bank_task(model_name, structured_output=structured_output))
     return small_bank_task.run(prompt)
 
 
@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Rolling-Origin Backtesting
+
+Walk-forward evaluation of the simulation against real history, e.g. the
+FRED series aligned with `get_longest_common_date_range`. Every origin from
+quarter K to the end is an independent simulation seeded with the actual
+history up to that origin. Origins run concurrently, optionally under a
+shared rate limiter, and the forecast errors of all origins are computed
+against the actuals in one vectorized pass
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.metrics import bias, mae, rmse
+from agentomics.common.rate_limit import RateLimiter, rate_limiting
+
+# Series of the global state seeded from the FRED columns of the evaluation
+# notebook, by (knobs, series) name. Series without a column start as N/A
+DEFAULT_COLUMNS = {
+    ("economic_variables", "gdp_growth_rate"): "Quarterly GDP Growth Rate",
+    ("economic_variables", "unemployment_rate"): "Quarterly Unemployment Rate",
+    ("economic_variables", "inflation_rate"): "Quarterly Inflation Rate",
+    ("central_bank_knobs", "target_interest_rate"): "Quarterly Effective Federal Funds Rate",
+    ("central_bank_knobs", "securities_holdings_pc_change"): "Quarterly Securities Held Percent Change",
+}
+
+
+@dataclass
+class BacktestResult:
+    """Forecasts of every origin, shaped (origins, horizon, fields), the
+    actuals aligned with them, and the error table per horizon and field"""
+    origins: np.ndarray
+    fields: list[str]
+    forecasts: np.ndarray
+    actuals: np.ndarray
+    errors: pd.DataFrame
+
+
+def _series(globals: ThreeBankGlobalState, key: tuple[str, str]):
+    knobs_name, series_name = key
+    return getattr(getattr(globals, knobs_name), series_name)
+
+
+def globals_from_history(
+    history: pd.DataFrame,
+    end: int,
+    columns: dict[tuple[str, str], str] = DEFAULT_COLUMNS
+) -> ThreeBankGlobalState:
+    """Global state seeded with the first `end` rows of `history`. Missing
+    values and series without a column in `columns` are N/A"""
+    globals = ThreeBankGlobalState()
+    for series in globals.iter_series():
+        series.set_array([None] * end)
+    for key, column in columns.items():
+        series = _series(globals, key)
+        values = history[column].to_numpy(dtype=float)[:end].tolist()
+        series.set_array([None if np.isnan(value) else series.type_check(value) for value in values])
+    return globals
+
+
+def forecast_errors(forecasts: np.ndarray, actuals: np.ndarray, fields: list[str]) -> pd.DataFrame:
+    """MAE, RMSE, bias and number of forecasts per horizon and field, over
+    all origins at once. NaN forecasts or actuals are left out"""
+    count = (~np.isnan(forecasts - actuals)).sum(axis=0)
+    index = pd.MultiIndex.from_product([np.arange(1, count.shape[0] + 1), fields], names=["horizon", "field"])
+    return pd.DataFrame(
+        {
+            "mae": mae(forecasts, actuals, axis=0).ravel(),
+            "rmse": rmse(forecasts, actuals, axis=0).ravel(),
+            "bias": bias(forecasts, actuals, axis=0).ravel(),
+            "count": count.ravel(),
+        },
+        index=index
+    )
+
+
+def run_backtest(
+    history: pd.DataFrame,
+    model,
+    simulate: Callable,
+    context_quarters: int = 8,
+    horizon: int = 1,
+    columns: dict[tuple[str, str], str] = DEFAULT_COLUMNS,
+    max_concurrent_origins: int = 4,
+    rate_limiter: RateLimiter | None = None,
+    **simulate_kwargs
+) -> BacktestResult:
+    """Simulate `horizon` quarters from every origin t in
+    [context_quarters, len(history)) with `simulate(globals, model,
+    run_name=..., **simulate_kwargs)` (e.g. simulate_two_way), seeded with
+    rows [0, t) of `history` and run as "origin-t", and score the forecasts
+    of the series in `columns` against the following rows. At most
+    `max_concurrent_origins` origins run at a time, and all of their LLM
+    calls share `rate_limiter` if given"""
+    keys = list(columns)
+    actual_values = history[[columns[key] for key in keys]].to_numpy(dtype=float)
+    origins = np.arange(context_quarters, len(history))
+
+    def run_origin(origin: int) -> np.ndarray:
+        globals = globals_from_history(history, origin, columns)
+        globals.number_of_quarters_to_simulate = min(horizon, len(history) - origin)
+        simulate(globals, model, run_name=f"origin-{origin}", **simulate_kwargs)
+        forecast = np.full((horizon, len(keys)), np.nan)
+        for j, key in enumerate(keys):
+            values = _series(globals, key).to_numpy()[origin:origin + horizon]
+            forecast[:len(values), j] = values
+        return forecast
+
+    limiting = rate_limiting(rate_limiter) if rate_limiter is not None else contextlib.nullcontext()
+    with limiting, ThreadPoolExecutor(max_workers=max_concurrent_origins) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, run_origin, origin) for origin in origins]
+        forecasts = np.stack([future.result() for future in futures]) if futures else np.empty((0, horizon, len(keys)))
+
+    # Actuals of every (origin, step) gathered at once, NaN past the end
+    rows = origins[:, None] + np.arange(horizon)[None, :]
+    padded = np.vstack([actual_values, np.full((horizon, len(keys)), np.nan)])
+    actuals = padded[rows]
+
+    fields = [series_name for _, series_name in keys]
+    return BacktestResult(origins, fields, forecasts, actuals, forecast_errors(forecasts, actuals, fields))
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Counterfactual Branching
+
+Runs counterfactual experiments from a shared simulation prefix. The
+quarters every branch has in common are simulated once, then the global
+state is forked copy-on-write into one branch per perturbation (e.g. a
+control branch and a branch with a higher target interest rate), and the
+branches are simulated concurrently from that point. Branches share the
+common history until they append to it
+
+Author: Akhil Karra
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from agentomics.common.data_structures import ThreeBankGlobalState
+
+Perturbation = Callable[[ThreeBankGlobalState], None]
+
+
+@dataclass
+class Branch:
+    """Final global state of a branch and the report of its simulation"""
+    name: str
+    globals: ThreeBankGlobalState
+    report: Any = None
+
+
+def shift_latest(knobs_name: str, series_name: str, delta: float) -> Perturbation:
+    """Perturbation adding `delta` to the latest value of a series, e.g.
+    shift_latest("central_bank_knobs", "target_interest_rate", 0.01) for a
+    1% higher target interest rate"""
+    def perturb(globals: ThreeBankGlobalState):
+        series = getattr(getattr(globals, knobs_name), series_name)
+        series[-1] = series.type_check(series[-1].to_val() + delta)
+    return perturb
+
+
+def fork_branches(globals: ThreeBankGlobalState, perturbations: dict[str, Perturbation | None]) -> dict[str, ThreeBankGlobalState]:
+    """One copy-on-write fork of `globals` per perturbation, by branch name,
+    with the perturbation applied. A perturbation of None gives an
+    unperturbed (control) branch"""
+    branches = {}
+    for name, perturb in perturbations.items():
+        forked = globals.fork()
+        if perturb is not None:
+            perturb(forked)
+        branches[name] = forked
+    return branches
+
+
+def simulate_branches(
+    globals: ThreeBankGlobalState,
+    model,
+    simulate: Callable,
+    perturbations: dict[str, Perturbation | None],
+    prefix_quarters: int,
+    branch_quarters: int,
+    max_concurrent_branches: int = 4,
+    **simulate_kwargs
+) -> dict[str, Branch]:
+    """Simulate `prefix_quarters` of `globals` once with
+    `simulate(globals, model, run_name=..., **simulate_kwargs)` (e.g.
+    simulate_two_way), then fork a branch per perturbation and simulate
+    `branch_quarters` more of every branch, at most `max_concurrent_branches`
+    at a time. The prefix runs as "prefix" and every branch under its name"""
+    if prefix_quarters > 0:
+        globals.number_of_quarters_to_simulate = prefix_quarters
+        simulate(globals, model, run_name="prefix", **simulate_kwargs)
+
+    branch_globals = fork_branches(globals, perturbations)
+
+    def run_branch(name: str) -> Branch:
+        forked = branch_globals[name]
+        forked.number_of_quarters_to_simulate = branch_quarters
+        return Branch(name, forked, simulate(forked, model, run_name=name, **simulate_kwargs))
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_branches) as executor:
+        futures = {name: executor.submit(contextvars.copy_context().run, run_branch, name) for name in branch_globals}
+        return {name: future.result() for name, future in futures.items()}
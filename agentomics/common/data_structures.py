@@ -8,137 +8,94 @@ and compatibility with the Langroid multi-agent framework
 
 Author: Akhil Karra
 """
+import copy
+from dataclasses import dataclass
+
 import numpy as np
 import pandas as pd
+from langroid.pydantic_v1 import BaseModel, Field
 from langroid.utils.globals import GlobalState
 
+from agentomics.common.schema import (
+    BIG_BANK_KNOBS,
+    CENTRAL_BANK_KNOBS,
+    ECONOMIC_VARIABLES,
+    SMALL_BANK_KNOBS,
+    KnobsSchema,
+)
 from agentomics.common.types import NonnegPercent, Percent, TypedArray
 
 
-def _add_series_to_dataframe(df, new_column_name, new_column):
-    # Get the current length of the DataFrame and the new column
-    df_length = len(df)
-    new_column_length = len(new_column)
-    new_column_padded = None
-    if new_column_length < df_length:
-        # If the series is shorter, pad it with NaNs
-        new_column_padded = pd.concat([new_column, pd.Series([np.nan] * (df_length - new_column_length))]).reset_index(drop=True)
-    elif new_column_length > df_length:
-        # If the series is longer, extend the DataFrame with NaNs
-        extra_rows = new_column_length - df_length
-        df = pd.concat([df, pd.DataFrame(np.nan, index=range(extra_rows), columns=df.columns)], ignore_index=True)
-        new_column_padded = new_column
-    else:
-        # If the series is the same length, use it directly
-        new_column_padded = new_column
-
-    # Add the processed series as a new column
-    df[new_column_name] = new_column_padded
-
-    return df
-
-
 class Knobs:
+    """Series of the global state decided by one agent, generated from the
+    fields of its `schema`"""
     knobs = None
+    schema: KnobsSchema
 
-class EconomicVariables(Knobs):
-    """Data structure within RecurringGlobalState to represent
-    key economic variables shared with all agents"""
     def __init__(self):
-        self.gdp_growth_rate = TypedArray(
-            Percent,
-            series_name="GDP Growth Rate (% Change)",
-            var_name="gdp_growth_rate")
-        self.unemployment_rate = TypedArray(
-            NonnegPercent,
-            series_name="Unemployment Rate (%)",
-            var_name="unemployment_rate")
-        self.inflation_rate = TypedArray(
-            Percent,
-            series_name="Inflation Rate (%)",
-            var_name="inflation_rate")
+        for spec in self.schema.fields:
+            setattr(self, spec.name, TypedArray(spec.type, series_name=spec.series_name, var_name=spec.var_name))
 
     def print_subfields(self):
         string = ""
         for field, field_value in self.__dict__.items():
             if isinstance(field_value, TypedArray):
                 string += f"{field_value.series_name}: {str(field_value)}" + "\n"
+            elif isinstance(field_value, Percent) and field_value.name != "":
+                string += f"{field_value.name}: {str(field_value)}" + "\n"
             else:
                 string += f"{field}: {str(field_value)}" + "\n"
         return string + "\n"
 
+    def fork(self) -> "Knobs":
+        """Copy of these knobs whose series share their history with them
+        copy-on-write"""
+        forked = copy.copy(self)
+        for name, value in self.__dict__.items():
+            if isinstance(value, TypedArray):
+                setattr(forked, name, value.fork())
+        return forked
+
+    def apply_update(self, result: BaseModel, quarter: int | None = None, dispersion: dict[str, float] | None = None):
+        """Append the decision `result` (the agent's Result* model) to every
+        series at once, with the ensemble dispersion of each field if any.
+        All values are validated before any series is changed, so an invalid
+        decision leaves the knobs untouched. A series that already has a
+        value for `quarter` gets it replaced"""
+        values = [spec.type(getattr(result, spec.name)) for spec in self.schema.fields]
+        if quarter is not None:
+            for spec in self.schema.fields:
+                getattr(self, spec.name).index_of_quarter(quarter)
+        dispersion = dispersion or {}
+        for spec, value in zip(self.schema.fields, values, strict=True):
+            getattr(self, spec.name).append(value, uncertainty=dispersion.get(spec.name), quarter=quarter)
+
+
+class EconomicVariables(Knobs):
+    """Data structure within RecurringGlobalState to represent
+    key economic variables shared with all agents"""
+    schema = ECONOMIC_VARIABLES
+
 
 class CentralBankKnobs(Knobs):
     """Data structure within RecurringGlobalState to represent
     key knobs manipulated by the CentralBank which are known
     to all agents"""
-    def __init__(self):
-        self.target_interest_rate = TypedArray(NonnegPercent,
-            series_name="Target Interest Rate (%)",
-            var_name="target_interest_rate")
-        self.securities_holdings_pc_change = TypedArray(
-            Percent,
-            series_name="Securities Holdings Percent Change (%)",
-            var_name="total_securities_holdings")
-
-    def print_subfields(self):
-        string = ""
-        for field, field_value in self.__dict__.items():
-            if isinstance(field_value, TypedArray):
-                string += f"{field_value.series_name}: {str(field_value)}" + "\n"
-            elif isinstance(field_value, Percent) and field_value.name != "":
-                string += f"{field_value.name}: {str(field_value)}" + "\n"
-            else:
-                string += f"{field}: {str(field_value)}" + "\n"
-        return string + "\n"
+    schema = CENTRAL_BANK_KNOBS
 
 
 class BigBankKnobs(Knobs):
     """Data structure within RecurringGlobalState to represent
     key knobs manipulated by the BigBank large commercial bank
     which are known to all agents"""
-    def __init__(self):
-        self.loan_to_deposit_ratio = TypedArray(
-            NonnegPercent,
-            series_name="Loan to Deposit Ratio (%)",
-            var_name="loan_to_deposit_ratio")
-        self.deposit_interest_rate = TypedArray(
-            NonnegPercent,
-            series_name="Deposit Interest Rate (%)",
-            var_name="deposit_interest_rate")
-
-    def print_subfields(self):
-        string = ""
-        for field, field_value in self.__dict__.items():
-            if isinstance(field_value, TypedArray):
-                string += f"{field_value.series_name}: {str(field_value)}" + "\n"
-            else:
-                string += f"{field}: {str(field_value)}" + "\n"
-        return string + "\n"
+    schema = BIG_BANK_KNOBS
 
 
 class SmallBankKnobs(Knobs):
     """Data structure within RecurringGlobalstate to represent
     key knobs manipulated by the SmallBank small community bank
     which are known to all agents"""
-    def __init__(self):
-        self.loans_interest_rate = TypedArray(
-            NonnegPercent,
-            series_name="Loans Interest Rate (%)",
-            var_name="loans_interest_rate")
-        self.consumer_loan_focus = TypedArray(
-            NonnegPercent,
-            series_name="Consumer Loan Focus (%)",
-            var_name="consumer_loan_focus")
-
-    def print_subfields(self):
-        string = ""
-        for field, field_value in self.__dict__.items():
-            if isinstance(field_value, TypedArray):
-                string += f"{field_value.series_name}: {str(field_value)}" + "\n"
-            else:
-                string += f"{field}: {str(field_value)}" + "\n"
-        return string + "\n"
+    schema = SMALL_BANK_KNOBS
 
 
 class ThreeBankGlobalState(GlobalState):
@@ -147,10 +104,11 @@ class ThreeBankGlobalState(GlobalState):
     class Config:
         arbitrary_types_allowed = True  # Enable arbitrary types
 
-    economic_variables = EconomicVariables()
-    central_bank_knobs = CentralBankKnobs()
-    big_bank_knobs = BigBankKnobs()
-    small_bank_knobs = SmallBankKnobs()
+    # Every instance builds its own knobs, so states never share series
+    economic_variables: EconomicVariables = Field(default_factory=EconomicVariables)
+    central_bank_knobs: CentralBankKnobs = Field(default_factory=CentralBankKnobs)
+    big_bank_knobs: BigBankKnobs = Field(default_factory=BigBankKnobs)
+    small_bank_knobs: SmallBankKnobs = Field(default_factory=SmallBankKnobs)
     number_of_quarters_to_simulate = 1
 
     def print_subfields(self):
@@ -164,26 +122,90 @@ class ThreeBankGlobalState(GlobalState):
                     string += f"{field}: {field_value}" + "\n"
         return string + "\n"
 
-    def to_pandas_df(self) -> pd.DataFrame:
-        """Take all of the series generated and put them into a Pandas
-        DataFrame as columns"""
-        column_names = []
-        list_of_lists = []
+    def iter_series(self):
+        """Iterate over every TypedArray series held by the knobs of this
+        global state"""
         for _, field_value in self.__dict__.items():
             if isinstance(field_value, Knobs):
                 for _, subfield_value in field_value.__dict__.items():
                     if isinstance(subfield_value, TypedArray):
-                        if subfield_value.var_name is not None:
-                            column_names.append(subfield_value.var_name)
-                        else:
-                            column_names.append("")
-                        list_of_lists.append(
-                            subfield_value.to_list(elementary_types=True)
-                        )
-        result = pd.DataFrame()
-        for i in range(len(column_names)):
-            result = _add_series_to_dataframe(result, column_names[i], pd.Series(list_of_lists[i]))
-        return result
+                        yield subfield_value
+
+    def copy(self, **kwargs) -> "ThreeBankGlobalState":
+        """Copy of this global state (see `BaseModel.copy`). Unless `deep`
+        is set, the knobs of the copy are forks of these knobs, so that
+        writing to either state never changes the other"""
+        copied = super().copy(**kwargs)
+        if not kwargs.get("deep"):
+            for field, field_value in copied.__dict__.items():
+                if isinstance(field_value, Knobs):
+                    setattr(copied, field, field_value.fork())
+        return copied
+
+    def fork(self) -> "ThreeBankGlobalState":
+        """Copy of this global state whose series share their history with
+        this state copy-on-write, so that many branches can continue from
+        the same quarter without copying the common history"""
+        return self.copy()
+
+    def snapshot(self) -> "StateSnapshot":
+        """Read-only snapshot of this state as of now, taken by the thread
+        that updates the state"""
+        return StateSnapshot(self.fork())
+
+    def next_quarter(self) -> int:
+        """Index of the quarter after the latest value of any series"""
+        return max((series.next_quarter() for series in self.iter_series()), default=0)
+
+    def first_open_quarter(self) -> int:
+        """Index of the earliest quarter some series has no value for yet,
+        i.e. the quarter after the latest value of the series furthest
+        behind"""
+        return min((series.next_quarter() for series in self.iter_series()), default=0)
+
+    def to_wide_array(self) -> tuple[list[str], np.ndarray]:
+        """Column names and a (quarters x columns) array of the values of
+        every series lined up by quarter index, NaN where a value is
+        missing. Series sampled with an ensemble get an extra
+        `<var_name>_uncertainty` column. All values are scattered into the
+        preallocated array at once"""
+        column_names, rows, values = [], [], []
+        for series in self.iter_series():
+            name = series.var_name if series.var_name is not None else ""
+            quarters = series.quarters()
+            column_names.append(name)
+            rows.append(quarters)
+            values.append(series.to_numpy())
+            if series.has_uncertainty():
+                column_names.append(f"{name}_uncertainty")
+                rows.append(quarters)
+                values.append(np.array(series.uncertainty(), dtype=float))
+        wide = np.full((self.next_quarter(), len(column_names)), np.nan)
+        if rows:
+            columns = np.repeat(np.arange(len(rows)), [len(quarters) for quarters in rows])
+            wide[np.concatenate(rows), columns] = np.concatenate(values)
+        return column_names, wide
+
+    def to_pandas_df(self) -> pd.DataFrame:
+        """Take all of the series generated and put them into a Pandas
+        DataFrame as columns, one row per quarter, with NaN where a value is
+        missing. Series sampled with an ensemble get an extra
+        `<var_name>_uncertainty` column"""
+        column_names, wide = self.to_wide_array()
+        return pd.DataFrame(wide, columns=column_names)
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """Snapshot of a global state that is never written to. Any number of
+    threads can restore it at once, each into a state of its own, and it
+    pickles to be restored in another process"""
+    _state: ThreeBankGlobalState
+
+    def restore(self) -> ThreeBankGlobalState:
+        """New global state starting from the snapshot, sharing its history
+        copy-on-write"""
+        return self._state.fork()
 
 
 def initialize_test_data():
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Ensemble Sampling
+
+Utilities to sample several LLM decisions for the same prompt concurrently
+and aggregate them into a single, lower-variance knob update together with
+the dispersion of the samples
+
+Author: Akhil Karra
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from langroid.pydantic_v1 import BaseModel
+
+AGGREGATIONS = ("median", "trimmed_mean")
+
+
+@dataclass
+class EnsembleResult:
+    """Aggregated result tool of an agent decision along with the standard
+    deviation of every result field across the samples"""
+    result: BaseModel
+    dispersion: dict[str, float] = field(default_factory=dict)
+    num_samples: int = 1
+
+
+def _result_field(tool: BaseModel) -> str:
+    """Name of the field holding the structured result of a Result*Tool"""
+    for name, value in tool.__dict__.items():
+        if isinstance(value, BaseModel):
+            return name
+    raise TypeError(f"{type(tool).__name__} has no structured result field")
+
+
+def aggregate(values: np.ndarray, aggregation: str = "median", trim_fraction: float = 0.2) -> np.ndarray:
+    """Aggregate samples along the first axis by median or by the mean after
+    dropping `trim_fraction` of the samples from each end"""
+    if aggregation == "median":
+        return np.median(values, axis=0)
+    if aggregation == "trimmed_mean":
+        values = np.sort(values, axis=0)
+        cut = int(len(values) * trim_fraction)
+        if len(values) - 2 * cut > 0:
+            values = values[cut:len(values) - cut]
+        return values.mean(axis=0)
+    raise ValueError(f"Unknown aggregation {aggregation!r}, expected one of {AGGREGATIONS}")
+
+
+def combine_samples(samples: list, aggregation: str = "median", trim_fraction: float = 0.2) -> EnsembleResult:
+    """Combine several Result*Tool samples of the same type into one"""
+    result_field = _result_field(samples[0])
+    results = [getattr(sample, result_field) for sample in samples]
+    field_names = list(results[0].__fields__)
+    values = np.array([[getattr(result, name) for name in field_names] for result in results], dtype=float)
+
+    aggregated = aggregate(values, aggregation, trim_fraction)
+    dispersion = values.std(axis=0)
+    result_cls = type(results[0])
+    tool_cls = type(samples[0])
+    return EnsembleResult(
+        result=tool_cls(**{result_field: result_cls(**dict(zip(field_names, aggregated.tolist(), strict=True)))}),
+        dispersion=dict(zip(field_names, dispersion.tolist(), strict=True)),
+        num_samples=len(samples)
+    )
+
+
+def run_ensemble(
+    run_state,
+    model_name,
+    globals,
+    num_samples: int,
+    aggregation: str = "median",
+    trim_fraction: float = 0.2
+) -> EnsembleResult | None:
+    """Call an agent's `run_state` `num_samples` times concurrently with the
+    same state and aggregate the successfully parsed samples. Returns None
+    if none of the samples could be parsed"""
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {aggregation!r}, expected one of {AGGREGATIONS}")
+    with ThreadPoolExecutor(max_workers=num_samples) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, run_state, model_name, globals)
+            for _ in range(num_samples)
+        ]
+        samples = [future.result() for future in futures]
+    samples = [sample for sample in samples if sample is not None]
+    if not samples:
+        return None
+    return combine_samples(samples, aggregation, trim_fraction)
@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Forecast Accuracy Metrics
+
+Vectorized scores of simulated trajectories against actual data. Many runs
+(e.g. a sweep) are stacked into one array shaped (runs, quarters, fields)
+and scored against the aligned actuals (quarters, fields) with NumPy
+broadcasting, without a Python loop per run. Missing values (NaN, or N/A
+in the simulation outputs) are left out of every score
+
+Author: Akhil Karra
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def stack_trajectories(frames: list[pd.DataFrame], fields: list[str], num_quarters: int | None = None) -> np.ndarray:
+    """Stack the `fields` columns of `frames` (e.g. `to_pandas_df()` of every
+    run) into an array shaped (runs, quarters, fields). Shorter runs are
+    padded with NaN, and N/A values (-inf) become NaN"""
+    num_quarters = num_quarters if num_quarters is not None else max((len(frame) for frame in frames), default=0)
+    if not frames:
+        return np.full((0, num_quarters, len(fields)), np.nan)
+    # One frame indexed by (run, position in the run), reindexed onto the
+    # full grid of runs and quarters to pad and truncate all runs at once
+    concatenated = pd.concat([frame[fields] for frame in frames], keys=range(len(frames)))
+    runs = concatenated.index.get_level_values(0)
+    concatenated.index = pd.MultiIndex.from_arrays([runs, concatenated.groupby(runs).cumcount()])
+    grid = pd.MultiIndex.from_product([range(len(frames)), range(num_quarters)])
+    stacked = concatenated.reindex(grid).to_numpy(dtype=float).reshape(len(frames), num_quarters, len(fields))
+    stacked[np.isinf(stacked)] = np.nan
+    return stacked
+
+
+def _mean(values: np.ndarray, axis) -> np.ndarray:
+    """Mean over `axis` ignoring NaN, NaN where every value is missing"""
+    count = (~np.isnan(values)).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(values, axis=axis) / count
+
+
+def errors(simulated: np.ndarray, actuals: np.ndarray) -> np.ndarray:
+    """Simulated minus actual values, with `actuals` broadcast over runs"""
+    return simulated - actuals
+
+
+def rmse(simulated: np.ndarray, actuals: np.ndarray, axis=(0, 1)) -> np.ndarray:
+    return np.sqrt(_mean(errors(simulated, actuals) ** 2, axis))
+
+
+def mae(simulated: np.ndarray, actuals: np.ndarray, axis=(0, 1)) -> np.ndarray:
+    return _mean(np.abs(errors(simulated, actuals)), axis)
+
+
+def mape(simulated: np.ndarray, actuals: np.ndarray, axis=(0, 1)) -> np.ndarray:
+    """Mean absolute percentage error, leaving out zero actuals"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        relative = np.abs(errors(simulated, actuals)) / np.abs(np.where(actuals == 0, np.nan, actuals))
+    return _mean(relative, axis)
+
+
+def bias(simulated: np.ndarray, actuals: np.ndarray, axis=(0, 1)) -> np.ndarray:
+    return _mean(errors(simulated, actuals), axis)
+
+
+def directional_accuracy(simulated: np.ndarray, actuals: np.ndarray, axis=(0, 1)) -> np.ndarray:
+    """Fraction of quarter-to-quarter changes with the same sign in the
+    simulation as in the actuals"""
+    simulated_change = np.diff(simulated, axis=-2)
+    actual_change = np.diff(np.broadcast_to(actuals, simulated.shape), axis=-2)
+    hits = (np.sign(simulated_change) == np.sign(actual_change)).astype(float)
+    hits[np.isnan(simulated_change) | np.isnan(actual_change)] = np.nan
+    return _mean(hits, axis)
+
+
+def crps(simulated: np.ndarray, actuals: np.ndarray) -> np.ndarray:
+    """Continuous ranked probability score of the ensemble of runs for
+    every (quarter, field), E|X - y| - E|X - X'| / 2, computed from the
+    sorted runs in O(runs log runs)"""
+    valid = ~np.isnan(simulated)
+    n = valid.sum(axis=0)
+    spread_to_actual = np.nansum(np.abs(simulated - actuals), axis=0)
+    # Sorting puts NaN last, so the i-th valid run has rank i in every column
+    ordered = np.sort(simulated, axis=0)
+    ranks = np.arange(1, simulated.shape[0] + 1).reshape(-1, *([1] * (simulated.ndim - 1)))
+    weights = np.where(ranks <= n, 2 * ranks - n - 1, 0)
+    pairwise = 2.0 * np.nansum(weights * ordered, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        score = spread_to_actual / n - pairwise / (2.0 * n ** 2)
+    return np.where((n > 0) & ~np.isnan(actuals), score, np.nan)
+
+
+def score(simulated: np.ndarray, actuals: np.ndarray, fields: list[str], per_run: bool = False) -> pd.DataFrame:
+    """Every metric per field over all runs and quarters, or per run and
+    field with `per_run`. CRPS scores the whole ensemble, so it is averaged
+    over quarters and is not available per run"""
+    point_metrics = {
+        "rmse": rmse, "mae": mae, "mape": mape, "bias": bias, "directional_accuracy": directional_accuracy
+    }
+    if per_run:
+        table = {name: metric(simulated, actuals, axis=1).ravel() for name, metric in point_metrics.items()}
+        index = pd.MultiIndex.from_product([np.arange(simulated.shape[0]), fields], names=["run", "field"])
+        return pd.DataFrame(table, index=index)
+    table = {name: metric(simulated, actuals) for name, metric in point_metrics.items()}
+    table["crps"] = _mean(crps(simulated, actuals), axis=0)
+    return pd.DataFrame(table, index=pd.Index(fields, name="field"))
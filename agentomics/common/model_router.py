@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Model Router
+
+Routes every agent call to one of several LLM backends (e.g. Groq, OpenAI
+and a locally served model) instead of a single hard-coded model. Each
+agent can have its own preference order. Calls go to the healthy backend
+with the lowest measured latency, and a backend whose recent error rate is
+too high is taken out of rotation for a cooldown period while the call
+fails over to the next backend. A call that runs past a deadline derived
+from the backend's p95 latency also fails over
+
+Author: Akhil Karra
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class AllModelsFailedError(RuntimeError):
+    """Raised when a call failed on every backend it was routed to"""
+
+
+def _call_with_deadline(fn: Callable[[str], object], model: str, deadline: float | None):
+    """`fn(model)`, raising TimeoutError if it takes more than `deadline`
+    seconds. The call runs in a daemon thread with a copy of the current
+    context and is left to finish in the background when it times out"""
+    if deadline is None:
+        return fn(model)
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            future.set_result(context.run(fn, model))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"model-call-{model}", daemon=True).start()
+    return future.result(timeout=deadline)
+
+
+class ModelStats:
+    """Latencies and outcomes of the most recent calls to one backend"""
+    def __init__(self, window: int):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.errors: deque[bool] = deque(maxlen=window)
+        self.unhealthy_until = 0.0
+
+    @property
+    def calls(self) -> int:
+        return len(self.errors)
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+    def latency(self, percentile: float) -> float | None:
+        if not self.latencies:
+            return None
+        return float(np.percentile(self.latencies, percentile))
+
+    @property
+    def p50(self) -> float | None:
+        return self.latency(50)
+
+    @property
+    def p95(self) -> float | None:
+        return self.latency(95)
+
+
+class ModelRouter:
+    """Thread-safe router over `models`, tried in the order given unless an
+    agent has its own order in `preferences` (agent name -> models).
+
+    Backends with fewer than `min_samples` calls are tried first so that
+    every backend gets measured; after that, healthy backends are ranked by
+    p95 latency weighted by their error rate, with p50 latency and the
+    preference order breaking ties. A failed call is retried on the next
+    backend, and a backend whose error rate over the last `window` calls
+    exceeds `max_error_rate` is skipped for `cooldown` seconds and measured
+    afresh afterwards.
+
+    Once a backend is measured, a call to it that takes longer than
+    `deadline_factor` times its p95 latency is abandoned and counted as an
+    error, and the call fails over. The abandoned call keeps running in the
+    background until it returns, so its tokens are still spent. The last
+    backend left to try has no deadline, and `deadline_factor=None` turns
+    deadlines off. A call that returns None (no parsed answer) also counts
+    as an error and fails over"""
+    def __init__(
+        self,
+        models: list[str],
+        preferences: dict[str, list[str]] | None = None,
+        window: int = 50,
+        min_samples: int = 3,
+        max_error_rate: float = 0.5,
+        cooldown: float = 60.0,
+        deadline_factor: float | None = 3.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = list(models)
+        self.preferences = preferences or {}
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.deadline_factor = deadline_factor
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.stats = {model: ModelStats(window) for model in self._all_models()}
+
+    def _all_models(self) -> list[str]:
+        models = list(self.models)
+        for preferred in self.preferences.values():
+            models += [model for model in preferred if model not in models]
+        return models
+
+    def _score(self, stats: ModelStats, order: int) -> tuple:
+        if stats.calls < self.min_samples:
+            return (0, 0.0, 0.0, order)
+        p95 = stats.p95 if stats.p95 is not None else float("inf")
+        p50 = stats.p50 if stats.p50 is not None else float("inf")
+        return (1, p95 * (1.0 + stats.error_rate), p50, order)
+
+    def ranked(self, agent_name: str | None = None) -> list[str]:
+        """Backends in the order they will be tried for `agent_name`.
+        Backends in cooldown go last, soonest to recover first"""
+        candidates = self.preferences.get(agent_name, self.models)
+        now = self.clock()
+        with self._lock:
+            healthy = [m for m in candidates if self.stats[m].unhealthy_until <= now]
+            cooling = [m for m in candidates if self.stats[m].unhealthy_until > now]
+            healthy.sort(key=lambda m: self._score(self.stats[m], candidates.index(m)))
+            cooling.sort(key=lambda m: self.stats[m].unhealthy_until)
+        return healthy + cooling
+
+    def choose(self, agent_name: str | None = None) -> str:
+        return self.ranked(agent_name)[0]
+
+    def record(self, model: str, latency: float | None, error: bool):
+        with self._lock:
+            stats = self.stats[model]
+            stats.errors.append(error)
+            if latency is not None:
+                stats.latencies.append(latency)
+            if error and stats.calls >= self.min_samples and stats.error_rate > self.max_error_rate:
+                logger.warning(
+                    "%s degraded (error rate %.0f%%), skipping it for %.0fs",
+                    model, 100.0 * stats.error_rate, self.cooldown
+                )
+                # Forget the history so the backend is probed again as soon
+                # as the cooldown ends
+                stats.latencies.clear()
+                stats.errors.clear()
+                stats.unhealthy_until = self.clock() + self.cooldown
+
+    def deadline(self, model: str) -> float | None:
+        """Seconds a call to `model` may take before it fails over, or None
+        while the backend is not measured yet"""
+        if self.deadline_factor is None:
+            return None
+        with self._lock:
+            stats = self.stats[model]
+            if stats.calls < self.min_samples or stats.p95 is None:
+                return None
+            return self.deadline_factor * stats.p95
+
+    def call(self, agent_name: str | None, fn: Callable[[str], object]):
+        """Call `fn(model)` on the best backend for `agent_name`, failing over
+        to the next backend when it raises, misses its deadline or returns
+        None. Returns None when no backend raised but some returned None, so
+        that callers retrying on None keep doing so"""
+        errors = []
+        returned_none = False
+        ranked = self.ranked(agent_name)
+        for i, model in enumerate(ranked):
+            deadline = self.deadline(model) if i < len(ranked) - 1 else None
+            start = self.clock()
+            try:
+                result = _call_with_deadline(fn, model, deadline)
+            except Exception as e:
+                self.record(model, None, error=True)
+                if isinstance(e, TimeoutError) and deadline is not None:
+                    logger.warning("%s call to %s exceeded its %.1fs deadline, failing over", agent_name, model, deadline)
+                else:
+                    logger.warning("%s call to %s failed, failing over: %s", agent_name, model, e)
+                errors.append(e)
+                continue
+            if result is None:
+                self.record(model, None, error=True)
+                logger.warning("%s call to %s returned no result, failing over", agent_name, model)
+                returned_none = True
+                continue
+            self.record(model, self.clock() - start, error=False)
+            return result
+        if returned_none:
+            return None
+        raise AllModelsFailedError(f"{agent_name} failed on every model: {errors}")
+
+    def bind(self, agent_name: str, run_state: Callable):
+        """Wrap an agent's `run_state(model, globals)` so that the model
+        argument is ignored and every call is routed"""
+        def routed_run_state(_model, globals):
+            return self.call(agent_name, lambda model: run_state(model, globals))
+        return routed_run_state
+
+    def summary(self) -> dict[str, dict[str, float | None]]:
+        """p50/p95 latency, error rate and number of calls of every backend"""
+        with self._lock:
+            return {
+                model: {"p50": stats.p50, "p95": stats.p95, "error_rate": stats.error_rate, "calls": stats.calls}
+                for model, stats in self.stats.items()
+            }
@@ -0,0 +1,208 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Profiling
+
+Opt-in profiler for the phases of a simulation: prompt build, LLM call,
+tool parse, state append and CSV export. Phases are recorded as begin/end
+events per thread and exported as a Chrome trace (chrome://tracing,
+Perfetto) or a speedscope profile, which shows how much of a slow quarter
+is spent waiting on the network and how much in Python. One selected
+quarter can additionally be profiled with cProfile (calling thread only)
+or with a sampling profiler that covers every thread.
+
+Profiling is off unless a profiler is activated with `profiling()`; the
+hooks are a no-op otherwise
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+QUARTER_PROFILERS = ("cprofile", "sample")
+
+_active_profiler: contextvars.ContextVar["Profiler | None"] = contextvars.ContextVar("profiler", default=None)
+
+
+class Profiler:
+    """Collects phase events and optionally profiles quarter
+    `profile_quarter` (1-based) with `quarter_profiler`, either "cprofile"
+    or "sample" (stack samples of all threads every `sample_interval`
+    seconds)"""
+    def __init__(
+        self,
+        profile_quarter: int | None = None,
+        quarter_profiler: str = "cprofile",
+        sample_interval: float = 0.005
+    ):
+        if quarter_profiler not in QUARTER_PROFILERS:
+            raise ValueError(f"Unknown quarter profiler {quarter_profiler!r}, expected one of {QUARTER_PROFILERS}")
+        self.profile_quarter = profile_quarter
+        self.quarter_profiler = quarter_profiler
+        self.sample_interval = sample_interval
+        self.events: list[dict] = []
+        self.quarter_stats: pstats.Stats | None = None
+        self.quarter_samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _add(self, name: str, ph: str, args: dict):
+        event = {"name": name, "ph": ph, "ts": self._now_us(), "pid": os.getpid(), "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **args):
+        self._add(name, "B", args)
+        try:
+            yield
+        finally:
+            self._add(name, "E", {})
+
+    @contextlib.contextmanager
+    def quarter(self, index: int):
+        """Phase spanning simulated quarter `index`, profiled in depth when
+        it is the selected quarter"""
+        with self.phase("quarter", quarter=index):
+            if index != self.profile_quarter:
+                yield
+            elif self.quarter_profiler == "cprofile":
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+                    self.quarter_stats = pstats.Stats(profile)
+            else:
+                with self._sampling():
+                    yield
+
+    @contextlib.contextmanager
+    def _sampling(self):
+        stop = threading.Event()
+
+        def sample():
+            sampler_tid = threading.get_ident()
+            while not stop.wait(self.sample_interval):
+                for tid, frame in sys._current_frames().items():
+                    if tid == sampler_tid:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                        frame = frame.f_back
+                    self.quarter_samples[tuple(reversed(stack))] += 1
+
+        sampler = threading.Thread(target=sample, name="agentomics-sampler", daemon=True)
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+
+    def phase_totals(self) -> dict[str, float]:
+        """Total seconds spent in every phase, summed over threads"""
+        totals: Counter = Counter()
+        open_events: dict[tuple, list[float]] = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            key = (event["tid"], event["name"])
+            if event["ph"] == "B":
+                open_events.setdefault(key, []).append(event["ts"])
+            elif open_events.get(key):
+                totals[event["name"]] += (event["ts"] - open_events[key].pop()) / 1e6
+        return dict(totals)
+
+    def to_chrome_trace(self) -> dict:
+        with self._lock:
+            return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def to_speedscope(self) -> dict:
+        """Phase events as one evented profile per thread, followed by the
+        sampled profile of the selected quarter if one was taken"""
+        frames: dict[str, int] = {}
+        profiles = []
+        with self._lock:
+            events = list(self.events)
+        for tid in dict.fromkeys(event["tid"] for event in events):
+            thread_events = [event for event in events if event["tid"] == tid]
+            profiles.append({
+                "type": "evented",
+                "name": f"thread {tid}",
+                "unit": "microseconds",
+                "startValue": thread_events[0]["ts"],
+                "endValue": thread_events[-1]["ts"],
+                "events": [
+                    {"type": "O" if event["ph"] == "B" else "C",
+                     "frame": frames.setdefault(event["name"], len(frames)),
+                     "at": event["ts"]}
+                    for event in thread_events
+                ],
+            })
+        if self.quarter_samples:
+            samples, weights = [], []
+            for stack, count in self.quarter_samples.items():
+                samples.append([frames.setdefault(name, len(frames)) for name in stack])
+                weights.append(count * self.sample_interval)
+            profiles.append({
+                "type": "sampled",
+                "name": f"quarter {self.profile_quarter} (sampled)",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name} for name in frames]},
+            "profiles": profiles,
+            "name": "agentomics simulation",
+        }
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def write_speedscope(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_speedscope(), f)
+
+
+@contextlib.contextmanager
+def profiling(profiler: Profiler | None = None):
+    """Activate `profiler` (a new one by default) for the code in the block
+    and in threads started with a copy of the current context"""
+    profiler = profiler if profiler is not None else Profiler()
+    token = _active_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _active_profiler.reset(token)
+
+
+def profile_phase(name: str, **args):
+    """Context manager recording phase `name` on the active profiler, if any"""
+    profiler = _active_profiler.get()
+    return profiler.phase(name, **args) if profiler is not None else contextlib.nullcontext()
+
+
+def profile_quarter(index: int):
+    profiler = _active_profiler.get()
+    return profiler.quarter(index) if profiler is not None else contextlib.nullcontext()
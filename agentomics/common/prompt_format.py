@@ -0,0 +1,131 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Prompt Formatting
+
+Compact, configurable serialization of the global state for agent prompts.
+Values are printed as percentages with a fixed precision, either as a table
+with one row per quarter or as one line per series, optionally with the
+quarter-on-quarter changes
+
+Author: Akhil Karra
+"""
+
+import functools
+import math
+from dataclasses import dataclass
+
+import tiktoken
+
+from agentomics.common.data_structures import Knobs, ThreeBankGlobalState
+from agentomics.common.profiling import profile_phase
+from agentomics.common.types import NA_STRING
+
+LAYOUTS = ("table", "series")
+GROUP_SEPARATOR = "|"
+
+
+@dataclass(frozen=True)
+class PromptFormat:
+    """Options for serializing the global state into a prompt
+
+    - precision: number of decimals of the percentages
+    - layout: "table" for one row per quarter, "series" for one line per series
+    - include_deltas: also print the change from the previous quarter
+    - separator: string separating the cells of a row
+    """
+    precision: int = 2
+    layout: str = "table"
+    include_deltas: bool = False
+    separator: str = ","
+
+    def __post_init__(self):
+        if self.layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {self.layout!r}, expected one of {LAYOUTS}")
+
+
+DEFAULT_PROMPT_FORMAT = PromptFormat()
+
+
+def _format_value(value: float | None, precision: int) -> str:
+    if value is None:
+        return NA_STRING
+    return f"{value * 100.0:.{precision}f}"
+
+
+def _deltas(values: list[float | None]) -> list[float | None]:
+    return [None] + [
+        None if previous is None or current is None else current - previous
+        for previous, current in zip(values, values[1:], strict=False)
+    ]
+
+
+def _groups(globals: ThreeBankGlobalState, include_deltas: bool) -> list[tuple[str, list]]:
+    """(group, [(name, values), ...]) for every knobs group of the state with
+    values as floats by quarter, or None where not available"""
+    groups = []
+    for group, knobs in globals.__dict__.items():
+        if not isinstance(knobs, Knobs):
+            continue
+        columns = []
+        for name, series in knobs.__dict__.items():
+            values = [None if math.isnan(x) else x for x in series.aligned().tolist()]
+            columns.append((name, values))
+            if include_deltas:
+                columns.append((f"{name}_chg", _deltas(values)))
+        groups.append((group, columns))
+    return groups
+
+
+def format_state(globals: ThreeBankGlobalState, prompt_format: PromptFormat = DEFAULT_PROMPT_FORMAT) -> str:
+    """Serialize the series of the global state compactly for a prompt. All
+    values are percentages and N/A marks a value that is not available. In
+    the table layout, `|` separates the headers (knobs groups) and the header
+    row names the series of each group"""
+    groups = _groups(globals, prompt_format.include_deltas)
+    precision, separator = prompt_format.precision, prompt_format.separator
+
+    lines = [f"Values in %, {NA_STRING} if not available."]
+    if prompt_format.layout == "series":
+        for group, columns in groups:
+            lines.append(f"{group}:")
+            for name, values in columns:
+                lines.append(f"{name}: " + separator.join(_format_value(x, precision) for x in values))
+    else:
+        lines.append(GROUP_SEPARATOR.join(
+            ["quarter"] + [f"{group}: " + separator.join(name for name, _ in columns) for group, columns in groups]
+        ))
+        num_quarters = max((len(values) for _, columns in groups for _, values in columns), default=0)
+        for quarter in range(num_quarters):
+            lines.append(GROUP_SEPARATOR.join([str(quarter + 1)] + [
+                separator.join(
+                    _format_value(values[quarter], precision) if quarter < len(values) else ""
+                    for _, values in columns
+                )
+                for _, columns in groups
+            ]))
+    return "\n".join(lines) + "\n"
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+
+def tokens_saved(globals: ThreeBankGlobalState, prompt_format: PromptFormat = DEFAULT_PROMPT_FORMAT) -> int:
+    """Number of prompt tokens saved by `format_state` compared to the
+    verbose `print_subfields` rendering of the same state. This renders the
+    state twice, so it is meant for tests and benchmarks, not prompts"""
+    return count_tokens(globals.print_subfields()) - count_tokens(format_state(globals, prompt_format))
+
+
+def render_state(globals: ThreeBankGlobalState, prompt_format: PromptFormat | None = DEFAULT_PROMPT_FORMAT) -> str:
+    """Render the state for an agent prompt. A `prompt_format` of None falls
+    back to the verbose `print_subfields` rendering"""
+    with profile_phase("prompt_build"):
+        if prompt_format is None:
+            return globals.print_subfields()
+        return format_state(globals, prompt_format)
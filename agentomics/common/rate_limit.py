@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Rate Limiting
+
+Token-bucket rate limiter shared by every LLM call made while it is active,
+so that many concurrent simulations (sweeps, branches, backtest origins)
+stay within a provider's request rate together instead of each on its own.
+
+Calls are not limited unless a limiter is activated with `rate_limiting()`
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable
+
+_active_limiter: contextvars.ContextVar["RateLimiter | None"] = contextvars.ContextVar("rate_limiter", default=None)
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second on average
+    and bursts of up to `burst` calls"""
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if rate <= 0:
+            raise ValueError("RateLimiter needs a positive rate")
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long to wait until it is available"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        wait = self._reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+
+@contextlib.contextmanager
+def rate_limiting(limiter: RateLimiter):
+    """Limit the LLM calls made in the block, and in threads started with a
+    copy of the current context, with `limiter`"""
+    token = _active_limiter.set(limiter)
+    try:
+        yield limiter
+    finally:
+        _active_limiter.reset(token)
+
+
+def wait_for_rate_limit():
+    """Block until the active rate limiter, if any, allows a call"""
+    limiter = _active_limiter.get()
+    if limiter is not None:
+        limiter.acquire()
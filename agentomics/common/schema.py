@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Knobs Schema Registry
+
+Single registry of every knob and economic variable of the global state:
+its name, type, bounds, series name and the agent that decides it. The
+Knobs containers of the global state, the pydantic models of the Result*
+tools, the repair bounds and the update applied to the state after every
+decision are all generated from it, so that a new field is declared here
+only
+
+Author: Akhil Karra
+"""
+
+from dataclasses import dataclass, field
+
+from langroid.pydantic_v1 import BaseModel, Field, create_model
+
+from agentomics.common.types import NonnegPercent, Percent
+
+TYPE_BOUNDS = {Percent: (-1.0, 1.0), NonnegPercent: (0.0, 1.0)}
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """A series of the global state. `var_name` is the name of its exported
+    column, the field name unless given, and `bounds` are the (low, high)
+    values its type accepts"""
+    name: str
+    type: type
+    series_name: str
+    var_name: str | None = None
+    bounds: tuple[float, float] = field(init=False)
+
+    def __post_init__(self):
+        if self.var_name is None:
+            object.__setattr__(self, "var_name", self.name)
+        object.__setattr__(self, "bounds", TYPE_BOUNDS[self.type])
+
+
+@dataclass(frozen=True)
+class KnobsSchema:
+    """A group of series of the global state decided by one agent, e.g. the
+    central bank knobs. `name` is the attribute of the global state holding
+    them, `agent` the short name of the agent module and `result_name` the
+    field of the agent's Result*Tool holding its decision"""
+    name: str
+    agent: str
+    display_name: str
+    description: str
+    result_name: str
+    fields: tuple[FieldSpec, ...]
+
+
+ECONOMIC_VARIABLES = KnobsSchema(
+    "economic_variables", "economy_agent_llm", "EconomyAgent", "economic variables", "result_econ_vars", (
+        FieldSpec("gdp_growth_rate", Percent, "GDP Growth Rate (% Change)"),
+        FieldSpec("unemployment_rate", NonnegPercent, "Unemployment Rate (%)"),
+        FieldSpec("inflation_rate", Percent, "Inflation Rate (%)"),
+    )
+)
+CENTRAL_BANK_KNOBS = KnobsSchema(
+    "central_bank_knobs", "central_bank", "CentralBank", "central bank knobs", "result_central_bank_knobs", (
+        FieldSpec("target_interest_rate", NonnegPercent, "Target Interest Rate (%)"),
+        FieldSpec("securities_holdings_pc_change", Percent, "Securities Holdings Percent Change (%)",
+                  var_name="total_securities_holdings"),
+    )
+)
+BIG_BANK_KNOBS = KnobsSchema(
+    "big_bank_knobs", "big_bank", "BigBank", "big bank knobs", "result_big_bank_knobs", (
+        FieldSpec("loan_to_deposit_ratio", NonnegPercent, "Loan to Deposit Ratio (%)"),
+        FieldSpec("deposit_interest_rate", NonnegPercent, "Deposit Interest Rate (%)"),
+    )
+)
+SMALL_BANK_KNOBS = KnobsSchema(
+    "small_bank_knobs", "small_bank", "SmallBank", "small bank knobs", "result_small_bank_knobs", (
+        FieldSpec("loans_interest_rate", NonnegPercent, "Loans Interest Rate (%)"),
+        FieldSpec("consumer_loan_focus", NonnegPercent, "Consumer Loan Focus (%)"),
+    )
+)
+
+SCHEMAS = {schema.name: schema for schema in (ECONOMIC_VARIABLES, CENTRAL_BANK_KNOBS, BIG_BANK_KNOBS, SMALL_BANK_KNOBS)}
+
+
+def schema_for_agent(agent: str) -> KnobsSchema:
+    """Schema of the series decided by the agent with short name `agent`"""
+    for schema in SCHEMAS.values():
+        if schema.agent == agent:
+            return schema
+    raise KeyError(f"No knobs schema for agent {agent!r}")
+
+
+def field_bounds() -> dict[str, tuple[float, float]]:
+    """(low, high) of every knob and economic variable, by field name"""
+    return {spec.name: spec.bounds for schema in SCHEMAS.values() for spec in schema.fields}
+
+
+def result_model(schema: KnobsSchema) -> type[BaseModel]:
+    """Pydantic model of the decision of `schema`'s agent, with one float
+    field per series, for the agent's Result*Tool"""
+    name = "".join(part.capitalize() for part in schema.result_name.split("_"))
+    model = create_model(
+        name,
+        **{spec.name: (float, Field(..., description=spec.series_name)) for spec in schema.fields}
+    )
+    model.__doc__ = f"Data structure for extracting output {schema.description} from {schema.display_name}"
+    return model
@@ -0,0 +1,144 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Stopping Criteria
+
+Pluggable criteria that the orchestrators evaluate after every simulated
+quarter to end a run early once it has converged, diverged, left sane
+bounds or spent its token/cost budget
+
+Author: Akhil Karra
+"""
+
+import math
+from typing import Callable, Iterable
+
+from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.usage import run_usage
+
+DEFAULT_ECON_VAR_BOUNDS = {
+    "gdp_growth_rate": (-0.2, 0.2),
+    "unemployment_rate": (0.0, 0.5),
+    "inflation_rate": (-0.2, 0.3),
+}
+
+
+def _last_two(series) -> tuple[float, float] | None:
+    """Return the last two values of a TypedArray as floats, or None if there
+    are fewer than two values or either of them is N/A"""
+    if len(series) < 2 or not (series.is_valid(-2) and series.is_valid(-1)):
+        return None
+    return series[-2].to_val(), series[-1].to_val()
+
+
+class StoppingCriterion:
+    """Base class for a criterion checked once per simulated quarter. Checks
+    only look at the newest values so they cost O(1) per quarter"""
+    def reset(self, globals: ThreeBankGlobalState):
+        """Called once before the first quarter of a run is simulated"""
+
+    def check(self, globals: ThreeBankGlobalState) -> str | None:
+        """Return a human-readable reason to stop, or None to keep going"""
+        raise NotImplementedError
+
+
+class ConvergenceCriterion(StoppingCriterion):
+    """Stop once every economic variable has moved less than `threshold`
+    between consecutive quarters for `patience` quarters in a row"""
+    def __init__(self, threshold: float = 1e-3, patience: int = 2):
+        self.threshold = threshold
+        self.patience = patience
+        self._streak = 0
+
+    def reset(self, globals: ThreeBankGlobalState):
+        self._streak = 0
+
+    def check(self, globals: ThreeBankGlobalState) -> str | None:
+        deltas = []
+        for series in globals.economic_variables.__dict__.values():
+            last_two = _last_two(series)
+            if last_two is None:
+                self._streak = 0
+                return None
+            deltas.append(abs(last_two[1] - last_two[0]))
+        if max(deltas) < self.threshold:
+            self._streak += 1
+        else:
+            self._streak = 0
+        if self._streak >= self.patience:
+            return f"converged: economic variables moved less than {self.threshold} for {self._streak} quarters"
+        return None
+
+
+class DivergenceCriterion(StoppingCriterion):
+    """Stop when any series jumps by more than `max_step` in a single
+    quarter, which signals a run-away simulation"""
+    def __init__(self, max_step: float = 0.1):
+        self.max_step = max_step
+
+    def check(self, globals: ThreeBankGlobalState) -> str | None:
+        for series in globals.iter_series():
+            last_two = _last_two(series)
+            if last_two is not None and abs(last_two[1] - last_two[0]) > self.max_step:
+                return f"diverged: {series.var_name} moved from {last_two[0]} to {last_two[1]}"
+        return None
+
+
+class BoundsCriterion(StoppingCriterion):
+    """Stop when the latest value of a series leaves its (low, high) bounds.
+    Bounds are keyed by the `var_name` of the series"""
+    def __init__(self, bounds: dict[str, tuple[float, float]] | None = None):
+        self.bounds = bounds if bounds is not None else DEFAULT_ECON_VAR_BOUNDS
+
+    def check(self, globals: ThreeBankGlobalState) -> str | None:
+        for series in globals.iter_series():
+            if series.var_name not in self.bounds or not series or not series.is_valid(-1):
+                continue
+            latest = series[-1].to_val()
+            low, high = self.bounds[series.var_name]
+            if not math.isfinite(latest) or not (low <= latest <= high):
+                return f"out of bounds: {series.var_name}={latest} outside [{low}, {high}]"
+        return None
+
+
+class BudgetCriterion(StoppingCriterion):
+    """Stop once the run has used at least `max_tokens` tokens or at least
+    `max_cost` USD. Usage is measured relative to the moment the run started
+    using `usage_fn`, which defaults to the usage metered for the current
+    run, so that concurrent runs are not charged for each other's calls"""
+    def __init__(
+        self,
+        max_tokens: int | None = None,
+        max_cost: float | None = None,
+        usage_fn: Callable[[], tuple[int, float]] = run_usage
+    ):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.usage_fn = usage_fn
+        self._start_tokens, self._start_cost = 0, 0.0
+
+    def reset(self, globals: ThreeBankGlobalState):
+        self._start_tokens, self._start_cost = self.usage_fn()
+
+    def check(self, globals: ThreeBankGlobalState) -> str | None:
+        tokens, cost = self.usage_fn()
+        tokens -= self._start_tokens
+        cost -= self._start_cost
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            return f"budget exhausted: {tokens} tokens used (max {self.max_tokens})"
+        if self.max_cost is not None and cost >= self.max_cost:
+            return f"budget exhausted: ${cost:.4f} spent (max ${self.max_cost:.4f})"
+        return None
+
+
+def reset_criteria(criteria: Iterable[StoppingCriterion], globals: ThreeBankGlobalState):
+    for criterion in criteria:
+        criterion.reset(globals)
+
+
+def first_stop_reason(criteria: Iterable[StoppingCriterion], globals: ThreeBankGlobalState) -> str | None:
+    """Evaluate the criteria in order and return the first reason to stop"""
+    for criterion in criteria:
+        reason = criterion.check(globals)
+        if reason is not None:
+            return reason
+    return None
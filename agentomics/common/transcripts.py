@@ -0,0 +1,176 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Transcript Store
+
+Stores every agent call (prompt, raw response, parsed result tool and
+timings) in a SQLite database, indexed by run, quarter and agent, so that
+decisions can be audited and replayed without calling the LLM again. The
+text of each call is compressed with zstd when `zstandard` is installed and
+with zlib otherwise; the codec is stored per call so either can be read back.
+
+Recording is off unless a store is activated with `recording_transcripts()`
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from agentomics.utils.logging import current_log_context
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    quarter INTEGER,
+    agent TEXT NOT NULL,
+    started REAL NOT NULL,
+    llm_seconds REAL NOT NULL,
+    parse_seconds REAL NOT NULL,
+    prompt_sha TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_by_run ON calls (run_id, quarter, agent);
+CREATE INDEX IF NOT EXISTS calls_by_prompt ON calls (agent, prompt_sha);
+"""
+
+_active_store: contextvars.ContextVar["TranscriptStore | None"] = contextvars.ContextVar("transcript_store", default=None)
+
+
+@dataclass
+class Transcript:
+    """One agent call. `tool` is the parsed result tool as a dict, or None
+    if the response could not be parsed"""
+    agent: str
+    prompt: str
+    response: str
+    tool: dict | None = None
+    run_id: str | None = None
+    quarter: int | None = None
+    started: float = 0.0
+    llm_seconds: float = 0.0
+    parse_seconds: float = 0.0
+
+
+def _prompt_sha(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transcript was compressed with zstd, install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class TranscriptStore:
+    """Thread-safe SQLite store of agent call transcripts at `path` (a file
+    or ":memory:")"""
+    def __init__(self, path: str, codec: str | None = None):
+        self.codec = codec or ("zstd" if zstandard is not None else "zlib")
+        if self.codec == "zstd" and zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package")
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def add(self, transcript: Transcript):
+        payload = json.dumps({"prompt": transcript.prompt, "response": transcript.response, "tool": transcript.tool})
+        row = (
+            transcript.run_id, transcript.quarter, transcript.agent, transcript.started,
+            transcript.llm_seconds, transcript.parse_seconds, _prompt_sha(transcript.prompt),
+            self.codec, _compress(payload.encode(), self.codec)
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO calls (run_id, quarter, agent, started, llm_seconds, parse_seconds, prompt_sha, codec, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+
+    def _transcripts(self, query: str, params: tuple) -> list[Transcript]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT agent, run_id, quarter, started, llm_seconds, parse_seconds, codec, payload FROM calls " + query,
+                params
+            ).fetchall()
+        transcripts = []
+        for agent, run_id, quarter, started, llm_seconds, parse_seconds, codec, payload in rows:
+            fields = json.loads(_decompress(payload, codec))
+            transcripts.append(Transcript(agent, run_id=run_id, quarter=quarter, started=started,
+                                          llm_seconds=llm_seconds, parse_seconds=parse_seconds, **fields))
+        return transcripts
+
+    def query(self, run_id: str | None = None, quarter: int | None = None, agent: str | None = None) -> list[Transcript]:
+        """Transcripts matching every given filter, in call order"""
+        filters = {"run_id": run_id, "quarter": quarter, "agent": agent}
+        conditions = [f"{name} = ?" for name, value in filters.items() if value is not None]
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return self._transcripts(where + "ORDER BY id", tuple(value for value in filters.values() if value is not None))
+
+    def replay(self, run_id: str, agent: str | None = None) -> Iterator[Transcript]:
+        """Calls of run `run_id` (optionally of one agent) in the order they
+        were made"""
+        yield from self.query(run_id=run_id, agent=agent)
+
+    def find_response(self, agent: str, prompt: str) -> Transcript | None:
+        """Most recent parsed call of `agent` for exactly `prompt`, usable as
+        a cached response"""
+        transcripts = self._transcripts(
+            "WHERE agent = ? AND prompt_sha = ? ORDER BY id DESC", (agent, _prompt_sha(prompt))
+        )
+        return next((transcript for transcript in transcripts if transcript.prompt == prompt and transcript.tool is not None), None)
+
+    def runs(self) -> list[str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT run_id FROM calls WHERE run_id IS NOT NULL GROUP BY run_id ORDER BY MIN(id)").fetchall()
+        return [run_id for (run_id,) in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+@contextlib.contextmanager
+def recording_transcripts(store: TranscriptStore):
+    """Record the agent calls made in the block, and in threads started with
+    a copy of the current context, to `store`"""
+    token = _active_store.set(store)
+    try:
+        yield store
+    finally:
+        _active_store.reset(token)
+
+
+def record_call(agent: str, prompt: str, response: str, tool: dict | None, started: float, llm_seconds: float, parse_seconds: float):
+    """Add a call to the active transcript store, if any, tagged with the run
+    and quarter of the log context"""
+    store = _active_store.get()
+    if store is None:
+        return
+    context = current_log_context()
+    store.add(Transcript(
+        agent, prompt, response, tool, run_id=context.get("run_id"), quarter=context.get("quarter"),
+        started=started, llm_seconds=llm_seconds, parse_seconds=parse_seconds
+    ))
@@ -8,52 +8,288 @@ checking to guarantee safety and correctness of simulations
 Author: Akhil Karra
 """
 
-from dataclasses import dataclass
+import bisect
+import functools
+from array import array
+
+import numpy as np
+
+_NA = float("-inf")
+NA_STRING = "N/A"
+
+
+@functools.lru_cache(maxsize=None)
+def missing_value(type_check):
+    """The single N/A element of `type_check` stored at every missing
+    position of a TypedArray, so that gaps cost no object each"""
+    return type_check(_NA)
+
+
+def _pack(valid: np.ndarray) -> bytearray:
+    return bytearray(np.packbits(valid, bitorder="little").tobytes())
+
+
+def _unpack(validity: bytes | bytearray, count: int) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(bytes(validity), dtype=np.uint8), count=count, bitorder="little").astype(bool)
 
 
 class TypedArray:
-    """Custom array datatype that typechecks every element added or set"""
+    """Custom array datatype that typechecks every element added or set.
+
+    Missing values (None, or the N/A value of the element type) are tracked
+    in a validity bitmask next to the elements, one bit per element as in
+    Arrow, and are stored as the shared `missing_value` of the type. Every
+    element also records the index of the quarter it belongs to, so that
+    series of different lengths can be lined up by time. Quarter indices
+    strictly increase along the array, so that the last element is always
+    the latest"""
     def __init__(self, type_check, series_name: str | None = None, var_name: str | None = None):
         self.type_check = type_check
         self.series_name: str | None = series_name
         self.var_name: str | None = var_name
         self._array = []
+        self._uncertainty: list[float | None] = []
+        # Bit i of byte i // 8 is set if element i is valid
+        self._validity = bytearray()
+        # Quarter index of every element, 0 for the first quarter of the state
+        self._quarters = array("q")
+        # Whether the lists are shared with a fork and must be copied before
+        # they are written to
+        self._shared = False
 
     def _type_check(self, item):
-        if not isinstance(item, self.type_check):
+        if item is not None and not isinstance(item, self.type_check):
             raise TypeError(f"Item must be of type {self.type_check.__name__}")
 
-    def append(self, item):
+    def _own(self):
+        if self._shared:
+            self._array = list(self._array)
+            self._uncertainty = list(self._uncertainty)
+            self._validity = bytearray(self._validity)
+            self._quarters = array("q", self._quarters)
+            self._shared = False
+
+    def _store(self, item):
+        """The element to store for `item` and whether it is valid"""
+        if item is None or item.to_val() == _NA:
+            return missing_value(self.type_check), False
+        return item, True
+
+    def _set_valid(self, index: int, valid: bool):
+        byte, bit = divmod(index, 8)
+        if valid:
+            self._validity[byte] |= 1 << bit
+        else:
+            self._validity[byte] &= ~(1 << bit) & 0xFF
+
+    def fork(self) -> "TypedArray":
+        """Copy of this array that shares its history copy-on-write: both
+        arrays keep pointing at the same elements until either is written
+        to, which then copies its list of references only"""
+        forked = TypedArray(self.type_check, self.series_name, self.var_name)
+        forked._array = self._array
+        forked._uncertainty = self._uncertainty
+        forked._validity = self._validity
+        forked._quarters = self._quarters
+        forked._shared = self._shared = True
+        return forked
+
+    def __copy__(self) -> "TypedArray":
+        return self.fork()
+
+    def __deepcopy__(self, memo) -> "TypedArray":
+        # Elements are immutable, so copying the lists of references and the
+        # buffers is a full copy
+        copied = TypedArray(self.type_check, self.series_name, self.var_name)
+        copied._array = list(self._array)
+        copied._uncertainty = list(self._uncertainty)
+        copied._validity = bytearray(self._validity)
+        copied._quarters = array("q", self._quarters)
+        return copied
+
+    def __getstate__(self) -> dict:
+        """Pickle the elements as flat buffers: their values as float64, the
+        validity bitmask, the quarter indices and the uncertainty as float64
+        with NaN for None. The quarters are left out when they are 0, 1, ...,
+        the uncertainty when it is all None and the names of the elements
+        when none is named"""
+        names = [getattr(x, "name", None) for x in self._array]
+        quarters = self.quarters()
+        return {
+            "type_check": self.type_check,
+            "series_name": self.series_name,
+            "var_name": self.var_name,
+            "values": np.fromiter((x.to_val() for x in self._array), dtype=float, count=len(self._array)).tobytes(),
+            "uncertainty": np.array(self._uncertainty, dtype=float).tobytes() if self.has_uncertainty() else None,
+            "validity": bytes(self._validity),
+            "quarters": None if np.array_equal(quarters, np.arange(len(quarters))) else quarters.tobytes(),
+            "names": names if any(name is not None for name in names) else None,
+        }
+
+    def __setstate__(self, state: dict):
+        self.type_check = state["type_check"]
+        self.series_name = state["series_name"]
+        self.var_name = state["var_name"]
+        self._validity = bytearray(state["validity"])
+        self._shared = False
+        values = np.frombuffer(state["values"], dtype=float).tolist()
+        self._quarters = array("q")
+        if state["quarters"] is None:
+            self._quarters.extend(range(len(values)))
+        else:
+            self._quarters.frombytes(state["quarters"])
+        valid = _unpack(state["validity"], len(values)).tolist()
+        missing = missing_value(self.type_check)
+        if state["names"] is None:
+            self._array = [self.type_check(x) if ok else missing for x, ok in zip(values, valid, strict=True)]
+        else:
+            self._array = [
+                self.type_check(x, name) if ok else missing for x, ok, name in zip(values, valid, state["names"], strict=True)
+            ]
+        if state["uncertainty"] is None:
+            self._uncertainty = [None] * len(values)
+        else:
+            self._uncertainty = [None if x != x else x for x in np.frombuffer(state["uncertainty"], dtype=float).tolist()]
+
+    def index_of_quarter(self, quarter: int) -> int | None:
+        """Position of the element of quarter index `quarter`, or None if
+        `quarter` comes after the latest element. Raises ValueError for an
+        earlier quarter without an element, which cannot be appended"""
+        if not self._quarters or quarter > self._quarters[-1]:
+            return None
+        index = bisect.bisect_left(self._quarters, quarter)
+        if self._quarters[index] != quarter:
+            raise ValueError(f"Quarter {quarter} is before the latest quarter {self._quarters[-1]}")
+        return index
+
+    def append(self, item, uncertainty: float | None = None, quarter: int | None = None):
+        """Append `item` as the value of quarter index `quarter`, by default
+        the quarter after the latest element. If that quarter already has an
+        element, its value and uncertainty are replaced instead"""
         self._type_check(item)
+        index = self.index_of_quarter(quarter) if quarter is not None else None
+        self._own()
+        item, valid = self._store(item)
+        if index is not None:
+            self._array[index] = item
+            self._uncertainty[index] = uncertainty
+            self._set_valid(index, valid)
+            return
+        if len(self._array) % 8 == 0:
+            self._validity.append(0)
+        if valid:
+            self._set_valid(len(self._array), True)
         self._array.append(item)
+        self._uncertainty.append(uncertainty)
+        self._quarters.append(quarter if quarter is not None else self.next_quarter())
 
-    def set_array(self, L: list):
-        map(self._type_check, L)
+    def set_array(self, L: list, quarters: list[int] | None = None):
+        """Replace the elements with `L`, of strictly increasing quarter
+        indices `quarters` (by default 0, 1, ...)"""
+        for x in L:
+            self._type_check(x)
+        if quarters is not None and (len(quarters) != len(L) or np.any(np.diff(quarters) <= 0)):
+            raise ValueError("Quarters must be strictly increasing, one per element")
+        valid = np.fromiter((x is not None and x.to_val() != _NA for x in L), dtype=bool, count=len(L))
+        # Always copy, so that the caller's list is never shared with the series
+        if valid.all():
+            L = list(L)
+        else:
+            missing = missing_value(self.type_check)
+            L = [x if is_valid else missing for x, is_valid in zip(L, valid.tolist(), strict=True)]
         self._array = L
+        self._uncertainty = [None] * len(L)
+        self._validity = _pack(valid)
+        self._quarters = array("q", quarters if quarters is not None else range(len(L)))
+        self._shared = False
+
+    def set_uncertainty(self, index, uncertainty: float | None):
+        """Record the dispersion of the ensemble that produced an element"""
+        self._own()
+        self._uncertainty[index] = uncertainty
+
+    def uncertainty(self) -> list[float | None]:
+        """Uncertainty series aligned with the values, None where a value
+        did not come from an ensemble"""
+        return self._uncertainty
+
+    def has_uncertainty(self) -> bool:
+        return any(x is not None for x in self._uncertainty)
+
+    def validity(self) -> np.ndarray:
+        """Boolean array, False where a value is missing"""
+        return _unpack(self._validity, len(self._array))
+
+    def is_valid(self, index: int) -> bool:
+        byte, bit = divmod(range(len(self._array))[index], 8)
+        return bool(self._validity[byte] >> bit & 1)
+
+    def null_count(self) -> int:
+        return len(self._array) - int.from_bytes(self._validity, "little").bit_count()
+
+    def quarters(self) -> np.ndarray:
+        """Quarter index of every element"""
+        return np.array(self._quarters, dtype=np.int64)
+
+    def next_quarter(self) -> int:
+        return self._quarters[-1] + 1 if self._quarters else 0
+
+    def aligned(self, num_quarters: int | None = None) -> np.ndarray:
+        """Values as floats indexed by quarter, up to `num_quarters` (by
+        default the latest quarter), with NaN for missing values and for
+        quarters without an element"""
+        num_quarters = num_quarters if num_quarters is not None else self.next_quarter()
+        aligned = np.full(num_quarters, np.nan)
+        quarters = self.quarters()
+        keep = quarters < num_quarters
+        aligned[quarters[keep]] = self.to_numpy()[keep]
+        return aligned
+
+    def to_numpy(self) -> np.ndarray:
+        """Values as floats with NaN where missing"""
+        values = np.array([x.to_val() for x in self._array], dtype=float)
+        values[~self.validity()] = np.nan
+        return values
 
     def to_list(self, elementary_types=False):
+        """The elements, or with `elementary_types` their values as floats
+        with None where missing"""
         if elementary_types:
-            return [x.to_val() for x in self._array]
+            return [x.to_val() if valid else None for x, valid in zip(self._array, self.validity().tolist(), strict=True)]
         else:
             return self._array
 
     def __getitem__(self, index):
         if isinstance(index, slice):
-            return TypedArray(self.type_check, self._array[index])
+            sliced = TypedArray(self.type_check, self.series_name, self.var_name)
+            sliced._array = self._array[index]
+            sliced._uncertainty = self._uncertainty[index]
+            sliced._validity = _pack(self.validity()[index])
+            sliced._quarters = self._quarters[index]
+            return sliced
         return self._array[index]
 
     def __setitem__(self, index, item):
         self._type_check(item)
+        self._own()
+        item, valid = self._store(item)
         self._array[index] = item
+        self._set_valid(range(len(self._array))[index], valid)
 
     def __add__(self, other):
         if not isinstance(other, TypedArray):
             raise TypeError("Can only concatenate with another TypedArray")
         # Check that all items in the other list are of the correct type
-        map(self._type_check, other)
+        for x in other:
+            self._type_check(x)
         # Return a new TypedArray with the combined items
         new_list = TypedArray(self.type_check)
         new_list._array = self._array + other._array
+        new_list._uncertainty = self._uncertainty + other._uncertainty
+        new_list._validity = _pack(np.concatenate([self.validity(), other.validity()]))
+        # The other elements follow the latest one, keeping their spacing
+        offset = self.next_quarter() - other._quarters[0] if other._quarters else 0
+        new_list._quarters = self._quarters + array("q", (quarter + offset for quarter in other._quarters))
         return new_list
 
     def __eq__(self, other):
@@ -70,47 +306,107 @@ class TypedArray:
         return len(self._array)
 
     def __repr__(self):
-        return repr(self._array)
+        return "[" + ", ".join(
+            repr(x) if valid else NA_STRING for x, valid in zip(self._array, self.validity().tolist(), strict=True)
+        ) + "]"
 
     def print_subfields(self):
         print(f"{self.var_name} ({self.series_name}):")
-        for item in self._array:
-            print(f"  - {item}")
+        for item, valid in zip(self._array, self.validity().tolist(), strict=True):
+            print(f"  - {item if valid else NA_STRING}")
 
 
-@dataclass(frozen=True)
 class Percent(float):
     """Custom percent datatype to ensure that LLMs return reasonable
-    percentage values to the recurring global state. We treat negative infinite values as N/A values."""
-    value: float
-    name: str | None = None
+    percentage values to the recurring global state. We treat negative infinite values as N/A values.
 
-    def __post_init__(self):
-        if not (0.0 <= abs(self.value) <= 1.0) and self.value != float("-inf"):
+    The value is the float itself, validated once in `__new__`; only the
+    optional `name` is stored next to it, in a slot"""
+    __slots__ = ("name",)
+
+    def __new__(cls, value: float, name: str | None = None):
+        value = float(value)
+        if not (0.0 <= abs(value) <= 1.0) and value != _NA:
             raise ValueError("Invalid percentage input")
+        self = super().__new__(cls, value)
+        object.__setattr__(self, "name", name)
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), (float(self), self.name))
+
+    def __eq__(self, other):
+        # Percents of the same type also compare names, as when this was a
+        # dataclass, and percents of another type are never equal. Plain
+        # numbers compare by value
+        if other.__class__ is self.__class__:
+            return float(self) == float(other) and self.name == other.name
+        if isinstance(other, (Percent, NonnegPercent)):
+            return False
+        if isinstance(other, (int, float)):
+            return float(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((float(self), self.name))
+
+    @property
+    def value(self) -> float:
+        return float(self)
 
     def __repr__(self):
-        if self.value == float("-inf"):
-            return "N/A"
-        return repr(self.value * 100.0) + "%"
+        value = float(self)
+        if value == _NA:
+            return NA_STRING
+        return repr(value * 100.0) + "%"
 
     def to_val(self):
-        return self.value
+        return float(self)
 
 
-@dataclass(frozen=True)
 class NonnegPercent(float):
     """Custom nonnegative percent datatype to ensure that LLMs return reasonable percentage values to the recurring global state. We treat negative infinite values as N/A values."""
-    value: float
+    __slots__ = ()
 
-    def __post_init__(self):
-        if not (0.0 <= self.value <= 1.0) and self.value != float("-inf"):
+    def __new__(cls, value: float):
+        value = float(value)
+        if not (0.0 <= value <= 1.0) and value != _NA:
             raise ValueError("Invalid nonnegative percentage input")
+        return super().__new__(cls, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if isinstance(other, (Percent, NonnegPercent)):
+            return other.__class__ is self.__class__ and float(self) == float(other)
+        if isinstance(other, (int, float)):
+            return float(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((float(self),))
+
+    @property
+    def value(self) -> float:
+        return float(self)
 
     def __repr__(self):
-        if self.value == float("-inf"):
-            return "N/A"
-        return repr(self.value * 100.0) + "%"
+        value = float(self)
+        if value == _NA:
+            return NA_STRING
+        return repr(value * 100.0) + "%"
 
     def to_val(self):
-        return self.value
+        return float(self)
@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Per-Run LLM Usage
+
+Tokens and cost of the LLM calls made by one simulation run. Langroid only
+counts usage per process, so runs that execute concurrently (sweeps,
+branches, backtest origins) would be charged for each other's calls. A
+meter activated with `metering_usage()` counts only the calls made in its
+block, and in threads started with a copy of the current context
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+import threading
+
+from langroid.language_models.base import LanguageModel, LLMTokenUsage
+
+_active_meter: contextvars.ContextVar["UsageMeter | None"] = contextvars.ContextVar("usage_meter", default=None)
+
+
+class UsageMeter:
+    """Thread-safe total of the tokens and cost of a run's LLM calls"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.cost = 0.0
+
+    def add(self, tokens: int, cost: float):
+        with self._lock:
+            self.tokens += tokens
+            self.cost += cost
+
+    def totals(self) -> tuple[int, float]:
+        with self._lock:
+            return self.tokens, self.cost
+
+
+@contextlib.contextmanager
+def metering_usage(meter: UsageMeter):
+    """Count the usage of the LLM calls made in the block with `meter`"""
+    token = _active_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _active_meter.reset(token)
+
+
+def record_usage(usage: LLMTokenUsage | None):
+    """Add the usage of an LLM response to the active meter, if any"""
+    meter = _active_meter.get()
+    if meter is not None and usage is not None:
+        meter.add(usage.total_tokens, usage.cost)
+
+
+def run_usage() -> tuple[int, float]:
+    """(tokens, cost) counted by the active meter, or Langroid's
+    process-wide totals when no meter is active"""
+    meter = _active_meter.get()
+    if meter is None:
+        return LanguageModel.tot_tokens_cost()
+    return meter.totals()
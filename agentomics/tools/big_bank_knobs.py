@@ -10,14 +10,10 @@ Author: Akhil Karra
 
 import langroid as lr
 from langroid.agent.tools.orchestration import ResultTool
-from langroid.pydantic_v1 import BaseModel, Field
 
+from agentomics.common.schema import BIG_BANK_KNOBS, result_model
 
-class ResultBigBankKnobs(BaseModel):
-    """Data structure for extracting output big bank knobs from
-    BigBank"""
-    loan_to_deposit_ratio: float = Field(..., description="Loan to Deposit Ratio (%)")
-    deposit_interest_rate: float = Field(..., description="Deposit Interest Rate (%)")
+ResultBigBankKnobs = result_model(BIG_BANK_KNOBS)
 
 
 class ResultBigBankKnobsTool(lr.agent.ToolMessage):
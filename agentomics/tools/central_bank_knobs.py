@@ -10,14 +10,10 @@ Author: Akhil Karra
 
 import langroid as lr
 from langroid.agent.tools.orchestration import ResultTool
-from langroid.pydantic_v1 import BaseModel, Field
 
+from agentomics.common.schema import CENTRAL_BANK_KNOBS, result_model
 
-class ResultCentralBankKnobs(BaseModel):
-    """Data structure for extracting output central bank knobs from
-    CentralBank"""
-    target_interest_rate: float = Field(..., description="Target Interest Rate (%)")
-    securities_holdings_pc_change: float = Field(..., description="Securities Holdings Percent Change (%)")
+ResultCentralBankKnobs = result_model(CENTRAL_BANK_KNOBS)
 
 
 class ResultCentralBankKnobsTool(lr.agent.ToolMessage):
@@ -10,15 +10,10 @@ Author: Akhil Karra
 
 import langroid as lr
 from langroid.agent.tools.orchestration import ResultTool
-from langroid.pydantic_v1 import BaseModel, Field
 
+from agentomics.common.schema import ECONOMIC_VARIABLES, result_model
 
-class ResultEconVars(BaseModel):
-    """Data structure for extracting output economic variables from
-    EconomyAgent"""
-    gdp_growth_rate: float = Field(..., description="GDP Growth Rate (% Change)")
-    unemployment_rate: float = Field(..., description="Unemployment Rate (%)")
-    inflation_rate: float = Field(..., description="Inflation Rate (%)")
+ResultEconVars = result_model(ECONOMIC_VARIABLES)
 
 
 class ResultEconVarsTool(lr.agent.ToolMessage):
@@ -0,0 +1,231 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Tool Output Repair
+
+Repair layer between the LLM response and the Result*Tool handlers. Answers
+that almost match a result tool are fixed locally instead of repeating the
+whole multi-turn task: the JSON is extracted leniently (missing `request`
+heading, bare result fields, percent strings), values given in percent
+instead of decimals are converted and values outside the range of their
+series are clamped with a warning. Answers that cannot be repaired get a
+short follow-up in the same conversation
+
+Author: Akhil Karra
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import langroid as lr
+from langroid.parsing.parse_json import extract_top_level_json
+from langroid.pydantic_v1 import BaseModel, ValidationError
+
+from agentomics.common.profiling import profile_phase
+from agentomics.common.rate_limit import wait_for_rate_limit
+from agentomics.common.schema import field_bounds
+from agentomics.common.transcripts import record_call
+from agentomics.common.usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_UP_MESSAGE = (
+    "Your last answer could not be read as the `{request}` tool. Answer again "
+    "as your instructions say, with the heading `TOOL: {request}` followed by "
+    "only the JSON of the tool, and give every value as a decimal (e.g. 0.025 "
+    "for 2.5%)."
+)
+
+FIELD_BOUNDS = field_bounds()
+
+
+@dataclass
+class RepairStats:
+    """Counts of the answers repaired instead of retrying the full task"""
+    local_repairs: int = 0
+    follow_ups: int = 0
+    follow_ups_answered: int = 0
+    normalized_fields: int = 0
+    clamped_fields: int = 0
+
+    @property
+    def retries_avoided(self) -> int:
+        return self.local_repairs + self.follow_ups_answered
+
+
+class RepairTracker:
+    """Thread-safe record of the repairs made by all agents"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = RepairStats()
+
+    def add(self, **counts: int):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self.stats, name, getattr(self.stats, name) + count)
+
+    def retries_avoided(self) -> int:
+        with self._lock:
+            return self.stats.retries_avoided
+
+    def reset(self):
+        with self._lock:
+            self.stats = RepairStats()
+
+
+REPAIR_TRACKER = RepairTracker()
+
+
+def _to_float(value) -> float:
+    """Parse a number that may be given as a string such as "2.5%", which is
+    converted to a decimal"""
+    if isinstance(value, str):
+        value = value.strip().replace(",", "")
+        if value.endswith("%"):
+            return float(value[:-1]) / 100.0
+    return float(value)
+
+
+def normalize_values(values: dict[str, float], bounds: dict[str, tuple[float, float]] = FIELD_BOUNDS) -> dict[str, float]:
+    """Bring every value with known bounds into range. A value outside its
+    bounds but within the same bounds in percent is divided by 100; any value
+    still outside its bounds is clamped. Both are logged as warnings"""
+    normalized = dict(values)
+    for name, value in values.items():
+        if name not in bounds:
+            continue
+        low, high = bounds[name]
+        if not (low <= value <= high) and low * 100.0 <= value <= high * 100.0:
+            logger.warning("%s=%s looks like a percentage, using %s", name, value, value / 100.0)
+            REPAIR_TRACKER.add(normalized_fields=1)
+            value = value / 100.0
+        if not (low <= value <= high):
+            clamped = min(max(value, low), high)
+            logger.warning("%s=%s is outside [%s, %s], clamping to %s", name, value, low, high, clamped)
+            REPAIR_TRACKER.add(clamped_fields=1)
+            value = clamped
+        normalized[name] = value
+    return normalized
+
+
+def _result_field(tool_cls: type[lr.agent.ToolMessage]) -> tuple[str, type[BaseModel]]:
+    """Name and model of the field holding the structured result of a
+    Result*Tool class"""
+    for name, model_field in tool_cls.__fields__.items():
+        if isinstance(model_field.type_, type) and issubclass(model_field.type_, BaseModel):
+            return name, model_field.type_
+    raise TypeError(f"{tool_cls.__name__} has no structured result field")
+
+
+def normalize_tool(tool: lr.agent.ToolMessage) -> lr.agent.ToolMessage:
+    """Return `tool` with the values of its structured result in range"""
+    result_field, result_cls = _result_field(type(tool))
+    values = getattr(tool, result_field).dict()
+    normalized = normalize_values(values)
+    if normalized == values:
+        return tool
+    return type(tool)(**{result_field: result_cls(**normalized)})
+
+
+def _candidate_payloads(text: str, tool_cls: type[lr.agent.ToolMessage]):
+    """Yield the result fields of every JSON object in `text` that looks like
+    an answer for `tool_cls`, with or without the tool wrapper"""
+    result_field, result_cls = _result_field(tool_cls)
+    for candidate in extract_top_level_json(text):
+        obj = json.loads(candidate)
+        if not isinstance(obj, dict):
+            continue
+        obj = obj.get("properties", obj) if isinstance(obj.get("properties"), dict) else obj
+        if isinstance(obj.get(result_field), dict):
+            yield obj[result_field]
+        elif set(result_cls.__fields__) <= set(obj):
+            yield obj
+
+
+def repair_tool_message(text: str, tool_cls: type[lr.agent.ToolMessage]) -> lr.agent.ToolMessage | None:
+    """Leniently extract a `tool_cls` answer from the raw LLM response `text`
+    with its values in range, or None if no answer could be found"""
+    _, result_cls = _result_field(tool_cls)
+    for payload in _candidate_payloads(text, tool_cls):
+        try:
+            values = {name: _to_float(payload[name]) for name in result_cls.__fields__}
+            result = result_cls(**values)
+        except (KeyError, TypeError, ValueError, ValidationError):
+            continue
+        return normalize_tool(tool_cls(**{_result_field(tool_cls)[0]: result}))
+    return None
+
+
+class RepairingChatAgent(lr.ChatAgent):
+    """ChatAgent that repairs LLM answers which almost match its
+    `result_tool_cls` before they reach the tool handlers, and otherwise asks
+    once for the tool in the same conversation"""
+    result_tool_cls: type[lr.agent.ToolMessage]
+
+    def init_state(self):
+        super().init_state()
+        self._follow_up_pending = False
+
+    def _repair_response(self, response: lr.ChatDocument):
+        """Replace a missing or malformed result tool in `response` by its
+        repair, and bring the values of a valid one into range"""
+        try:
+            tools = self.get_tool_messages(response)
+        except ValidationError:
+            tools = []
+        result_tools = [tool for tool in tools if isinstance(tool, self.result_tool_cls)]
+        if result_tools:
+            normalized = [normalize_tool(tool) for tool in result_tools]
+            repaired = any(new is not old for new, old in zip(normalized, result_tools, strict=True))
+            response.tool_messages = response.all_tool_messages = normalized
+        else:
+            text = response.content
+            if response.function_call is not None:
+                text += json.dumps(response.function_call.arguments)
+            tool = repair_tool_message(text, self.result_tool_cls)
+            if tool is None:
+                return
+            repaired = True
+            response.tool_messages = response.all_tool_messages = [tool]
+        if repaired:
+            REPAIR_TRACKER.add(local_repairs=1)
+        if self._follow_up_pending:
+            REPAIR_TRACKER.add(follow_ups_answered=1)
+            self._follow_up_pending = False
+
+    def _result_tool_of(self, response: lr.ChatDocument) -> dict | None:
+        for tool in response.tool_messages:
+            if isinstance(tool, self.result_tool_cls):
+                return json.loads(tool.json())
+        return None
+
+    def llm_response(self, message: str | lr.ChatDocument | None = None) -> lr.ChatDocument | None:
+        agent_name = type(self).__name__
+        wait_for_rate_limit()
+        started = time.time()
+        llm_start = time.perf_counter()
+        with profile_phase("llm_call", agent=agent_name):
+            response = super().llm_response(message)
+        llm_seconds = time.perf_counter() - llm_start
+        if response is None:
+            return None
+        record_usage(response.metadata.usage)
+        parse_start = time.perf_counter()
+        with profile_phase("tool_parse", agent=agent_name):
+            self._repair_response(response)
+        parse_seconds = time.perf_counter() - parse_start
+        prompt = message.content if isinstance(message, lr.ChatDocument) else message or ""
+        record_call(agent_name, prompt, response.content, self._result_tool_of(response), started, llm_seconds, parse_seconds)
+        return response
+
+    def handle_message_fallback(self, msg: str | lr.ChatDocument) -> str | None:
+        """Ask the LLM once to resend an answer that could not be repaired"""
+        if not isinstance(msg, lr.ChatDocument) or msg.metadata.sender != lr.Entity.LLM:
+            return None
+        if self._follow_up_pending:
+            return None
+        REPAIR_TRACKER.add(follow_ups=1)
+        self._follow_up_pending = True
+        return FOLLOW_UP_MESSAGE.format(request=self.result_tool_cls.default_value("request"))
@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Decision Record and Replay
+
+Records the parsed Result*Tool decision of every agent per quarter, and
+replays recorded decisions instead of calling the LLM. Replay can be limited
+to some agents, e.g. replay the CentralBank while SmallBank runs live, so
+that counterfactual experiments only re-run the agents that are affected.
+Decisions are keyed by the name of the run that made them, so that runs
+executing concurrently (sweeps, branches, backtest origins) recording to the
+same log do not overwrite each other
+
+Author: Akhil Karra
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import threading
+from collections.abc import Iterable
+
+from agentomics.common.ensemble import EnsembleResult
+from agentomics.tools.big_bank_knobs import ResultBigBankKnobsTool
+from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
+from agentomics.tools.econ_vars_tool import ResultEconVarsTool
+from agentomics.tools.small_bank_knobs import ResultSmallBankKnobsTool
+
+logger = logging.getLogger(__name__)
+
+RESULT_TOOLS = {
+    tool_cls.default_value("request"): tool_cls
+    for tool_cls in (ResultCentralBankKnobsTool, ResultBigBankKnobsTool, ResultSmallBankKnobsTool, ResultEconVarsTool)
+}
+
+DEFAULT_RUN = "run"
+
+_recording: contextvars.ContextVar["DecisionLog | None"] = contextvars.ContextVar("decision_recording", default=None)
+_replaying: contextvars.ContextVar["tuple[DecisionLog, frozenset[str] | None] | None"] = contextvars.ContextVar(
+    "decision_replaying", default=None)
+
+
+class DecisionLog:
+    """Thread-safe decisions of one or more runs, by (run name, quarter
+    index, agent name)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decisions: dict[tuple[str, int, str], EnsembleResult] = {}
+
+    def record(self, run: str, quarter: int, agent: str, results: EnsembleResult):
+        with self._lock:
+            self.decisions[(run, quarter, agent)] = results
+
+    def get(self, run: str, quarter: int, agent: str) -> EnsembleResult | None:
+        with self._lock:
+            return self.decisions.get((run, quarter, agent))
+
+    def agents(self) -> set[str]:
+        with self._lock:
+            return {agent for _, _, agent in self.decisions}
+
+    def runs(self) -> set[str]:
+        with self._lock:
+            return {run for run, _, _ in self.decisions}
+
+    def to_json(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "run": run,
+                    "quarter": quarter,
+                    "agent": agent,
+                    "tool": json.loads(results.result.json()),
+                    "dispersion": results.dispersion,
+                    "num_samples": results.num_samples,
+                }
+                for (run, quarter, agent), results in sorted(self.decisions.items())
+            ]
+
+    @classmethod
+    def from_json(cls, entries: list[dict]) -> "DecisionLog":
+        decision_log = cls()
+        for entry in entries:
+            tool_cls = RESULT_TOOLS[entry["tool"]["request"]]
+            results = EnsembleResult(tool_cls.parse_obj(entry["tool"]), entry["dispersion"], entry["num_samples"])
+            decision_log.record(entry.get("run", DEFAULT_RUN), entry["quarter"], entry["agent"], results)
+        return decision_log
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> "DecisionLog":
+        with open(path) as f:
+            return cls.from_json(json.load(f))
+
+
+@contextlib.contextmanager
+def recording_decisions(decision_log: DecisionLog | None = None):
+    """Record the decisions applied in the block to `decision_log` (a new one
+    by default)"""
+    decision_log = decision_log if decision_log is not None else DecisionLog()
+    token = _recording.set(decision_log)
+    try:
+        yield decision_log
+    finally:
+        _recording.reset(token)
+
+
+@contextlib.contextmanager
+def replaying_decisions(decision_log: DecisionLog, agents: Iterable[str] | None = None):
+    """Replay the decisions of `agents` (every agent by default) from
+    `decision_log` in the block. Agents not replayed run live, and so do
+    replayed agents in quarters without a recorded decision"""
+    token = _replaying.set((decision_log, frozenset(agents) if agents is not None else None))
+    try:
+        yield decision_log
+    finally:
+        _replaying.reset(token)
+
+
+def record_decision(run: str, quarter: int, agent: str, results: EnsembleResult):
+    """Record the decision `agent` made at quarter index `quarter` of run
+    `run`, if recording"""
+    decision_log = _recording.get()
+    if decision_log is not None:
+        decision_log.record(run, quarter, agent, results)
+
+
+def replayed_decision(run: str, quarter: int, agent: str) -> EnsembleResult | None:
+    """Recorded decision of `agent` at quarter index `quarter` of run `run`
+    when it is being replayed, otherwise None"""
+    replaying = _replaying.get()
+    if replaying is None:
+        return None
+    decision_log, agents = replaying
+    if agents is not None and agent not in agents:
+        return None
+    results = decision_log.get(run, quarter, agent)
+    if results is None:
+        logger.warning("No recorded decision of %s in quarter %s of %s, running it live", agent, quarter, run)
+    return results
@@ -10,14 +10,10 @@ Author: Akhil Karra
 
 import langroid as lr
 from langroid.agent.tools.orchestration import ResultTool
-from langroid.pydantic_v1 import BaseModel, Field
 
+from agentomics.common.schema import SMALL_BANK_KNOBS, result_model
 
-class ResultSmallBankKnobs(BaseModel):
-    """Data structure for extracting output small bank knobs from
-    SmallBank"""
-    loans_interest_rate: float = Field(..., description="Loans Interest Rate (%)")
-    consumer_loan_focus: float = Field(..., description="Consumer Loan Focus (%)")
+ResultSmallBankKnobs = result_model(SMALL_BANK_KNOBS)
 
 
 class ResultSmallBankKnobsTool(lr.agent.ToolMessage):
@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+
+"""Agentomics: Structured Output
+
+Helpers to make agents return their Result*Tool through provider-native
+structured output instead of free text that has to be parsed. Models with
+native function calling are forced to call the result tool; every other
+model (Groq, locally served models behind an OpenAI-compatible API) is put
+in JSON mode, which the serving engine enforces with grammar-constrained
+decoding, and is given the JSON schema generated from the tool's pydantic
+model
+
+Author: Akhil Karra
+"""
+
+import json
+
+import langroid as lr
+import langroid.language_models as lm
+from langroid.language_models.openai_gpt import OpenAICallParams
+
+JSON_MODE = {"type": "json_object"}
+
+
+def supports_function_calling(model: str | None) -> bool:
+    """Whether Langroid uses the provider's native function calling for
+    `model`, mirroring `OpenAIGPT.supports_functions_or_tools`"""
+    model = model or lm.OpenAIChatModel.GPT4o
+    return model in [e.value for e in lm.OpenAIChatModel] and model not in [
+        lm.OpenAIChatModel.O1_MINI,
+        lm.OpenAIChatModel.O1_PREVIEW,
+    ]
+
+
+def structured_llm_params(model: str | None) -> OpenAICallParams | None:
+    """LLM call parameters that constrain the output of `model` to JSON, or
+    None when the model calls the result tool through function calling"""
+    if supports_function_calling(model):
+        return None
+    return OpenAICallParams(response_format=JSON_MODE)
+
+
+def structured_output_instructions(tool_cls: type[lr.agent.ToolMessage]) -> str:
+    """System message addendum with the JSON schema of `tool_cls`, generated
+    from its pydantic model"""
+    schema = tool_cls.llm_function_schema(request=True).parameters
+    return (
+        "\n\nRespond ONLY with a single JSON object, without any other text, "
+        f"that follows this JSON schema:\n{json.dumps(schema)}"
+    )
+
+
+def structured_llm_config(model: str | None, structured_output: bool) -> lm.OpenAIGPTConfig:
+    """LLM config shared by all agents, constrained to JSON output when
+    `structured_output` is set and the model has no function calling"""
+    return lm.OpenAIGPTConfig(
+        chat_model=model or lm.OpenAIChatModel.GPT4o,
+        chat_context_length=131072,
+        params=structured_llm_params(model) if structured_output else None
+    )
@@ -11,14 +11,36 @@ from functools import reduce
 
 import pandas as pd
 
+from agentomics.utils.fred_transforms import Resample
 
-def get_longest_common_date_range(dataframes, date_column="date"):
+
+def _resample(merged_df, date_column, frequency, aggregations, default_aggregation):
+    """Aggregate every data column of `merged_df` to periods of `frequency`
+    with the same Resample step as the FRED transform pipelines, with one
+    row per period from the first to the last and the period start as date.
+    Missing values are skipped"""
+    dates = merged_df[date_column].to_numpy()
+    periods = pd.period_range(merged_df[date_column].min(), merged_df[date_column].max(), freq=frequency)
+    resampled = pd.DataFrame({date_column: periods.to_timestamp()})
+    for column in merged_df.columns.difference([date_column], sort=False):
+        step = Resample(frequency, aggregations.get(column, default_aggregation))
+        column_dates, values = step.apply(dates, merged_df[column].to_numpy(dtype=float))
+        resampled[column] = pd.Series(values, index=column_dates).reindex(resampled[date_column]).to_numpy()
+    return resampled
+
+
+def get_longest_common_date_range(dataframes, date_column="date", frequency=None, aggregations=None, default_aggregation="last"):
     """
     Given a list of DataFrames with a common date column, return the longest contiguous date range where all DataFrames have entries for every date. In case there are contiguous blocks of the same size that work, this function returns the first valid block in the DataFrames.
 
+    DataFrames of different frequencies (e.g. weekly WSHOSHO with monthly FEDFUNDS) can be aligned by passing a target `frequency`: every column is then resampled to that frequency before the common range is searched, dated at the start of each period.
+
     Parameters:
     - dataframes (list of pd.DataFrame): List of DataFrames to process.
     - date_column (str): Name of the date column in the DataFrames (default is 'date').
+    - frequency (str or None): Pandas period frequency to resample to, e.g. 'Q' for quarters (default is None, no resampling).
+    - aggregations (dict or None): Aggregation per column when resampling, e.g. {'WSHOSHO': 'last', 'UNRATE': 'mean'}.
+    - default_aggregation (str): Aggregation of the columns not in `aggregations` (default is 'last').
 
     Returns:
     - pd.DataFrame: DataFrame containing data for the longest common date range across all DataFrames.
@@ -37,6 +59,10 @@ def get_longest_common_date_range(dataframes, date_column="date"):
     # Sort by date
     merged_df = merged_df.sort_values(by=date_column).reset_index(drop=True)
 
+    # Bring all series to the same frequency
+    if frequency is not None:
+        merged_df = _resample(merged_df, date_column, frequency, aggregations or {}, default_aggregation)
+
     # Identify rows without any NaNs across all data columns (excluding the date column)
     data_columns = merged_df.columns.difference([date_column])
     non_nan_mask = merged_df[data_columns].notnull().all(axis=1)
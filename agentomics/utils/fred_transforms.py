@@ -0,0 +1,242 @@
+#! /usr/bin/env python3
+
+"""Agentomics: FRED Transform Pipelines
+
+Declarative transforms attached to FRED series specs, replacing the inline
+frame edits of the notebooks (`gdp_df[...] /= 100.0`, `cpi_df[...].pct_change()`
+for inflation, the percent change of `WSHOSHO`). A spec only records its
+steps; the steps run when the series is loaded on a NumPy array, and the frame is
+built once at the end. Each run of linear steps (scalings, differences and
+lags) is fused into one weighted sum of shifted slices; percent changes and
+resampling are not linear, so they run on their own and end a fused run. Raw downloads and transformed series are cached on disk
+side by side, so building state for many scenarios neither refetches nor
+recomputes a series
+
+Author: Akhil Karra
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass, replace
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from agentomics.utils.fred_download import get_fred_data
+
+AGGREGATIONS = ("last", "first", "mean", "sum")
+
+
+@dataclass(frozen=True)
+class Scale:
+    factor: float
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return dates, values * self.factor
+
+    def stencil(self) -> "Stencil":
+        return Stencil(((0, self.factor),), 0, 0)
+
+
+@dataclass(frozen=True)
+class Diff:
+    periods: int = 1
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        shifted = np.full_like(values, np.nan)
+        shifted[self.periods:] = values[self.periods:] - values[:-self.periods]
+        return dates, shifted
+
+    def stencil(self) -> "Stencil":
+        return Stencil(((0, 1.0), (self.periods, -1.0)), max(self.periods, 0), max(-self.periods, 0))
+
+
+@dataclass(frozen=True)
+class PctChange:
+    periods: int = 1
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        changed = np.full_like(values, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            changed[self.periods:] = values[self.periods:] / values[:-self.periods] - 1.0
+        return dates, changed
+
+
+@dataclass(frozen=True)
+class Lag:
+    periods: int = 1
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        lagged = np.full_like(values, np.nan)
+        if self.periods >= 0:
+            lagged[self.periods:] = values[:len(values) - self.periods]
+        else:
+            lagged[:self.periods] = values[-self.periods:]
+        return dates, lagged
+
+    def stencil(self) -> "Stencil":
+        return Stencil(((self.periods, 1.0),), max(self.periods, 0), max(-self.periods, 0))
+
+
+@dataclass(frozen=True)
+class Stencil:
+    """A linear step: element `i` of the output is the sum of
+    `weight * values[i - offset]` over the `(offset, weight)` pairs of
+    `coefficients`. Elements before `back` or in the last `forward` positions
+    are NaN, as they would be after the steps the stencil was built from"""
+    coefficients: tuple
+    back: int
+    forward: int
+
+    def then(self, other: "Stencil") -> "Stencil":
+        """The stencil applying `self`, then `other`"""
+        coefficients: dict[int, float] = {}
+        for outer, outer_weight in other.coefficients:
+            for inner, inner_weight in self.coefficients:
+                coefficients[outer + inner] = coefficients.get(outer + inner, 0.0) + outer_weight * inner_weight
+        offsets = [offset for offset, _ in other.coefficients]
+        return Stencil(
+            tuple(sorted(coefficients.items())),
+            max(other.back, self.back + max(offsets)),
+            max(other.forward, self.forward - min(offsets))
+        )
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        result = np.full_like(values, np.nan)
+        start, stop = self.back, len(values) - self.forward
+        if start < stop:
+            result[start:stop] = sum(
+                weight * values[start - offset:stop - offset] for offset, weight in self.coefficients
+            )
+        return dates, result
+
+
+@dataclass(frozen=True)
+class Resample:
+    """Aggregate to periods of pandas frequency `freq` ("Q" for quarters),
+    dated at the start of each period, skipping missing values"""
+    freq: str = "Q"
+    how: str = "last"
+
+    def apply(self, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self.how not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {self.how!r}, expected one of {AGGREGATIONS}")
+        keep = ~np.isnan(values)
+        dates, values = dates[keep], values[keep]
+        if not len(values):
+            return dates, values
+        periods = pd.PeriodIndex(dates, freq=self.freq)
+        # Observations are sorted by date, so each period is one contiguous run
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        if self.how == "last":
+            aggregated = values[np.r_[starts[1:] - 1, len(values) - 1]]
+        elif self.how == "first":
+            aggregated = values[starts]
+        else:
+            aggregated = np.add.reduceat(values, starts)
+            if self.how == "mean":
+                aggregated = aggregated / np.diff(np.r_[starts, len(values)])
+        return periods[starts].to_timestamp().to_numpy(), aggregated
+
+
+def _fuse(steps: tuple) -> list:
+    """Merge each run of linear steps into one stencil"""
+    fused = []
+    for step in steps:
+        if not hasattr(step, "stencil"):
+            fused.append(step)
+        elif fused and isinstance(fused[-1], Stencil):
+            fused[-1] = fused[-1].then(step.stencil())
+        else:
+            fused.append(step.stencil())
+    return fused
+
+
+@dataclass(frozen=True)
+class SeriesSpec:
+    """A FRED series downloaded at `frequency` and the transforms that turn
+    it into the column `column_name`. Transform methods return a new spec"""
+    series_id: str
+    column_name: str
+    frequency: str = "q"
+    steps: tuple = ()
+
+    def _then(self, step) -> "SeriesSpec":
+        return replace(self, steps=self.steps + (step,))
+
+    def scale(self, factor: float) -> "SeriesSpec":
+        return self._then(Scale(factor))
+
+    def diff(self, periods: int = 1) -> "SeriesSpec":
+        return self._then(Diff(periods))
+
+    def pct_change(self, periods: int = 1) -> "SeriesSpec":
+        return self._then(PctChange(periods))
+
+    def resample(self, freq: str = "Q", how: str = "last") -> "SeriesSpec":
+        return self._then(Resample(freq, how))
+
+    def lag(self, periods: int = 1) -> "SeriesSpec":
+        return self._then(Lag(periods))
+
+    def key(self) -> str:
+        return hashlib.sha256(repr(self).encode()).hexdigest()[:16]
+
+    def transform(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """Apply the steps to a raw frame with `date` and one value column"""
+        dates = pd.to_datetime(raw["date"]).to_numpy()
+        values = raw.iloc[:, 1].to_numpy(dtype=float)
+        for step in _fuse(self.steps):
+            dates, values = step.apply(dates, values)
+        return pd.DataFrame({"date": dates, self.column_name: values})
+
+
+# Series used in the evaluation notebook, as decimals
+NOTEBOOK_SPECS = [
+    SeriesSpec("A191RL1Q225SBEA", "Quarterly GDP Growth Rate").scale(0.01),
+    SeriesSpec("UNRATE", "Quarterly Unemployment Rate").scale(0.01),
+    SeriesSpec("CPIAUCSL", "Quarterly Inflation Rate").pct_change(),
+    SeriesSpec("FEDFUNDS", "Quarterly Effective Federal Funds Rate").scale(0.01),
+    SeriesSpec("WSHOSHO", "Quarterly Securities Held Percent Change").pct_change(),
+]
+
+
+class FredCache:
+    """On-disk cache under `cache_dir` of raw FRED downloads (`raw/`) and of
+    the transformed series derived from them (`derived/`), backed by an
+    in-memory cache. `fetch` has the signature of `get_fred_data`"""
+    def __init__(self, cache_dir: str, fetch: Callable = get_fred_data):
+        self.cache_dir = cache_dir
+        self.fetch = fetch
+        self._memory: dict[str, pd.DataFrame] = {}
+        os.makedirs(os.path.join(cache_dir, "raw"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "derived"), exist_ok=True)
+
+    def _cached(self, path: str, compute: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        if path not in self._memory:
+            if os.path.exists(path):
+                self._memory[path] = pd.read_pickle(path)
+            else:
+                df = compute()
+                df.to_pickle(path)
+                self._memory[path] = df
+        return self._memory[path].copy()
+
+    def raw(self, series_id: str, frequency: str, observation_start: str, observation_end: str) -> pd.DataFrame:
+        name = f"{series_id}_{frequency}_{observation_start}_{observation_end}.pkl"
+        return self._cached(
+            os.path.join(self.cache_dir, "raw", name),
+            lambda: self.fetch(series_id, frequency, observation_start, observation_end, series_id)
+        )
+
+    def load(self, spec: SeriesSpec, observation_start: str, observation_end: str) -> pd.DataFrame:
+        """The transformed series of `spec`, computed at most once"""
+        name = f"{spec.series_id}_{spec.key()}_{observation_start}_{observation_end}.pkl"
+        return self._cached(
+            os.path.join(self.cache_dir, "derived", name),
+            lambda: spec.transform(self.raw(spec.series_id, spec.frequency, observation_start, observation_end))
+        )
+
+    def load_all(self, specs: list[SeriesSpec], observation_start: str, observation_end: str) -> list[pd.DataFrame]:
+        return [self.load(spec, observation_start, observation_end) for spec in specs]
@@ -2,16 +2,236 @@
 
 """Agentomics: Logging Utilities
 
-Utilities to redirect standard output and warnings to a log file.
+Utilities to redirect standard output and warnings to a log file, either
+synchronously or through a queue drained by a background thread, as plain
+text or as JSON lines carrying the run id, quarter and agent of the record.
+Logs can be sharded into one directory per simulation run, listed in an
+index by run id, with rotated files gzipped in the background.
 
 Author: Akhil Karra
 """
 
+import atexit
+import contextlib
+import contextvars
+import datetime
+import gzip
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+CONTEXT_FIELDS = ("run_id", "quarter", "agent")
+RUNS_DIR = "runs"
+RUN_INDEX_FILE = "index.jsonl"
+# Default directory of the Langroid task logs (`<task name>.log/.tsv`)
+LANGROID_LOGS_DIR = "logs"
 
-def configure_logging(log_level=logging.DEBUG, log_to_console=True, log_to_file=True, log_file="app.log", max_file_size=5*1024*1024, backup_count=3):
+_log_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+_listener: QueueListener | None = None
+# Root log directory while logs are sharded by run, otherwise None
+_run_log_root: str | None = None
+_registered_runs: set[tuple[str, str]] = set()
+_index_lock = threading.Lock()
+_compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agentomics-log-gzip")
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach `fields` (e.g. run_id, quarter, agent) to every record logged
+    in the block, including from threads started with a copy of the
+    current context"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def current_log_context() -> dict:
+    """Fields of the log context of the calling code"""
+    return dict(_log_context.get())
+
+
+def stop_async_logging():
+    """Flush the queued records and stop the background logging thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_async_logging)
+
+
+def run_log_dir(run_id: str, log_dir: str = LANGROID_LOGS_DIR) -> str:
+    """Directory holding the logs of run `run_id` under `log_dir`. It is
+    created and added to the run index the first time it is requested"""
+    path = os.path.join(log_dir, RUNS_DIR, run_id)
+    with _index_lock:
+        if (log_dir, run_id) not in _registered_runs:
+            os.makedirs(path, exist_ok=True)
+            entry = {"run_id": run_id, "log_dir": path, "created": datetime.datetime.now().isoformat()}
+            with open(os.path.join(log_dir, RUNS_DIR, RUN_INDEX_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            _registered_runs.add((log_dir, run_id))
+    return path
+
+
+def find_run_logs(run_id: str, log_dir: str = LANGROID_LOGS_DIR) -> str | None:
+    """Log directory of run `run_id` according to the run index, or None if
+    the run is not indexed"""
+    try:
+        with open(os.path.join(log_dir, RUNS_DIR, RUN_INDEX_FILE)) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    matches = [entry["log_dir"] for entry in entries if entry["run_id"] == run_id]
+    return matches[-1] if matches else None
+
+
+def langroid_logs_dir() -> str:
+    """Directory for the Langroid task logs of the current run: the run's own
+    directory while logs are sharded by run, otherwise Langroid's default"""
+    run_id = _log_context.get().get("run_id")
+    if _run_log_root is None or run_id is None:
+        return LANGROID_LOGS_DIR
+    return run_log_dir(run_id, _run_log_root)
+
+
+def use_run_logs_dir(task):
+    """Point the Langroid `task` at `langroid_logs_dir()` and return it. The
+    config is copied rather than updated, since Langroid shares the default
+    TaskConfig between tasks"""
+    task.config = task.config.copy(update={"logs_dir": langroid_logs_dir()})
+    return task
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log context onto each record in the logging thread"""
+    def filter(self, record):
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves the message unformatted, so that `%`
+    interpolation and formatting happen on the listener thread instead of
+    the thread that logs. Objects passed as arguments must therefore not be
+    mutated after they are logged"""
+    def prepare(self, record):
+        return record
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler whose rotated files are gzipped (`app.log.1.gz`)
+    on a background thread, so that the thread logging does not wait for
+    the compression. A rollover waits for the previous one to be compressed"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._rotate
+        self._pending: Future | None = None
+
+    def _wait_for_compression(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    @staticmethod
+    def _compress(source: str, dest: str):
+        with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def _rotate(self, source: str, dest: str):
+        uncompressed = dest.removesuffix(".gz")
+        os.replace(source, uncompressed)
+        self._pending = _compressor.submit(self._compress, uncompressed, dest)
+
+    def doRollover(self):
+        self._wait_for_compression()
+        super().doRollover()
+
+    def close(self):
+        super().close()
+        self._wait_for_compression()
+
+
+class RunShardedFileHandler(logging.Handler):
+    """Writes the records of every run (by the `run_id` of the log context)
+    to `<log_dir>/runs/<run_id>/<filename>` and other records to
+    `<log_dir>/<filename>`, each file rotated and gzipped on its own. At most
+    `max_open_files` run files are kept open, least recently used first out"""
+    def __init__(self, log_dir: str, filename: str, max_file_size: int, backup_count: int, max_open_files: int = 32):
+        super().__init__()
+        self.log_dir = log_dir
+        self.filename = filename
+        self.max_file_size = max_file_size
+        self.backup_count = backup_count
+        self.max_open_files = max_open_files
+        self._handlers: OrderedDict[str | None, GzipRotatingFileHandler] = OrderedDict()
+
+    def _handler_for(self, run_id: str | None) -> GzipRotatingFileHandler:
+        handler = self._handlers.get(run_id)
+        if handler is None:
+            directory = self.log_dir if run_id is None else run_log_dir(run_id, self.log_dir)
+            os.makedirs(directory, exist_ok=True)
+            handler = GzipRotatingFileHandler(
+                os.path.join(directory, self.filename),
+                maxBytes=self.max_file_size, backupCount=self.backup_count
+            )
+            handler.setFormatter(self.formatter)
+            self._handlers[run_id] = handler
+            if len(self._handlers) > self.max_open_files:
+                _, oldest = self._handlers.popitem(last=False)
+                oldest.close()
+        self._handlers.move_to_end(run_id)
+        return handler
+
+    def emit(self, record):
+        try:
+            self._handler_for(getattr(record, "run_id", None)).emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            for handler in self._handlers.values():
+                handler.close()
+            self._handlers.clear()
+        finally:
+            self.release()
+        super().close()
+
+
+def configure_logging(log_level=logging.INFO, log_to_console=True, log_to_file=True, log_file="app.log", max_file_size=5*1024*1024, backup_count=3, json_format=False, async_logging=False, rollover_on_start=False, compress_rotated=False, shard_by_run=False):
     """
     Configures logging with console and file handlers, with file rollover support.
 
@@ -21,34 +241,69 @@ def configure_logging(log_level=logging.DEBUG, log_to_console=True, log_to_file=
     :param log_file: The file to which logs should be written.
     :param max_file_size: Maximum size of the log file in bytes before rollover.
     :param backup_count: Number of backup log files to keep.
+    :param json_format: Whether to write JSON lines with the log context fields.
+    :param async_logging: Whether to hand records to a queue that a background thread writes out.
+    :param rollover_on_start: Whether to rotate the log file before logging to it.
+    :param compress_rotated: Whether to gzip rotated log files in the background.
+    :param shard_by_run: Whether to give every run (and its Langroid task logs) its own directory under `runs/` next to `log_file`; rotated files are gzipped.
+    :return: The QueueListener when logging asynchronously, otherwise None.
     """
+    global _listener, _run_log_root
     logger = logging.getLogger()
     logger.setLevel(log_level)  # Set the logging level based on the parameter
 
     # Formatter for log messages
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-    # Clear existing handlers
+    # Clear existing handlers and stop the listener of a previous call
     if logger.hasHandlers():
         logger.handlers.clear()
+    stop_async_logging()
+    _run_log_root = None
+
+    handlers = []
 
     # Add console handler
     if log_to_console:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(log_level)  # Set console logging level
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
 
-    # Add file handler with rollover
-    if log_to_file:
-        file_handler = RotatingFileHandler(log_file, maxBytes=max_file_size, backupCount=backup_count)
+    # Add file handler with rollover, sharded by run if requested
+    if log_to_file and shard_by_run:
+        _run_log_root = os.path.dirname(log_file) or "."
+        file_handler = RunShardedFileHandler(_run_log_root, os.path.basename(log_file), max_file_size, backup_count)
+        file_handler.setLevel(log_level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    elif log_to_file:
+        handler_cls = GzipRotatingFileHandler if compress_rotated else RotatingFileHandler
+        file_handler = handler_cls(log_file, maxBytes=max_file_size, backupCount=backup_count)
         file_handler.setLevel(log_level)  # Set file logging level
         file_handler.setFormatter(formatter)
-        file_handler.doRollover()  # Force rotation on app start
-        logger.addHandler(file_handler)
+        if rollover_on_start:
+            file_handler.doRollover()
+        handlers.append(file_handler)
+
+    if async_logging:
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(ContextFilter())
+            logger.addHandler(handler)
 
-    logging.info("Logging configured: level=%s, console=%s, file=%s (max_size=%d bytes, backups=%d)",
-                 logging.getLevelName(log_level), log_to_console, log_to_file, max_file_size, backup_count)
+    logging.info("Logging configured: level=%s, console=%s, file=%s (max_size=%d bytes, backups=%d), json=%s, async=%s, sharded=%s",
+                 logging.getLevelName(log_level), log_to_console, log_to_file, max_file_size, backup_count, json_format, async_logging, shard_by_run)
+    return _listener
 
 
 def main():
@@ -56,11 +311,11 @@ def main():
 
    # Example log messages
    for i in range(10000):
-       logging.debug(f"Debug message {i}")
-       logging.info(f"Info message {i}")
-       logging.warning(f"Warning message {i}")
-       logging.error(f"Error message {i}")
-       logging.critical(f"Critical message {i}")
+       logging.debug("Debug message %d", i)
+       logging.info("Info message %d", i)
+       logging.warning("Warning message %d", i)
+       logging.error("Error message %d", i)
+       logging.critical("Critical message %d", i)
 
 
 if __name__ == "__main__":
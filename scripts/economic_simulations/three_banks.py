@@ -7,162 +7,370 @@ and a small commercial bank responding to a series of high inflation readings.
 
 Author: Akhil Karra
 """
+import contextvars
+import functools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
 import agentomics.agents.big_bank as big_bank
 import agentomics.agents.central_bank as central_bank
 import agentomics.agents.economy_agent_llm as economy_agent
 import agentomics.agents.small_bank as small_bank
-from agentomics.common.data_structures import initialize_test_data
-from agentomics.common.types import NonnegPercent, Percent
-from agentomics.tools.big_bank_knobs import ResultBigBankKnobsTool
-from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
-from agentomics.tools.econ_vars_tool import ResultEconVarsTool
-from agentomics.tools.small_bank_knobs import ResultSmallBankKnobsTool
+from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.ensemble import EnsembleResult, run_ensemble
+from agentomics.common.model_router import ModelRouter
+from agentomics.common.profiling import profile_phase, profile_quarter
+from agentomics.common.schema import schema_for_agent
+from agentomics.common.stopping_criteria import (
+    StoppingCriterion,
+    first_stop_reason,
+    reset_criteria,
+)
+from agentomics.common.transcripts import TranscriptStore, recording_transcripts
+from agentomics.common.usage import UsageMeter, metering_usage
+from agentomics.tools.repair import REPAIR_TRACKER
+from agentomics.tools.replay import DEFAULT_RUN, record_decision, replayed_decision
+from agentomics.utils.logging import configure_logging, log_context
 
 MODEL_NAME = "groq/llama-3.1-70b-versatile"
+# Backends the router fails over to, in order of preference
+MODEL_NAMES = [MODEL_NAME, "gpt-4o-mini", "ollama/llama3.1"]
 OUTPUT_CSV_NAME = "three_banks_output"
+LOG_FILE = "logs/three_banks.log"
+TRANSCRIPTS_DB = "output/three_banks_transcripts.sqlite"
 
 
-def simulate_three_way(globals, model, outfile=None):
-    """Run the three banks simulation given the initial variables and the
-    model name to run. This orchestration assumes a three-way parallelism
-    between the central bank, large commercial bank, and small commercial bank"""
-    while globals.number_of_quarters_to_simulate > 0:
-        # Have CentralBank update its knobs
-        central_bank_results: ResultCentralBankKnobsTool | None = None
-        while central_bank_results is None:
-            central_bank_results = central_bank.run_state(model, globals)
-        central_bank_new_knobs = central_bank_results.result_central_bank_knobs
+@dataclass
+class SimulationReport:
+    """Summary of a single simulation run returned by the orchestrators"""
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    quarters_simulated: int = 0
+    stop_reason: str | None = None
+    speculation_hits: int = 0
+    speculation_misses: int = 0
+    speculation_skips: int = 0
 
-        # Have BigBank update its knobs
-        big_bank_results: ResultBigBankKnobsTool | None = None
-        while big_bank_results is None:
-            big_bank_results = big_bank.run_state(model, globals)
-        big_bank_new_knobs = big_bank_results.result_big_bank_knobs
+    @property
+    def speculation_hit_rate(self) -> float | None:
+        speculations = self.speculation_hits + self.speculation_misses
+        if speculations == 0:
+            return None
+        return self.speculation_hits / speculations
 
-        # Have SmallBank update its knobs
-        small_bank_results: ResultSmallBankKnobsTool | None = None
-        while small_bank_results is None:
-            small_bank_results = small_bank.run_state(model, globals)
-        small_bank_new_knobs = small_bank_results.result_small_bank_knobs
-
-        # Update the banks' global states
-        globals.central_bank_knobs.target_interest_rate.append(
-            NonnegPercent(central_bank_new_knobs.target_interest_rate)
-        )
-        globals.central_bank_knobs.securities_holdings_pc_change.append(
-            Percent(central_bank_new_knobs.securities_holdings_pc_change)
-        )
-        globals.big_bank_knobs.deposit_interest_rate.append(
-            NonnegPercent(big_bank_new_knobs.deposit_interest_rate)
-        )
-        globals.big_bank_knobs.loan_to_deposit_ratio.append(
-            NonnegPercent(big_bank_new_knobs.loan_to_deposit_ratio)
-        )
-        globals.small_bank_knobs.consumer_loan_focus.append(
-            NonnegPercent(small_bank_new_knobs.consumer_loan_focus)
-        )
-        globals.small_bank_knobs.loans_interest_rate.append(
-            NonnegPercent(small_bank_new_knobs.loans_interest_rate)
-        )
-
-        # Have EconomyAgent update the economic vars
-        economy_agent_results: ResultEconVarsTool | None = None
-        while economy_agent_results is None:
-            economy_agent_results = economy_agent.run_state(model, globals)
-        new_econ_vars = economy_agent_results.result_econ_vars
-
-        # Update the global economic variables
-        globals.economic_variables.gdp_growth_rate.append(
-            Percent(new_econ_vars.gdp_growth_rate)
-        )
-        globals.economic_variables.unemployment_rate.append(
-            NonnegPercent(new_econ_vars.unemployment_rate)
-        )
-        globals.economic_variables.inflation_rate.append(
-            Percent(new_econ_vars.inflation_rate)
-        )
-        globals.number_of_quarters_to_simulate -= 1
-
-        if outfile is not None:
+
+@dataclass(frozen=True)
+class _RunQuarter:
+    """Quarter being decided in a run: the name of the run and the index in
+    the global state's series at which its decisions are recorded"""
+    run_name: str
+    index: int
+
+
+def _agent_name(agent) -> str:
+    return agent.__name__.rsplit(".", 1)[-1]
+
+
+def _run_agent(
+    agent,
+    model,
+    globals,
+    quarter: _RunQuarter,
+    num_samples: int = 1,
+    aggregation: str = "median",
+    structured_output: bool = False
+) -> EnsembleResult:
+    """Call an agent module's run_state until the LLM returns a parsed
+    result tool. With `num_samples` > 1, that many decisions are sampled
+    concurrently and aggregated into one. `model` is either a model name or
+    a ModelRouter, which routes every call by the agent's module name. When
+    the agent's decisions are being replayed, the decision recorded for
+    `quarter` is returned without calling the LLM"""
+    agent_name = _agent_name(agent)
+    replayed = replayed_decision(quarter.run_name, quarter.index, agent_name)
+    if replayed is not None:
+        return replayed
+    run_state = functools.partial(agent.run_state, structured_output=structured_output)
+    if isinstance(model, ModelRouter):
+        run_state = model.bind(agent_name, run_state)
+    results = None
+    with log_context(agent=agent_name):
+        while results is None:
+            if num_samples > 1:
+                results = run_ensemble(run_state, model, globals, num_samples, aggregation)
+            else:
+                tool = run_state(model, globals)
+                results = EnsembleResult(tool) if tool is not None else None
+    return results
+
+
+def _bank_series(globals):
+    return [
+        *globals.big_bank_knobs.__dict__.values(),
+        *globals.small_bank_knobs.__dict__.values(),
+    ]
+
+
+def _predict_bank_knobs(globals):
+    """Copy of the global state where BigBank and SmallBank are predicted to
+    keep their latest knob values for the upcoming quarter"""
+    predicted_globals = globals.fork()
+    for series in _bank_series(predicted_globals):
+        if series:
+            series.append(series[-1])
+    return predicted_globals
+
+
+def _prediction_within_tolerance(predicted_globals, globals, tolerance: float) -> bool:
+    """Whether the predicted bank knobs are within `tolerance` of the
+    decisions the banks actually made"""
+    for predicted, actual in zip(_bank_series(predicted_globals), _bank_series(globals), strict=True):
+        if len(predicted) != len(actual) or abs(predicted[-1].to_val() - actual[-1].to_val()) > tolerance:
+            return False
+    return True
+
+
+def _submit(executor, fn, *args):
+    """Submit `fn` to `executor` in a copy of the current context, so that
+    context such as the active profiler carries over to the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _append_decision(globals, agent, results: EnsembleResult, quarter: _RunQuarter):
+    """Apply the decision of `agent` to its knobs in the global state as one
+    bulk update of all of its fields, recorded at the index of `quarter`"""
+    schema = schema_for_agent(_agent_name(agent))
+    with profile_phase("state_append", agent=schema.display_name):
+        getattr(globals, schema.name).apply_update(
+            getattr(results.result, schema.result_name), quarter.index, results.dispersion)
+    record_decision(quarter.run_name, quarter.index, schema.agent, results)
+
+
+def _end_of_quarter(globals, report: SimulationReport, stopping_criteria, outfile) -> bool:
+    """Book-keeping shared by the orchestrators after each quarter. Returns
+    True when a stopping criterion ended the run early"""
+    globals.number_of_quarters_to_simulate -= 1
+    report.quarters_simulated += 1
+
+    if outfile is not None:
+        with profile_phase("csv_export"):
             globals_pd = globals.to_pandas_df()
             globals_pd.to_csv(outfile)
 
+    report.stop_reason = first_stop_reason(stopping_criteria, globals)
+    if report.stop_reason is not None:
+        globals.number_of_quarters_to_simulate = 0
+        return True
+    return False
 
-def simulate_two_way(globals, model, outfile=None):
+
+def simulate_three_way(
+    globals,
+    model,
+    outfile=None,
+    stopping_criteria: list[StoppingCriterion] | None = None,
+    num_samples: int = 1,
+    aggregation: str = "median",
+    structured_output: bool = False,
+    run_name: str = DEFAULT_RUN
+) -> SimulationReport:
+    """Run the three banks simulation given the initial variables and the
+    model name to run. This orchestration assumes a three-way parallelism
+    between the central bank, large commercial bank, and small commercial bank.
+    The run ends early as soon as any of `stopping_criteria` fires. With
+    `num_samples` > 1, every decision is an ensemble of that many concurrent
+    samples aggregated by `aggregation` ("median" or "trimmed_mean"), and the
+    dispersion is recorded as the uncertainty of each new value. With
+    `structured_output`, agents answer through provider-native structured
+    output instead of free text. `model` is a model name or a ModelRouter.
+    Decisions are recorded and replayed under `run_name`. Every agent
+    decides the same quarters, from the earliest one some series has no
+    value for"""
+    run_agent = functools.partial(
+        _run_agent, num_samples=num_samples, aggregation=aggregation, structured_output=structured_output)
+    stopping_criteria = stopping_criteria or []
+    report = SimulationReport()
+    with log_context(run_id=report.run_id), metering_usage(UsageMeter()):
+        reset_criteria(stopping_criteria, globals)
+        first_index = globals.first_open_quarter()
+        while globals.number_of_quarters_to_simulate > 0:
+            quarter = report.quarters_simulated + 1
+            with profile_quarter(quarter), log_context(quarter=quarter):
+                _simulate_three_way_quarter(
+                    globals, model, run_agent, _RunQuarter(run_name, first_index + quarter - 1))
+                stopped = _end_of_quarter(globals, report, stopping_criteria, outfile)
+            if stopped:
+                break
+
+    return report
+
+
+def simulate_two_way(
+    globals,
+    model,
+    outfile=None,
+    stopping_criteria: list[StoppingCriterion] | None = None,
+    speculate: bool = False,
+    speculation_tolerance: float = 0.0025,
+    num_samples: int = 1,
+    aggregation: str = "median",
+    structured_output: bool = False,
+    run_name: str = DEFAULT_RUN
+) -> SimulationReport:
     """Run the three banks simulation given the initial variables and the
     model name to run. This orchestration assumes that the central bank makes
     its decisions first and then a two-way parallelism occurs between the large
-    commercial bank and small commercial bank"""
+    commercial bank and small commercial bank. The run ends early as soon as
+    any of `stopping_criteria` fires.
+
+    With `speculate`, the banks decide concurrently and EconomyAgent starts
+    at the same time on predicted bank knobs (the banks keep their latest
+    values). If any actual knob differs from the prediction by more than
+    `speculation_tolerance`, the speculative result is discarded and
+    EconomyAgent runs again on the actual knobs, so a miss costs a full
+    extra call. A speculative call that already started cannot be cancelled
+    and keeps its worker until it returns, so speculation is skipped in a
+    quarter while the previous quarter's discarded call is still running.
+    Hits, misses and skips are counted in the returned report.
+
+    With `num_samples` > 1, every decision is an ensemble of that many
+    concurrent samples aggregated by `aggregation` ("median" or
+    "trimmed_mean"), and the dispersion is recorded as the uncertainty of
+    each new value. With `structured_output`, agents answer through
+    provider-native structured output instead of free text. `model` is a
+    model name or a ModelRouter. Decisions are recorded and replayed under
+    `run_name`. Every agent decides the same quarters, from the earliest one
+    some series has no value for"""
+    run_agent = functools.partial(
+        _run_agent, num_samples=num_samples, aggregation=aggregation, structured_output=structured_output)
+    stopping_criteria = stopping_criteria or []
+    report = SimulationReport()
+    executor = ThreadPoolExecutor(max_workers=3) if speculate else None
+    try:
+        with log_context(run_id=report.run_id), metering_usage(UsageMeter()):
+            reset_criteria(stopping_criteria, globals)
+            _simulate_two_way_quarters(
+                globals, model, outfile, stopping_criteria, executor, speculation_tolerance, run_agent, report, run_name)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    return report
+
+
+def _simulate_three_way_quarter(globals, model, run_agent, quarter: _RunQuarter):
+    # Have CentralBank, BigBank and SmallBank update their knobs
+    central_bank_results = run_agent(central_bank, model, globals, quarter)
+    big_bank_results = run_agent(big_bank, model, globals, quarter)
+    small_bank_results = run_agent(small_bank, model, globals, quarter)
+
+    # Update the banks' global states
+    _append_decision(globals, central_bank, central_bank_results, quarter)
+    _append_decision(globals, big_bank, big_bank_results, quarter)
+    _append_decision(globals, small_bank, small_bank_results, quarter)
+
+    # Have EconomyAgent update the economic vars
+    _append_decision(globals, economy_agent, run_agent(economy_agent, model, globals, quarter), quarter)
+
+
+def _simulate_two_way_quarters(
+        globals, model, outfile, stopping_criteria, executor, speculation_tolerance, run_agent, report, run_name):
+    first_index = globals.first_open_quarter()
+    speculation = None
     while globals.number_of_quarters_to_simulate > 0:
-        # Have CentralBank update its knobs
-        central_bank_results: ResultCentralBankKnobsTool | None = None
-        while central_bank_results is None:
-            central_bank_results = central_bank.run_state(model, globals)
-        central_bank_new_knobs = central_bank_results.result_central_bank_knobs
-
-        # Update the central bank's global states
-        globals.central_bank_knobs.target_interest_rate.append(
-            NonnegPercent(central_bank_new_knobs.target_interest_rate)
-        )
-        globals.central_bank_knobs.securities_holdings_pc_change.append(
-            Percent(central_bank_new_knobs.securities_holdings_pc_change)
-        )
+        quarter = report.quarters_simulated + 1
+        with profile_quarter(quarter), log_context(quarter=quarter):
+            speculation = _simulate_two_way_quarter(
+                globals, model, executor, speculation_tolerance, run_agent, report,
+                _RunQuarter(run_name, first_index + quarter - 1), speculation)
+            stopped = _end_of_quarter(globals, report, stopping_criteria, outfile)
+        if stopped:
+            break
+
 
+def _simulate_two_way_quarter(
+        globals, model, executor, speculation_tolerance, run_agent, report, quarter: _RunQuarter, previous_speculation):
+    """Simulate one quarter and return the speculative EconomyAgent call
+    started in it, if any, so that the next quarter can tell whether its
+    worker is free"""
+    # Every agent's decision this quarter is recorded at the same quarter
+    # index, although CentralBank appends before the others
+    _append_decision(globals, central_bank, run_agent(central_bank, model, globals, quarter), quarter)
+
+    speculative_globals, speculative_econ = None, None
+    if executor is not None:
+        big_bank_future = _submit(executor, run_agent, big_bank, model, globals, quarter)
+        small_bank_future = _submit(executor, run_agent, small_bank, model, globals, quarter)
+        if previous_speculation is None or previous_speculation.done():
+            # Start EconomyAgent on predicted bank knobs while the banks decide
+            speculative_globals = _predict_bank_knobs(globals)
+            speculative_econ = _submit(executor, run_agent, economy_agent, model, speculative_globals, quarter)
+        else:
+            # The discarded call of the last quarter still holds a worker
+            report.speculation_skips += 1
+        big_bank_results = big_bank_future.result()
+        small_bank_results = small_bank_future.result()
+    else:
         # Have BigBank update its knobs
-        big_bank_results: ResultBigBankKnobsTool | None = None
-        while big_bank_results is None:
-            big_bank_results = big_bank.run_state(model, globals)
-        big_bank_new_knobs = big_bank_results.result_big_bank_knobs
+        big_bank_results = run_agent(big_bank, model, globals, quarter)
 
         # Have SmallBank update its knobs
-        small_bank_results: ResultSmallBankKnobsTool | None = None
-        while small_bank_results is None:
-            small_bank_results = small_bank.run_state(model, globals)
-        small_bank_new_knobs = small_bank_results.result_small_bank_knobs
-
-        globals.big_bank_knobs.deposit_interest_rate.append(
-            NonnegPercent(big_bank_new_knobs.deposit_interest_rate)
-        )
-        globals.big_bank_knobs.loan_to_deposit_ratio.append(
-            NonnegPercent(big_bank_new_knobs.loan_to_deposit_ratio)
-        )
-        globals.small_bank_knobs.consumer_loan_focus.append(
-            NonnegPercent(small_bank_new_knobs.consumer_loan_focus)
-        )
-        globals.small_bank_knobs.loans_interest_rate.append(
-            NonnegPercent(small_bank_new_knobs.loans_interest_rate)
-        )
-
-        # Have EconomyAgent update the economic vars
-        economy_agent_results: ResultEconVarsTool | None = None
-        while economy_agent_results is None:
-            economy_agent_results = economy_agent.run_state(model, globals)
-        new_econ_vars = economy_agent_results.result_econ_vars
-
-        # Update the global economic variables
-        globals.economic_variables.gdp_growth_rate.append(
-            Percent(new_econ_vars.gdp_growth_rate)
-        )
-        globals.economic_variables.unemployment_rate.append(
-            NonnegPercent(new_econ_vars.unemployment_rate)
-        )
-        globals.economic_variables.inflation_rate.append(
-            Percent(new_econ_vars.inflation_rate)
-        )
-        globals.number_of_quarters_to_simulate -= 1
-
-        if outfile is not None:
-            globals_pd = globals.to_pandas_df()
-            globals_pd.to_csv(outfile)
+        small_bank_results = run_agent(small_bank, model, globals, quarter)
+    _append_decision(globals, big_bank, big_bank_results, quarter)
+    _append_decision(globals, small_bank, small_bank_results, quarter)
+
+    # Have EconomyAgent update the economic vars, reusing the speculative
+    # result when the banks decided close enough to the prediction
+    if speculative_econ is not None and _prediction_within_tolerance(
+            speculative_globals, globals, speculation_tolerance):
+        report.speculation_hits += 1
+        economy_agent_results = speculative_econ.result()
+    else:
+        if speculative_econ is not None:
+            report.speculation_misses += 1
+        economy_agent_results = run_agent(economy_agent, model, globals, quarter)
+    _append_decision(globals, economy_agent, economy_agent_results, quarter)
+    return speculative_econ
+
+
+def simulate_sweep(
+    runs: list[ThreeBankGlobalState],
+    model,
+    max_concurrent_runs: int = 4,
+    stopping_criteria_factory: Callable[[], list[StoppingCriterion]] | None = None,
+    simulate=simulate_two_way
+) -> list[SimulationReport]:
+    """Run many simulations with at most `max_concurrent_runs` in flight.
+    Runs are queued and each one takes a slot as soon as another run ends, so
+    runs that stop early hand their slot to the next queued run right away.
+    Each run gets fresh criteria from `stopping_criteria_factory` since
+    criteria keep per-run state, and budgets only count the LLM usage of
+    their own run. The i-th run records its decisions under run-i"""
+    def run_one(globals, run_name):
+        criteria = stopping_criteria_factory() if stopping_criteria_factory is not None else None
+        return simulate(globals, model, stopping_criteria=criteria, run_name=run_name)
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_runs) as executor:
+        futures = [_submit(executor, run_one, globals, f"run-{i}") for i, globals in enumerate(runs)]
+        return [future.result() for future in futures]
+
+
+def make_model_router() -> ModelRouter:
+    return ModelRouter(MODEL_NAMES)
 
 
 def main():
-    model = MODEL_NAME
+    # One log directory per run under logs/runs/, indexed by run id
+    configure_logging(log_file=LOG_FILE, async_logging=True, shard_by_run=True)
+    model = make_model_router()
     globals = initialize_test_data()
 
     print(globals.print_subfields())
 
-    simulate_three_way(globals, model)
+    with recording_transcripts(TranscriptStore(TRANSCRIPTS_DB)):
+        simulate_three_way(globals, model)
+    print(f"Full agent retries avoided by repairing answers: {REPAIR_TRACKER.retries_avoided()}")
+    print(f"Model latencies and error rates: {model.summary()}")
 
     globals_pd = globals.to_pandas_df()
     globals_pd.to_csv(f"output/{OUTPUT_CSV_NAME}.csv")
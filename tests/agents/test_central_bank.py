@@ -1,7 +1,7 @@
 import pytest
 from pytest_mock import MockerFixture
 
-from agentomics.agents.central_bank import run_state
+from agentomics.agents.central_bank import PROMPT_PREFIX, run_state
 from agentomics.tools.central_bank_knobs import (
     ResultCentralBankKnobs,
     ResultCentralBankKnobsTool,
@@ -27,8 +27,11 @@ def test_run_state(mock_task, mock_globals):
     model_name = "test-model"
     result = run_state(model_name, mock_globals)
 
-    # Assert that the task run method was called
+    # Assert that the task run method was called with the compact state
     mock_task.run.assert_called_once()
+    prompt = mock_task.run.call_args.args[0]
+    assert prompt.startswith(PROMPT_PREFIX)
+    assert "quarter|economic_variables: gdp_growth_rate" in prompt
 
     # Assert the values returned from the mocked LLM response
     assert isinstance(result, ResultCentralBankKnobsTool)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.types import NonnegPercent, Percent
+
+QUARTERS = [10, 1_000, 100_000]
+
+
+def make_globals(num_quarters: int, seed: int = 0) -> ThreeBankGlobalState:
+    """Global state with `num_quarters` random values in every series"""
+    rng = np.random.default_rng(seed)
+    globals = ThreeBankGlobalState()
+    for series in globals.iter_series():
+        if series.type_check is Percent:
+            values = rng.uniform(-0.05, 0.05, num_quarters)
+        else:
+            values = rng.uniform(0.0, 1.0, num_quarters)
+        series.set_array([series.type_check(float(x)) for x in values])
+    return globals
+
+
+@pytest.fixture(scope="session", params=QUARTERS, ids=lambda n: f"{n}q")
+def num_quarters(request):
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def sized_globals(num_quarters):
+    return make_globals(num_quarters)
+
+
+@pytest.fixture(scope="session")
+def globals_factory():
+    return make_globals
+
+
+@pytest.fixture(scope="session", params=[NonnegPercent(0.5), Percent(-0.5)], ids=["nonneg", "signed"])
+def percent_item(request):
+    return request.param
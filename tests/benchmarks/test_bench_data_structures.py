@@ -0,0 +1,7 @@
+def test_print_subfields(benchmark, sized_globals):
+    assert benchmark(sized_globals.print_subfields)
+
+
+def test_to_pandas_df(benchmark, sized_globals):
+    df = benchmark(sized_globals.to_pandas_df)
+    assert len(df) == len(sized_globals.economic_variables.gdp_growth_rate)
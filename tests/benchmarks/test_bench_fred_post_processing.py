@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agentomics.utils.fred_post_processing import get_longest_common_date_range
+
+
+@pytest.fixture(scope="module")
+def wide_series():
+    """50 monthly DataFrames of 20 series each over 100 years, with random
+    gaps and staggered start dates"""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("1925-01-01", periods=1200, freq="MS")
+    dataframes = []
+    for i in range(50):
+        values = rng.normal(size=(len(dates), 20))
+        values[rng.random(len(dates)) < 0.01] = np.nan
+        df = pd.DataFrame(values, columns=[f"series_{i}_{j}" for j in range(20)])
+        df.insert(0, "date", dates)
+        dataframes.append(df.iloc[i * 4:].reset_index(drop=True))
+    return dataframes
+
+
+def test_get_longest_common_date_range(benchmark, wide_series):
+    result = benchmark(get_longest_common_date_range, wide_series)
+    assert result.shape[1] == 1 + 50 * 20
@@ -0,0 +1,14 @@
+import numpy as np
+
+from agentomics.common.metrics import score
+
+NUM_RUNS = 10_000
+FIELDS = ["gdp_growth_rate", "unemployment_rate", "inflation_rate"]
+
+
+def test_score_sweep(benchmark):
+    rng = np.random.default_rng(0)
+    actuals = rng.uniform(0.0, 0.1, size=(16, len(FIELDS)))
+    simulated = actuals + rng.normal(0.0, 0.01, size=(NUM_RUNS, *actuals.shape))
+    table = benchmark(score, simulated, actuals, FIELDS)
+    assert list(table.index) == FIELDS
@@ -0,0 +1,58 @@
+import tracemalloc
+from dataclasses import dataclass
+
+import pytest
+
+from agentomics.common.types import NonnegPercent, Percent
+
+NUM_VALUES = 1_000_000
+
+
+@dataclass(frozen=True)
+class DataclassPercent(float):
+    """The dataclass Percent the slotted one replaced, as a baseline"""
+    value: float
+    name: str | None = None
+
+    def __post_init__(self):
+        if not (0.0 <= abs(self.value) <= 1.0) and self.value != float("-inf"):
+            raise ValueError("Invalid percentage input")
+
+
+PERCENT_TYPES = [Percent, NonnegPercent, DataclassPercent]
+
+
+def construct_all(percent_type, values):
+    return [percent_type(x) for x in values]
+
+
+def allocated_bytes(percent_type, values) -> int:
+    tracemalloc.start()
+    try:
+        percents = construct_all(percent_type, values)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(percents) == len(values)
+    return size
+
+
+@pytest.fixture(scope="module")
+def values():
+    return [i / NUM_VALUES for i in range(NUM_VALUES)]
+
+
+@pytest.mark.parametrize("percent_type", PERCENT_TYPES, ids=lambda t: t.__name__)
+def test_construct(benchmark, values, percent_type):
+    percents = benchmark.pedantic(construct_all, args=(percent_type, values), rounds=3)
+    assert len(percents) == NUM_VALUES
+    benchmark.extra_info["bytes_per_value"] = allocated_bytes(percent_type, values) / NUM_VALUES
+
+
+def test_memory(benchmark, values):
+    sizes = benchmark.pedantic(
+        lambda: {t.__name__: allocated_bytes(t, values) for t in PERCENT_TYPES}, rounds=1
+    )
+    benchmark.extra_info.update(sizes)
+    assert sizes["Percent"] < sizes["DataclassPercent"]
+    assert sizes["NonnegPercent"] < sizes["DataclassPercent"]
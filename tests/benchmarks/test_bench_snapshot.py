@@ -0,0 +1,20 @@
+import copy
+import pickle
+
+
+def test_fork(benchmark, sized_globals):
+    forked = benchmark(sized_globals.fork)
+    assert forked.economic_variables.gdp_growth_rate == sized_globals.economic_variables.gdp_growth_rate
+
+
+def test_deepcopy(benchmark, sized_globals):
+    copied = benchmark(copy.deepcopy, sized_globals)
+    assert len(copied.economic_variables.gdp_growth_rate) == len(sized_globals.economic_variables.gdp_growth_rate)
+
+
+def test_pickle_snapshot(benchmark, sized_globals):
+    snapshot = sized_globals.snapshot()
+    data = benchmark(pickle.dumps, snapshot)
+    benchmark.extra_info["bytes"] = len(data)
+    assert len(pickle.loads(data).restore().economic_variables.gdp_growth_rate) == len(
+        sized_globals.economic_variables.gdp_growth_rate)
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+from langroid.language_models.mock_lm import MockLMConfig
+
+from scripts.economic_simulations.three_banks import simulate_two_way
+
+ANSWERS = {
+    "central_bank": ("result_central_bank_knobs_tool", "result_central_bank_knobs", {
+        "target_interest_rate": 0.03, "securities_holdings_pc_change": 0.01}),
+    "big_bank": ("result_big_bank_knobs_tool", "result_big_bank_knobs", {
+        "loan_to_deposit_ratio": 0.7, "deposit_interest_rate": 0.02}),
+    "small_bank": ("result_small_bank_knobs_tool", "result_small_bank_knobs", {
+        "loans_interest_rate": 0.05, "consumer_loan_focus": 0.7}),
+    "economy_agent_llm": ("result_econ_vars_tool", "result_econ_vars", {
+        "gdp_growth_rate": 0.02, "unemployment_rate": 0.05, "inflation_rate": 0.035}),
+}
+
+
+@pytest.fixture
+def mock_llm(mocker):
+    # Every agent gets a mocked LLM that answers with its result tool, so the
+    # Langroid task, prompt rendering and tool parsing all run for real
+    for agent, (request, field, values) in ANSWERS.items():
+        answer = f"DONE TOOL: {json.dumps({'request': request, field: values})}"
+        mocker.patch(
+            f"agentomics.agents.{agent}.structured_llm_config",
+            return_value=MockLMConfig(default_response=answer)
+        )
+
+
+def test_simulate_two_way_quarter(benchmark, mock_llm, globals_factory):
+    def one_quarter():
+        globals = globals_factory(10)
+        return simulate_two_way(globals, "gpt-4o-mini")
+
+    report = benchmark(one_quarter)
+    assert report.quarters_simulated == 1
@@ -0,0 +1,24 @@
+from agentomics.common.types import TypedArray
+
+
+def test_append(benchmark, percent_item, num_quarters):
+    def append_all():
+        series = TypedArray(type(percent_item))
+        for _ in range(num_quarters):
+            series.append(percent_item)
+        return series
+
+    assert len(benchmark(append_all)) == num_quarters
+
+
+def test_set_array(benchmark, percent_item, num_quarters):
+    items = [percent_item] * num_quarters
+    series = TypedArray(type(percent_item))
+    benchmark(series.set_array, items)
+    assert len(series) == num_quarters
+
+
+def test_slice(benchmark, sized_globals):
+    series = sized_globals.economic_variables.gdp_growth_rate
+    half = benchmark(lambda: series[len(series) // 2:])
+    assert len(half) == len(series) - len(series) // 2
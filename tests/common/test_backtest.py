@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agentomics.common.backtest import (
+    DEFAULT_COLUMNS,
+    forecast_errors,
+    globals_from_history,
+    run_backtest,
+)
+from agentomics.common.rate_limit import RateLimiter, rate_limiting, wait_for_rate_limit
+
+
+@pytest.fixture
+def history():
+    n = 12
+    return pd.DataFrame({
+        "date": pd.date_range("2018-01-01", periods=n, freq="QS"),
+        "Quarterly GDP Growth Rate": np.linspace(0.01, 0.03, n),
+        "Quarterly Unemployment Rate": np.full(n, 0.05),
+        "Quarterly Inflation Rate": np.linspace(0.02, 0.04, n),
+        "Quarterly Effective Federal Funds Rate": np.full(n, 0.02),
+        "Quarterly Securities Held Percent Change": [np.nan] + [0.01] * (n - 1),
+    })
+
+
+def persistence(globals, model, run_name="run"):
+    # Naive forecast: every series keeps its latest value
+    for _ in range(globals.number_of_quarters_to_simulate):
+        for series in globals.iter_series():
+            series.append(series[-1])
+    globals.number_of_quarters_to_simulate = 0
+
+
+def test_globals_from_history(history):
+    globals = globals_from_history(history, 8)
+    assert len(globals.economic_variables.gdp_growth_rate) == 8
+    assert repr(globals.central_bank_knobs.securities_holdings_pc_change[0]) == "N/A"
+    assert repr(globals.big_bank_knobs.deposit_interest_rate[-1]) == "N/A"
+
+
+def test_run_backtest_scores_every_origin(history):
+    result = run_backtest(history, "model", persistence, context_quarters=8, horizon=2, max_concurrent_origins=3)
+    assert list(result.origins) == [8, 9, 10, 11]
+    assert result.forecasts.shape == (4, 2, len(DEFAULT_COLUMNS))
+    # The last origin has a single quarter left to forecast
+    assert np.isnan(result.forecasts[-1, 1]).all() and np.isnan(result.actuals[-1, 1]).all()
+
+    errors = result.errors
+    assert errors.loc[(1, "unemployment_rate"), "mae"] == 0.0
+    step = (0.03 - 0.01) / 11
+    assert errors.loc[(1, "gdp_growth_rate"), "bias"] == pytest.approx(-step)
+    assert errors.loc[(2, "gdp_growth_rate"), "rmse"] == pytest.approx(2 * step)
+    assert errors.loc[(2, "gdp_growth_rate"), "count"] == 3
+
+
+def test_forecast_errors_skip_missing_values():
+    forecasts = np.array([[[0.1]], [[np.nan]], [[0.3]]])
+    actuals = np.array([[[0.2]], [[0.2]], [[0.1]]])
+    errors = forecast_errors(forecasts, actuals, ["x"])
+    assert errors.loc[(1, "x"), "count"] == 2
+    assert errors.loc[(1, "x"), "mae"] == pytest.approx(0.15)
+    assert errors.loc[(1, "x"), "bias"] == pytest.approx(0.05)
+
+
+def test_rate_limiter_spaces_calls_after_burst():
+    now, waits = [0.0], []
+    limiter = RateLimiter(rate=2.0, burst=2, clock=lambda: now[0], sleep=waits.append)
+    with rate_limiting(limiter):
+        for _ in range(4):
+            wait_for_rate_limit()
+    assert waits == [pytest.approx(0.5), pytest.approx(1.0)]
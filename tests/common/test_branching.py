@@ -0,0 +1,49 @@
+import pytest
+
+from agentomics.common.branching import fork_branches, shift_latest, simulate_branches
+from agentomics.common.data_structures import initialize_test_data
+from agentomics.common.types import NonnegPercent
+
+
+def fake_simulate(globals, model, step=0.001, run_name="run"):
+    # Raise the target interest rate by `step` every quarter
+    rates = globals.central_bank_knobs.target_interest_rate
+    while globals.number_of_quarters_to_simulate > 0:
+        rates.append(NonnegPercent(rates[-1].to_val() + step))
+        globals.number_of_quarters_to_simulate -= 1
+    return len(rates)
+
+
+def test_fork_shares_history_copy_on_write():
+    globals = initialize_test_data()
+    branches = fork_branches(globals, {
+        "control": None,
+        "hike": shift_latest("central_bank_knobs", "target_interest_rate", 0.01),
+    })
+    control, hike = branches["control"], branches["hike"]
+    assert control.economic_variables.gdp_growth_rate._array is globals.economic_variables.gdp_growth_rate._array
+
+    assert hike.central_bank_knobs.target_interest_rate[-1].to_val() == pytest.approx(0.04)
+    assert control.central_bank_knobs.target_interest_rate[-1].to_val() == 0.03
+    assert globals.central_bank_knobs.target_interest_rate[-1].to_val() == 0.03
+
+    control.economic_variables.gdp_growth_rate.append(initialize_test_data().economic_variables.gdp_growth_rate[0])
+    assert len(control.economic_variables.gdp_growth_rate) == 4
+    assert len(globals.economic_variables.gdp_growth_rate) == 3
+    assert len(hike.economic_variables.gdp_growth_rate) == 3
+
+
+def test_simulate_branches_runs_prefix_once():
+    globals = initialize_test_data()
+    branches = simulate_branches(
+        globals, "model", fake_simulate,
+        {"control": None, "hike": shift_latest("central_bank_knobs", "target_interest_rate", 0.01)},
+        prefix_quarters=2, branch_quarters=3
+    )
+    assert len(globals.central_bank_knobs.target_interest_rate) == 5
+    assert {name: branch.report for name, branch in branches.items()} == {"control": 8, "hike": 8}
+
+    control = branches["control"].globals.central_bank_knobs.target_interest_rate
+    hike = branches["hike"].globals.central_bank_knobs.target_interest_rate
+    assert control.to_list()[:4] == hike.to_list()[:4]
+    assert hike[-1].to_val() - control[-1].to_val() == pytest.approx(0.01)
@@ -0,0 +1,38 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from agentomics.common.data_structures import ThreeBankGlobalState, initialize_test_data
+from agentomics.common.types import Percent
+
+
+def test_states_do_not_share_series():
+    control, experiment = ThreeBankGlobalState(), ThreeBankGlobalState()
+    history = [Percent(0.02), Percent(0.03)]
+    control.economic_variables.gdp_growth_rate.set_array(history)
+    experiment.economic_variables.gdp_growth_rate.set_array(history)
+
+    experiment.economic_variables.gdp_growth_rate.append(Percent(0.04))
+    assert len(control.economic_variables.gdp_growth_rate) == 2 and len(history) == 2
+    assert control.economic_variables is not experiment.economic_variables
+
+    copied = control.copy()
+    copied.economic_variables.gdp_growth_rate[0] = Percent(0.01)
+    assert control.economic_variables.gdp_growth_rate[0] == Percent(0.02)
+
+
+def test_snapshot_restores_independent_states():
+    globals = initialize_test_data()
+    snapshot = globals.snapshot()
+    globals.economic_variables.inflation_rate.append(Percent(0.05))
+
+    def run(step: int) -> list[float]:
+        restored = snapshot.restore()
+        restored.economic_variables.inflation_rate.append(Percent(step / 100))
+        return restored.economic_variables.inflation_rate.to_list(elementary_types=True)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(run, range(8)))
+    assert all(result[:3] == [0.025, 0.03, 0.035] and result[3] == step / 100 for step, result in enumerate(results))
+
+    unpickled = pickle.loads(pickle.dumps(snapshot)).restore()
+    assert len(unpickled.economic_variables.inflation_rate) == 3
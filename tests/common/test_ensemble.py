@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from agentomics.common.ensemble import aggregate, combine_samples, run_ensemble
+from agentomics.tools.econ_vars_tool import ResultEconVars, ResultEconVarsTool
+
+
+def econ_vars_tool(gdp, unemployment, inflation):
+    return ResultEconVarsTool(
+        result_econ_vars=ResultEconVars(
+            gdp_growth_rate=gdp,
+            unemployment_rate=unemployment,
+            inflation_rate=inflation
+        )
+    )
+
+
+def test_aggregate_median_and_trimmed_mean():
+    values = np.array([[0.01], [0.02], [0.03], [0.04], [0.5]])
+    assert aggregate(values, "median")[0] == pytest.approx(0.03)
+    # One sample is trimmed from each end
+    assert aggregate(values, "trimmed_mean", trim_fraction=0.2)[0] == pytest.approx(0.03)
+    with pytest.raises(ValueError):
+        aggregate(values, "mode")
+
+
+def test_combine_samples():
+    samples = [
+        econ_vars_tool(0.01, 0.05, 0.02),
+        econ_vars_tool(0.02, 0.05, 0.03),
+        econ_vars_tool(0.03, 0.05, 0.10),
+    ]
+    ensemble = combine_samples(samples)
+    assert isinstance(ensemble.result, ResultEconVarsTool)
+    assert ensemble.result.result_econ_vars.gdp_growth_rate == pytest.approx(0.02)
+    assert ensemble.result.result_econ_vars.inflation_rate == pytest.approx(0.03)
+    assert ensemble.dispersion["unemployment_rate"] == pytest.approx(0.0)
+    assert ensemble.dispersion["gdp_growth_rate"] == pytest.approx(np.std([0.01, 0.02, 0.03]))
+    assert ensemble.num_samples == 3
+
+
+def test_run_ensemble_drops_failed_samples():
+    samples = iter([econ_vars_tool(0.01, 0.05, 0.02), None, econ_vars_tool(0.03, 0.05, 0.02)])
+    ensemble = run_ensemble(lambda model, globals: next(samples), "test-model", None, num_samples=3)
+    assert ensemble.num_samples == 2
+    assert ensemble.result.result_econ_vars.gdp_growth_rate == pytest.approx(0.02)
+
+
+def test_run_ensemble_all_failed():
+    assert run_ensemble(lambda model, globals: None, "test-model", None, num_samples=2) is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agentomics.common.metrics import (
+    crps,
+    directional_accuracy,
+    score,
+    stack_trajectories,
+)
+
+
+@pytest.fixture
+def actuals():
+    return np.array([[0.01, 0.05], [0.02, 0.05], [0.03, 0.04]])
+
+
+def test_stack_trajectories_pads_and_drops_na():
+    frames = [
+        pd.DataFrame({"gdp_growth_rate": [0.01, float("-inf"), 0.03]}),
+        pd.DataFrame({"gdp_growth_rate": [0.02]}),
+    ]
+    stacked = stack_trajectories(frames, ["gdp_growth_rate"])
+    assert stacked.shape == (2, 3, 1)
+    assert np.isnan(stacked[0, 1, 0]) and np.isnan(stacked[1, 1:, 0]).all()
+
+
+def test_stack_trajectories_truncates_by_position():
+    frames = [
+        pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [4.0, 5.0, 6.0]}, index=[10, 20, 30]),
+        pd.DataFrame({"b": [7.0], "a": [8.0]}),
+    ]
+    stacked = stack_trajectories(frames, ["b", "a"], num_quarters=2)
+    np.testing.assert_array_equal(stacked[0], [[4.0, 1.0], [5.0, 2.0]])
+    np.testing.assert_array_equal(stacked[1, 0], [7.0, 8.0])
+    assert np.isnan(stacked[1, 1]).all()
+    assert stack_trajectories([], ["a"]).shape == (0, 0, 1)
+
+
+def test_score_matches_per_run_loop(actuals):
+    rng = np.random.default_rng(0)
+    simulated = actuals + rng.normal(0, 0.01, size=(50, *actuals.shape))
+    simulated[3, 1, 0] = np.nan
+    table = score(simulated, actuals, ["gdp_growth_rate", "unemployment_rate"])
+
+    errors = simulated - actuals
+    assert table.loc["gdp_growth_rate", "rmse"] == pytest.approx(np.sqrt(np.nanmean(errors[..., 0] ** 2)))
+    assert table.loc["unemployment_rate", "mae"] == pytest.approx(np.mean(np.abs(errors[..., 1])))
+    assert table.loc["gdp_growth_rate", "bias"] == pytest.approx(np.nanmean(errors[..., 0]))
+
+    per_run = score(simulated, actuals, ["gdp_growth_rate", "unemployment_rate"], per_run=True)
+    assert per_run.loc[(3, "unemployment_rate"), "mae"] == pytest.approx(np.mean(np.abs(errors[3, :, 1])))
+
+
+def test_directional_accuracy(actuals):
+    simulated = np.array([[[0.0, 0.06], [0.01, 0.07], [0.02, 0.03]]])
+    # gdp rises twice in both; unemployment: flat then down vs up then down
+    assert directional_accuracy(simulated, actuals).tolist() == [1.0, 0.5]
+
+
+def test_crps_matches_pairwise_definition():
+    rng = np.random.default_rng(1)
+    simulated = rng.normal(size=(7, 2, 3))
+    actuals = rng.normal(size=(2, 3))
+    expected = (np.abs(simulated - actuals).mean(axis=0)
+                - 0.5 * np.abs(simulated[:, None] - simulated[None, :]).mean(axis=(0, 1)))
+    np.testing.assert_allclose(crps(simulated, actuals), expected)
+    # A perfect deterministic ensemble scores zero
+    assert crps(np.broadcast_to(actuals, simulated.shape), actuals) == pytest.approx(np.zeros((2, 3)))
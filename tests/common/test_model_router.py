@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from agentomics.common.model_router import AllModelsFailedError, ModelRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _timed(clock, latencies, failing=()):
+    """fn(model) that advances the clock by the model's latency and raises
+    for the models in `failing`"""
+    def fn(model):
+        clock.now += latencies[model]
+        if model in failing:
+            raise ConnectionError(f"{model} is throttled")
+        return model
+    return fn
+
+
+def test_routes_to_lowest_latency_after_measuring_every_model():
+    clock = FakeClock()
+    router = ModelRouter(["slow", "fast"], min_samples=2, clock=clock)
+    fn = _timed(clock, {"slow": 5.0, "fast": 1.0})
+
+    # Unmeasured models are tried first, in preference order
+    assert [router.call("central_bank", fn) for _ in range(2)] == ["slow", "slow"]
+    assert [router.call("central_bank", fn) for _ in range(2)] == ["fast", "fast"]
+    assert router.call("central_bank", fn) == "fast"
+    assert router.summary()["slow"]["p50"] == 5.0
+
+
+def test_per_agent_preferences():
+    router = ModelRouter(["a", "b"], preferences={"economy_agent_llm": ["c", "a"]})
+    assert router.ranked("economy_agent_llm") == ["c", "a"]
+    assert router.ranked("big_bank") == ["a", "b"]
+
+
+def test_fails_over_and_cools_down_degraded_model():
+    clock = FakeClock()
+    router = ModelRouter(["groq", "openai"], min_samples=1, max_error_rate=0.5, cooldown=60.0, clock=clock)
+    fn = _timed(clock, {"groq": 0.1, "openai": 1.0}, failing={"groq"})
+
+    assert router.call("central_bank", fn) == "openai"
+    assert router.ranked("central_bank") == ["openai", "groq"]
+    clock.now += 61.0
+    assert router.ranked("central_bank")[0] == "groq"
+
+
+def test_raises_when_every_model_fails():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], clock=clock)
+    with pytest.raises(AllModelsFailedError):
+        router.call("central_bank", _timed(clock, {"a": 1.0, "b": 1.0}, failing={"a", "b"}))
+
+
+def test_bind_ignores_model_argument():
+    router = ModelRouter(["a"])
+    routed = router.bind("central_bank", lambda model, globals: (model, globals))
+    assert routed("ignored", "state") == ("a", "state")
+
+
+def test_fails_over_when_a_call_misses_its_deadline():
+    router = ModelRouter(["a", "b"], min_samples=2, deadline_factor=3.0)
+    delays = {"a": 0.01, "b": 0.05}
+
+    def fn(model):
+        time.sleep(delays[model])
+        return model
+
+    assert router.deadline("a") is None
+    assert [router.call("central_bank", fn) for _ in range(4)] == ["a", "a", "b", "b"]
+    assert router.deadline("a") == pytest.approx(3.0 * router.summary()["a"]["p95"])
+
+    delays["a"] = 1.0
+    assert router.call("central_bank", fn) == "b"
+    assert router.summary()["a"]["error_rate"] == pytest.approx(1 / 3)
+
+
+def test_none_results_count_as_errors():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], min_samples=1, max_error_rate=1.0, clock=clock)
+
+    assert router.call("central_bank", lambda model: None if model == "a" else model) == "b"
+    summary = router.summary()
+    assert summary["a"]["error_rate"] == 1.0
+    assert summary["a"]["p50"] is None
+    # Callers retry when every backend returned None
+    assert router.call("central_bank", lambda model: None) is None
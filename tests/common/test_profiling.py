@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+
+import pytest
+
+from agentomics.common.profiling import (
+    Profiler,
+    profile_phase,
+    profile_quarter,
+    profiling,
+)
+
+
+def test_hooks_are_noop_without_active_profiler():
+    with profile_phase("llm_call"), profile_quarter(1):
+        pass
+
+
+def test_phases_are_recorded_as_nested_events():
+    with profiling() as profiler:
+        with profile_phase("quarter", quarter=1):
+            with profile_phase("llm_call", agent="CentralBank"):
+                time.sleep(0.01)
+    assert [(e["name"], e["ph"]) for e in profiler.events] == [
+        ("quarter", "B"), ("llm_call", "B"), ("llm_call", "E"), ("quarter", "E")
+    ]
+    assert profiler.events[1]["args"] == {"agent": "CentralBank"}
+    totals = profiler.phase_totals()
+    assert totals["quarter"] >= totals["llm_call"] >= 0.01
+
+
+def test_chrome_trace_and_speedscope_export(tmp_path):
+    with profiling() as profiler:
+        with profile_phase("prompt_build"):
+            pass
+        worker = threading.Thread(target=lambda: profiler.phase("llm_call").__enter__())
+        worker.start()
+        worker.join()
+
+    profiler.write_chrome_trace(tmp_path / "trace.json")
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert {e["ph"] for e in trace["traceEvents"]} == {"B", "E"}
+
+    profiler.write_speedscope(tmp_path / "profile.speedscope.json")
+    speedscope = json.loads((tmp_path / "profile.speedscope.json").read_text())
+    assert [f["name"] for f in speedscope["shared"]["frames"]] == ["prompt_build", "llm_call"]
+    assert len(speedscope["profiles"]) == 2
+
+
+@pytest.mark.parametrize("quarter_profiler", ["cprofile", "sample"])
+def test_selected_quarter_is_profiled(quarter_profiler):
+    profiler = Profiler(profile_quarter=2, quarter_profiler=quarter_profiler, sample_interval=0.001)
+    with profiling(profiler):
+        for quarter in (1, 2):
+            with profile_quarter(quarter):
+                time.sleep(0.02)
+    if quarter_profiler == "cprofile":
+        assert profiler.quarter_stats is not None
+    else:
+        assert profiler.quarter_samples
+        assert profiler.to_speedscope()["profiles"][-1]["type"] == "sampled"
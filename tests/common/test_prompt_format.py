@@ -0,0 +1,59 @@
+import pytest
+
+from agentomics.common.data_structures import initialize_test_data
+from agentomics.common.prompt_format import (
+    PromptFormat,
+    format_state,
+    render_state,
+    tokens_saved,
+)
+from agentomics.common.types import NonnegPercent
+
+
+def test_table_layout():
+    globals = initialize_test_data()
+    lines = format_state(globals).splitlines()
+
+    assert lines[0] == "Values in %, N/A if not available."
+    assert lines[1].startswith("quarter|economic_variables: gdp_growth_rate,unemployment_rate,inflation_rate|central_bank_knobs: ")
+    # One row per quarter with fixed precision and no float noise
+    assert len(lines) == 2 + 3
+    assert lines[2] == "1|3.00,5.00,2.50|2.00,1.00|80.00,1.00|4.00,60.00"
+
+
+def test_table_layout_ragged_and_missing_values():
+    globals = initialize_test_data()
+    globals.central_bank_knobs.target_interest_rate.append(NonnegPercent(float("-inf")))
+    lines = format_state(globals).splitlines()
+
+    assert len(lines) == 2 + 4
+    assert lines[-1] == "4|,,|N/A,|,|,"
+
+
+def test_series_layout_with_deltas():
+    globals = initialize_test_data()
+    text = format_state(globals, PromptFormat(precision=1, layout="series", include_deltas=True))
+    assert "economic_variables:\ngdp_growth_rate: 3.0,2.5,2.0" in text
+    assert "gdp_growth_rate_chg: N/A,-0.5,-0.5" in text
+
+
+def test_invalid_layout():
+    with pytest.raises(ValueError):
+        PromptFormat(layout="json")
+
+
+def test_compact_format_saves_tokens():
+    globals = initialize_test_data()
+    assert tokens_saved(globals) > 0
+    assert render_state(globals, None) == globals.print_subfields()
+
+
+def test_values_line_up_by_quarter():
+    globals = initialize_test_data()
+    globals.central_bank_knobs.target_interest_rate.append(NonnegPercent(0.04), quarter=4)
+    lines = format_state(globals).splitlines()
+
+    assert lines[-2] == "4|,,|N/A,|,|,"
+    assert lines[-1] == "5|,,|4.00,|,|,"
+    df = globals.to_pandas_df()
+    assert len(df) == 5 and df["target_interest_rate"].iloc[4] == 0.04 and df["gdp_growth_rate"].isna().sum() == 2
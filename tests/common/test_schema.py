@@ -0,0 +1,38 @@
+import pytest
+
+from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.schema import (
+    CENTRAL_BANK_KNOBS,
+    SCHEMAS,
+    field_bounds,
+    schema_for_agent,
+)
+from agentomics.tools.central_bank_knobs import (
+    ResultCentralBankKnobs,
+    ResultCentralBankKnobsTool,
+)
+
+
+def test_state_and_tools_follow_the_schema():
+    globals = ThreeBankGlobalState()
+    for name, schema in SCHEMAS.items():
+        knobs = getattr(globals, name)
+        assert list(knobs.__dict__) == [spec.name for spec in schema.fields]
+    assert list(ResultCentralBankKnobs.__fields__) == ["target_interest_rate", "securities_holdings_pc_change"]
+    assert "result_central_bank_knobs" in ResultCentralBankKnobsTool.__fields__
+    assert globals.central_bank_knobs.securities_holdings_pc_change.var_name == "total_securities_holdings"
+    assert schema_for_agent("central_bank") is CENTRAL_BANK_KNOBS
+    assert field_bounds()["gdp_growth_rate"] == (-1.0, 1.0)
+
+
+def test_apply_update_is_all_or_nothing():
+    knobs = ThreeBankGlobalState().central_bank_knobs
+    knobs.apply_update(ResultCentralBankKnobs(target_interest_rate=0.02, securities_holdings_pc_change=-0.1),
+                       quarter=2, dispersion={"target_interest_rate": 0.001})
+    assert knobs.target_interest_rate.to_list(elementary_types=True) == [0.02]
+    assert knobs.target_interest_rate.quarters().tolist() == [2]
+    assert knobs.target_interest_rate.uncertainty() == [0.001]
+
+    with pytest.raises(ValueError):
+        knobs.apply_update(ResultCentralBankKnobs(target_interest_rate=0.03, securities_holdings_pc_change=2.0))
+    assert len(knobs.target_interest_rate) == 1 and len(knobs.securities_holdings_pc_change) == 1
@@ -0,0 +1,78 @@
+from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.stopping_criteria import (
+    BoundsCriterion,
+    BudgetCriterion,
+    ConvergenceCriterion,
+    DivergenceCriterion,
+    first_stop_reason,
+)
+from agentomics.common.types import NonnegPercent, Percent
+
+
+def make_globals(gdp, unemployment, inflation):
+    globals = ThreeBankGlobalState()
+    globals.economic_variables.gdp_growth_rate.set_array([Percent(x) for x in gdp])
+    globals.economic_variables.unemployment_rate.set_array([NonnegPercent(x) for x in unemployment])
+    globals.economic_variables.inflation_rate.set_array([Percent(x) for x in inflation])
+    return globals
+
+
+def test_convergence_requires_patience():
+    criterion = ConvergenceCriterion(threshold=1e-3, patience=2)
+    globals = make_globals([0.02, 0.0201], [0.05, 0.05], [0.03, 0.0302])
+    criterion.reset(globals)
+
+    # First quiet quarter only starts the streak
+    assert criterion.check(globals) is None
+
+    globals.economic_variables.gdp_growth_rate.append(Percent(0.0202))
+    globals.economic_variables.unemployment_rate.append(NonnegPercent(0.05))
+    globals.economic_variables.inflation_rate.append(Percent(0.0301))
+    assert criterion.check(globals).startswith("converged")
+
+
+def test_convergence_streak_resets_on_large_move():
+    criterion = ConvergenceCriterion(threshold=1e-3, patience=2)
+    globals = make_globals([0.02, 0.0201], [0.05, 0.05], [0.03, 0.03])
+    criterion.reset(globals)
+    assert criterion.check(globals) is None
+
+    globals.economic_variables.gdp_growth_rate.append(Percent(0.03))
+    globals.economic_variables.unemployment_rate.append(NonnegPercent(0.05))
+    globals.economic_variables.inflation_rate.append(Percent(0.03))
+    assert criterion.check(globals) is None
+
+
+def test_convergence_ignores_na_values():
+    criterion = ConvergenceCriterion(threshold=1e-3, patience=1)
+    globals = make_globals([0.02, float("-inf")], [0.05, 0.05], [0.03, 0.03])
+    assert criterion.check(globals) is None
+
+
+def test_divergence():
+    globals = make_globals([0.02, 0.25], [0.05, 0.05], [0.03, 0.03])
+    assert DivergenceCriterion(max_step=0.1).check(globals).startswith("diverged: gdp_growth_rate")
+    assert DivergenceCriterion(max_step=0.5).check(globals) is None
+
+
+def test_bounds():
+    globals = make_globals([0.02], [0.6], [0.03])
+    assert BoundsCriterion().check(globals).startswith("out of bounds: unemployment_rate")
+    assert BoundsCriterion({"gdp_growth_rate": (0.0, 0.1)}).check(globals) is None
+
+
+def test_budget_is_relative_to_reset():
+    usage = [(1000, 1.0)]
+    criterion = BudgetCriterion(max_tokens=500, usage_fn=lambda: usage[0])
+    globals = ThreeBankGlobalState()
+    criterion.reset(globals)
+    assert criterion.check(globals) is None
+
+    usage[0] = (1600, 1.2)
+    assert criterion.check(globals).startswith("budget exhausted")
+
+
+def test_first_stop_reason_order():
+    globals = make_globals([0.02, 0.25], [0.05, 0.6], [0.03, 0.03])
+    reason = first_stop_reason([BoundsCriterion(), DivergenceCriterion()], globals)
+    assert reason.startswith("out of bounds")
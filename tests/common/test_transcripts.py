@@ -0,0 +1,70 @@
+import langroid as lr
+import pytest
+from langroid.language_models.mock_lm import MockLMConfig
+
+import agentomics.common.transcripts as transcripts
+from agentomics.agents.central_bank import CentralBank
+from agentomics.common.transcripts import (
+    Transcript,
+    TranscriptStore,
+    recording_transcripts,
+)
+from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
+from agentomics.utils.logging import log_context
+
+ANSWER = (
+    'DONE TOOL: {"request": "result_central_bank_knobs_tool", "result_central_bank_knobs": '
+    '{"target_interest_rate": 0.02, "securities_holdings_pc_change": -0.1}}'
+)
+
+
+@pytest.fixture
+def store():
+    store = TranscriptStore(":memory:", codec="zlib")
+    yield store
+    store.close()
+
+
+def test_store_round_trips_and_filters(store):
+    store.add(Transcript("CentralBank", "prompt 1", "response 1", {"rate": 0.02}, run_id="a", quarter=1))
+    store.add(Transcript("BigBank", "prompt 2", "response 2", None, run_id="a", quarter=1))
+    store.add(Transcript("CentralBank", "prompt 3", "response 3", {"rate": 0.03}, run_id="b", quarter=2))
+
+    assert store.runs() == ["a", "b"]
+    assert [t.prompt for t in store.replay("a")] == ["prompt 1", "prompt 2"]
+    assert [t.response for t in store.query(agent="CentralBank")] == ["response 1", "response 3"]
+    assert store.query(run_id="b", quarter=2)[0].tool == {"rate": 0.03}
+    assert store.find_response("CentralBank", "prompt 3").response == "response 3"
+    # Unparsed calls are not reused as responses
+    assert store.find_response("BigBank", "prompt 2") is None
+
+
+def test_zstd_codec_requires_zstandard():
+    pytest.importorskip("zstandard", reason="zstandard is not installed")
+    store = TranscriptStore(":memory:")
+    assert store.codec == "zstd"
+
+
+def test_falls_back_to_zlib_without_zstandard(monkeypatch):
+    monkeypatch.setattr(transcripts, "zstandard", None)
+    store = TranscriptStore(":memory:")
+    assert store.codec == "zlib"
+    store.add(Transcript("CentralBank", "prompt", "response", None, run_id="a", quarter=1))
+    assert store.query(run_id="a")[0].response == "response"
+    store.close()
+
+    with pytest.raises(ValueError):
+        TranscriptStore(":memory:", codec="zstd")
+
+
+def test_agent_calls_are_recorded_with_context(store):
+    config = lr.ChatAgentConfig(llm=MockLMConfig(default_response=ANSWER))
+    task = lr.Task(CentralBank(config), "CentralBank", single_round=False, interactive=False)
+    with recording_transcripts(store), log_context(run_id="run-1", quarter=3):
+        task[ResultCentralBankKnobsTool].run("Set your knobs", turns=4)
+
+    (transcript,) = store.query(run_id="run-1", quarter=3, agent="CentralBank")
+    assert transcript.prompt == "Set your knobs"
+    assert transcript.response == ANSWER
+    assert transcript.tool["result_central_bank_knobs"]["target_interest_rate"] == 0.02
+    assert transcript.llm_seconds >= 0.0
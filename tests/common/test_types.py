@@ -0,0 +1,128 @@
+import copy
+import pickle
+
+import pytest
+
+from agentomics.common.types import NonnegPercent, Percent, TypedArray
+
+
+def test_slice_keeps_values_and_names():
+    series = TypedArray(Percent, series_name="GDP Growth Rate (% Change)", var_name="gdp_growth_rate")
+    for value in (0.01, 0.02, 0.03):
+        series.append(Percent(value), uncertainty=value / 10)
+
+    tail = series[1:]
+    assert isinstance(tail, TypedArray)
+    assert tail == [Percent(0.02), Percent(0.03)]
+    assert tail.var_name == "gdp_growth_rate"
+    assert tail.uncertainty() == [0.002, 0.003]
+
+
+def test_set_array_checks_types():
+    series = TypedArray(Percent)
+    with pytest.raises(TypeError):
+        series.set_array([Percent(0.01), 0.02])
+    other = TypedArray(NonnegPercent)
+    other.set_array([NonnegPercent(0.01)])
+    with pytest.raises(TypeError):
+        series + other
+
+
+def test_fork_copies_on_write():
+    series = TypedArray(Percent, var_name="gdp_growth_rate")
+    series.append(Percent(0.01))
+    forked = series.fork()
+    assert forked._array is series._array
+
+    forked[0] = Percent(0.02)
+    forked.set_uncertainty(0, 0.1)
+    assert series == [Percent(0.01)] and series.uncertainty() == [None]
+    series.append(Percent(0.03))
+    assert forked == [Percent(0.02)]
+
+
+def test_percent_validates_and_prints():
+    assert repr(Percent(0.25, "rate")) == "25.0%"
+    assert repr(NonnegPercent(float("-inf"))) == "N/A"
+    assert Percent(-0.5).to_val() == -0.5 and Percent(0.5).value == 0.5
+    with pytest.raises(ValueError):
+        Percent(1.5)
+    with pytest.raises(ValueError):
+        NonnegPercent(-0.1)
+
+
+def test_percent_is_slim_and_immutable():
+    percent = Percent(0.1, "rate")
+    assert not hasattr(percent, "__dict__") and not hasattr(NonnegPercent(0.1), "__dict__")
+    with pytest.raises(AttributeError):
+        percent.name = "other"
+    assert pickle.loads(pickle.dumps(percent)) == percent
+    assert copy.deepcopy(percent).name == "rate"
+    assert percent != Percent(0.1) and percent == 0.1 and 0.1 == percent
+    assert Percent(0.1) != NonnegPercent(0.1) and NonnegPercent(0.1) == 0.1
+    assert len({NonnegPercent(0.1), NonnegPercent(0.1)}) == 1
+
+
+def test_missing_values_are_masked():
+    series = TypedArray(NonnegPercent, var_name="unemployment_rate")
+    for value in (0.05, None, NonnegPercent(float("-inf")), 0.06):
+        series.append(None if value is None else NonnegPercent(value))
+
+    assert series.validity().tolist() == [True, False, False, True]
+    assert series.null_count() == 2 and not series.is_valid(-2)
+    assert series[1] is series[2]
+    assert series.to_list(elementary_types=True) == [0.05, None, None, 0.06]
+    assert repr(series) == "[5.0%, N/A, N/A, 6.0%]"
+
+    series[1] = NonnegPercent(0.04)
+    assert series.is_valid(1) and series[1:].validity().tolist() == [True, False, True]
+    assert (series + series).null_count() == 2
+
+    series.set_array([NonnegPercent(0.01)] * 9 + [None])
+    values = series.to_numpy()
+    assert series.null_count() == 1 and values[-1] != values[-1] and values[:-1].sum() == pytest.approx(0.09)
+
+
+def test_values_line_up_by_quarter():
+    series = TypedArray(Percent, var_name="inflation_rate")
+    series.set_array([Percent(0.01), Percent(0.02)])
+    series.append(Percent(0.04), quarter=3)
+    series.append(None)
+
+    assert series.quarters().tolist() == [0, 1, 3, 4]
+    assert series[2:].quarters().tolist() == [3, 4]
+    aligned = series.aligned()
+    assert aligned[[0, 1, 3]].tolist() == [0.01, 0.02, 0.04] and aligned[[2, 4]].tolist() != aligned[[2, 4]].tolist()
+    assert len(series.aligned(2)) == 2
+
+
+def test_appending_to_a_quarter_replaces_its_value():
+    series = TypedArray(Percent)
+    series.set_array([Percent(0.01), Percent(0.02), None, Percent(0.05)])
+    series.append(Percent(0.03), uncertainty=0.001, quarter=2)
+    series.append(Percent(0.04), quarter=3)
+
+    assert len(series) == 4 and series.quarters().tolist() == [0, 1, 2, 3]
+    assert series.to_list() == [0.01, 0.02, 0.03, 0.04] and series.null_count() == 0
+    assert series.uncertainty() == [None, None, 0.001, None]
+
+    series.append(Percent(0.06), quarter=5)
+    with pytest.raises(ValueError):
+        series.append(Percent(0.05), quarter=4)
+    assert series.next_quarter() == 6
+    with pytest.raises(ValueError):
+        series.set_array([Percent(0.01), Percent(0.02)], quarters=[1, 1])
+
+
+def test_pickles_as_flat_buffers():
+    series = TypedArray(Percent, series_name="Inflation Rate (%)", var_name="inflation_rate")
+    series.append(Percent(0.02, "rate"), uncertainty=0.001)
+    series.append(None, quarter=3)
+    forked = series.fork()
+
+    for restored in (pickle.loads(pickle.dumps(forked)), copy.deepcopy(forked)):
+        assert restored == series and restored[0].name == "rate"
+        assert restored.validity().tolist() == [True, False] and restored.quarters().tolist() == [0, 3]
+        assert restored.uncertainty() == [0.001, None] and restored.var_name == "inflation_rate"
+        restored.append(Percent(0.03))
+        assert len(series) == 2
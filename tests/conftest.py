@@ -14,7 +14,7 @@ def mock_globals():
     ])
 
     globals.economic_variables.unemployment_rate.set_array([
-        Percent(0.04), Percent(0.038), Percent(0.036)
+        NonnegPercent(0.04), NonnegPercent(0.038), NonnegPercent(0.036)
     ])
 
     globals.economic_variables.inflation_rate.set_array([
@@ -22,7 +22,7 @@ def mock_globals():
     ])
 
     globals.central_bank_knobs.target_interest_rate.set_array([
-        Percent(0.01), Percent(0.0125), Percent(0.015)
+        NonnegPercent(0.01), NonnegPercent(0.0125), NonnegPercent(0.015)
     ])
 
     globals.central_bank_knobs.securities_holdings_pc_change.set_array([
@@ -1,9 +1,33 @@
+import threading
+
+import numpy as np
 import pytest
+from langroid.language_models.base import LLMTokenUsage
+from pytest_mock import MockerFixture
 
 from agentomics.common.data_structures import ThreeBankGlobalState
+from agentomics.common.model_router import ModelRouter
+from agentomics.common.profiling import profiling
+from agentomics.common.stopping_criteria import BudgetCriterion, ConvergenceCriterion
 from agentomics.common.types import NonnegPercent, Percent
+from agentomics.common.usage import record_usage
+from agentomics.tools.big_bank_knobs import ResultBigBankKnobs, ResultBigBankKnobsTool
+from agentomics.tools.central_bank_knobs import (
+    ResultCentralBankKnobs,
+    ResultCentralBankKnobsTool,
+)
+from agentomics.tools.econ_vars_tool import ResultEconVars, ResultEconVarsTool
+from agentomics.tools.replay import (
+    DecisionLog,
+    recording_decisions,
+    replaying_decisions,
+)
+from agentomics.tools.small_bank_knobs import (
+    ResultSmallBankKnobs,
+    ResultSmallBankKnobsTool,
+)
 from agentomics.utils.logging import configure_logging
-from scripts.economic_simulations.three_banks import simulate_two_way
+from scripts.economic_simulations.three_banks import simulate_sweep, simulate_two_way
 
 MODEL_NAME = "gpt-4o-mini"
 
@@ -74,6 +98,230 @@ def initialize_globals():
 def globals():
     return initialize_globals()
 
+
+@pytest.fixture
+def mock_agents(mocker: MockerFixture):
+    # Mock every agent's run_state with constant decisions to avoid LLM calls
+    mocks = {
+        "central_bank": ResultCentralBankKnobsTool(
+            result_central_bank_knobs=ResultCentralBankKnobs(
+                target_interest_rate=0.03, securities_holdings_pc_change=0.01)),
+        "big_bank": ResultBigBankKnobsTool(
+            result_big_bank_knobs=ResultBigBankKnobs(
+                loan_to_deposit_ratio=0.7, deposit_interest_rate=0.02)),
+        "small_bank": ResultSmallBankKnobsTool(
+            result_small_bank_knobs=ResultSmallBankKnobs(
+                loans_interest_rate=0.05, consumer_loan_focus=0.7)),
+        "economy_agent_llm": ResultEconVarsTool(
+            result_econ_vars=ResultEconVars(
+                gdp_growth_rate=0.02, unemployment_rate=0.05, inflation_rate=0.035)),
+    }
+    return {
+        agent: mocker.patch(f"agentomics.agents.{agent}.run_state", return_value=result)
+        for agent, result in mocks.items()
+    }
+
+
+def test_simulate_two_way_stops_on_convergence(globals, mock_agents):
+    globals.number_of_quarters_to_simulate = 10
+    report = simulate_two_way(globals, MODEL_NAME, stopping_criteria=[ConvergenceCriterion(patience=2)])
+
+    # Quarter 1 repeats the last values, quarter 2 extends the streak
+    assert report.quarters_simulated == 2
+    assert report.stop_reason.startswith("converged")
+    assert globals.number_of_quarters_to_simulate == 0
+    assert mock_agents["economy_agent_llm"].call_count == 2
+    assert len(globals.economic_variables.gdp_growth_rate) == 5
+
+
+def test_simulate_two_way_without_criteria_runs_every_quarter(globals, mock_agents):
+    globals.number_of_quarters_to_simulate = 3
+    report = simulate_two_way(globals, MODEL_NAME)
+    assert report.quarters_simulated == 3
+    assert report.stop_reason is None
+
+
+def test_simulate_two_way_speculation_hits(globals, mock_agents):
+    # The mocked banks repeat their latest knobs, so every prediction hits
+    globals.number_of_quarters_to_simulate = 3
+    report = simulate_two_way(globals, MODEL_NAME, speculate=True)
+    assert report.quarters_simulated == 3
+    assert (report.speculation_hits, report.speculation_misses) == (3, 0)
+    assert report.speculation_hit_rate == 1.0
+    assert mock_agents["economy_agent_llm"].call_count == 3
+
+
+def test_simulate_two_way_speculation_misses(globals, mock_agents):
+    mock_agents["big_bank"].return_value = ResultBigBankKnobsTool(
+        result_big_bank_knobs=ResultBigBankKnobs(
+            loan_to_deposit_ratio=0.6, deposit_interest_rate=0.02))
+    globals.number_of_quarters_to_simulate = 1
+    report = simulate_two_way(globals, MODEL_NAME, speculate=True)
+    assert (report.speculation_hits, report.speculation_misses) == (0, 1)
+    # EconomyAgent ran once speculatively and once on the actual knobs
+    assert mock_agents["economy_agent_llm"].call_count == 2
+    assert globals.big_bank_knobs.loan_to_deposit_ratio[-1].to_val() == 0.6
+
+
+def test_simulate_two_way_skips_speculation_while_a_discarded_call_runs(globals, mock_agents):
+    mock_agents["big_bank"].return_value = ResultBigBankKnobsTool(
+        result_big_bank_knobs=ResultBigBankKnobs(
+            loan_to_deposit_ratio=0.6, deposit_interest_rate=0.02))
+    econ_result = mock_agents["economy_agent_llm"].return_value
+    release = threading.Event()
+
+    def economy_run_state(model, globals, **kwargs):
+        # The speculative call runs on a worker thread and hangs until the
+        # end of the test
+        if threading.current_thread() is not threading.main_thread():
+            release.wait(timeout=10)
+        return econ_result
+
+    mock_agents["economy_agent_llm"].side_effect = economy_run_state
+    globals.number_of_quarters_to_simulate = 2
+    try:
+        report = simulate_two_way(globals, MODEL_NAME, speculate=True)
+    finally:
+        release.set()
+    assert (report.speculation_misses, report.speculation_skips) == (1, 1)
+    assert report.quarters_simulated == 2
+
+
+def test_simulate_two_way_lines_up_series_of_different_lengths(globals, mock_agents):
+    # The central bank has already decided the next quarter
+    globals.central_bank_knobs.target_interest_rate.append(NonnegPercent(0.05))
+    globals.central_bank_knobs.securities_holdings_pc_change.append(Percent(0.03))
+    globals.number_of_quarters_to_simulate = 2
+    simulate_two_way(globals, MODEL_NAME)
+
+    for series in globals.iter_series():
+        assert series.quarters().tolist() == [0, 1, 2, 3, 4]
+    # The run's decision replaces the one the central bank made before
+    assert globals.central_bank_knobs.target_interest_rate.to_list()[-2:] == [0.03, 0.03]
+    _, wide = globals.to_wide_array()
+    assert wide.shape[0] == 5 and not np.isnan(wide).any()
+
+
+def test_simulate_two_way_ensemble_records_uncertainty(globals, mock_agents):
+    mock_agents["economy_agent_llm"].return_value = None
+    mock_agents["economy_agent_llm"].side_effect = [
+        ResultEconVarsTool(result_econ_vars=ResultEconVars(
+            gdp_growth_rate=gdp, unemployment_rate=0.05, inflation_rate=0.03))
+        for gdp in (0.01, 0.02, 0.06)
+    ]
+    report = simulate_two_way(globals, MODEL_NAME, num_samples=3)
+    assert report.quarters_simulated == 1
+    assert mock_agents["central_bank"].call_count == 3
+
+    gdp_growth_rate = globals.economic_variables.gdp_growth_rate
+    assert gdp_growth_rate[-1].to_val() == pytest.approx(0.02)
+    assert gdp_growth_rate.uncertainty()[-1] > 0
+    assert globals.central_bank_knobs.target_interest_rate.uncertainty()[-1] == 0
+
+    df = globals.to_pandas_df()
+    assert "gdp_growth_rate_uncertainty" in df.columns
+    assert df["gdp_growth_rate_uncertainty"].isna().sum() == 3
+
+
+def test_simulate_sweep(mock_agents):
+    runs = [initialize_globals() for _ in range(3)]
+    for run in runs:
+        run.number_of_quarters_to_simulate = 10
+    reports = simulate_sweep(
+        runs, MODEL_NAME, max_concurrent_runs=2,
+        stopping_criteria_factory=lambda: [ConvergenceCriterion(patience=1)])
+    assert [report.quarters_simulated for report in reports] == [1, 1, 1]
+
+
+def test_simulate_sweep_budgets_count_only_their_own_run(mock_agents):
+    expensive, cheap = initialize_globals(), initialize_globals()
+    cheap.number_of_quarters_to_simulate = 3
+    # Both runs reach EconomyAgent in their first quarter before either one
+    # checks its budget, so the expensive run has spent its tokens by then
+    first_quarter = threading.Barrier(2)
+
+    def charge(mock):
+        result = mock.return_value
+
+        def run_state(model, globals, **kwargs):
+            record_usage(LLMTokenUsage(prompt_tokens=1000 if globals is expensive else 10))
+            if mock is mock_agents["economy_agent_llm"] and len(globals.economic_variables.gdp_growth_rate) == 3:
+                first_quarter.wait(timeout=5)
+            return result
+        return run_state
+
+    for mock in mock_agents.values():
+        mock.side_effect = charge(mock)
+    reports = simulate_sweep(
+        [expensive, cheap], MODEL_NAME, max_concurrent_runs=2,
+        stopping_criteria_factory=lambda: [BudgetCriterion(max_tokens=500)])
+
+    assert reports[0].stop_reason.startswith("budget exhausted: 4000 tokens")
+    assert reports[1].stop_reason is None and reports[1].quarters_simulated == 3
+
+
+def test_simulate_two_way_with_model_router_fails_over(globals, mock_agents):
+    central_bank_result = mock_agents["central_bank"].return_value
+
+    def central_bank_run_state(model, globals, **kwargs):
+        if model == "groq/llama-3.1-70b-versatile":
+            raise ConnectionError("rate limited")
+        return central_bank_result
+
+    mock_agents["central_bank"].side_effect = central_bank_run_state
+    router = ModelRouter(["groq/llama-3.1-70b-versatile", MODEL_NAME])
+    report = simulate_two_way(globals, router)
+    assert report.quarters_simulated == 1
+    models = [call.args[0] for call in mock_agents["central_bank"].call_args_list]
+    assert models == ["groq/llama-3.1-70b-versatile", MODEL_NAME]
+    assert router.summary()["groq/llama-3.1-70b-versatile"]["error_rate"] > 0
+
+
+def test_simulate_two_way_profiles_phases(globals, mock_agents, tmp_path):
+    globals.number_of_quarters_to_simulate = 2
+    with profiling() as profiler:
+        simulate_two_way(globals, MODEL_NAME, outfile=tmp_path / "out.csv", speculate=True)
+    totals = profiler.phase_totals()
+    assert {"quarter", "state_append", "csv_export"} <= set(totals)
+    quarters = [e["args"]["quarter"] for e in profiler.events if e["name"] == "quarter" and e["ph"] == "B"]
+    assert quarters == [1, 2]
+
+
+def test_simulate_two_way_replays_recorded_decisions(mock_agents, tmp_path):
+    recorded_globals = initialize_globals()
+    recorded_globals.number_of_quarters_to_simulate = 2
+    with recording_decisions() as decision_log:
+        simulate_two_way(recorded_globals, MODEL_NAME)
+    decision_log.save(tmp_path / "decisions.json")
+    assert decision_log.agents() == set(mock_agents)
+
+    # Replay the central bank only; the other agents run live
+    for mock in mock_agents.values():
+        mock.reset_mock()
+    mock_agents["small_bank"].return_value = ResultSmallBankKnobsTool(
+        result_small_bank_knobs=ResultSmallBankKnobs(loans_interest_rate=0.08, consumer_loan_focus=0.7))
+    replayed_globals = initialize_globals()
+    replayed_globals.number_of_quarters_to_simulate = 2
+    with replaying_decisions(DecisionLog.load(tmp_path / "decisions.json"), agents=["central_bank"]):
+        simulate_two_way(replayed_globals, MODEL_NAME)
+
+    assert mock_agents["central_bank"].call_count == 0
+    assert mock_agents["small_bank"].call_count == 2
+    assert replayed_globals.central_bank_knobs.target_interest_rate[-1].to_val() == 0.03
+    assert replayed_globals.small_bank_knobs.loans_interest_rate[-1].to_val() == 0.08
+
+
+def test_simulate_sweep_records_every_run_separately(mock_agents):
+    runs = [initialize_globals() for _ in range(2)]
+    for globals in runs:
+        globals.number_of_quarters_to_simulate = 2
+    with recording_decisions() as decision_log:
+        simulate_sweep(runs, MODEL_NAME, max_concurrent_runs=2)
+
+    assert decision_log.runs() == {"run-0", "run-1"}
+    assert len(decision_log.decisions) == 2 * 2 * len(mock_agents)
+
+
 @pytest.mark.integration
 def test_three_banks_simulation(globals):
     model = MODEL_NAME
@@ -0,0 +1,72 @@
+import langroid as lr
+import pytest
+from langroid.language_models.mock_lm import MockLMConfig
+
+from agentomics.agents.central_bank import CentralBank
+from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
+from agentomics.tools.econ_vars_tool import ResultEconVarsTool
+from agentomics.tools.repair import (
+    FIELD_BOUNDS,
+    REPAIR_TRACKER,
+    normalize_values,
+    repair_tool_message,
+)
+
+VALID_ANSWER = (
+    'DONE TOOL: {"request": "result_central_bank_knobs_tool", "result_central_bank_knobs": '
+    '{"target_interest_rate": 0.02, "securities_holdings_pc_change": -0.1}}'
+)
+
+
+def _run_central_bank(responses):
+    responses = iter(responses)
+    config = lr.ChatAgentConfig(llm=MockLMConfig(response_fn=lambda _: next(responses)))
+    task = lr.Task(CentralBank(config), "CentralBank", single_round=False, interactive=False)
+    return task[ResultCentralBankKnobsTool].run("Set your knobs", turns=8)
+
+
+def test_field_bounds_follow_series_types():
+    assert FIELD_BOUNDS["gdp_growth_rate"] == (-1.0, 1.0)
+    assert FIELD_BOUNDS["unemployment_rate"] == (0.0, 1.0)
+    assert FIELD_BOUNDS["securities_holdings_pc_change"] == (-1.0, 1.0)
+
+
+def test_normalize_values_converts_percentages_and_clamps():
+    values = normalize_values({"gdp_growth_rate": -5.4, "unemployment_rate": 1.5, "inflation_rate": 0.02})
+    assert values["gdp_growth_rate"] == pytest.approx(-0.054)
+    assert values["unemployment_rate"] == pytest.approx(0.015)
+    assert values["inflation_rate"] == 0.02
+    assert normalize_values({"unemployment_rate": -0.01})["unemployment_rate"] == 0.0
+    assert normalize_values({"unemployment_rate": 250.0})["unemployment_rate"] == 1.0
+
+
+def test_repair_bare_result_fields_without_heading():
+    text = 'Here you go: {"gdp_growth_rate": "2.7%", "unemployment_rate": 14, "inflation_rate": 0.025}'
+    tool = repair_tool_message(text, ResultEconVarsTool)
+    assert tool.result_econ_vars.gdp_growth_rate == pytest.approx(0.027)
+    assert tool.result_econ_vars.unemployment_rate == pytest.approx(0.14)
+    assert tool.result_econ_vars.inflation_rate == 0.025
+
+
+def test_repair_returns_none_without_answer():
+    assert repair_tool_message("I think rates should go up", ResultEconVarsTool) is None
+    assert repair_tool_message('{"gdp_growth_rate": 0.01}', ResultEconVarsTool) is None
+
+
+def test_agent_repairs_answer_without_full_retry():
+    REPAIR_TRACKER.reset()
+    result = _run_central_bank([
+        'DONE {"target_interest_rate": 2.5, "securities_holdings_pc_change": "-10%"}'
+    ])
+    assert result.result_central_bank_knobs.target_interest_rate == pytest.approx(0.025)
+    assert result.result_central_bank_knobs.securities_holdings_pc_change == pytest.approx(-0.1)
+    assert REPAIR_TRACKER.stats.local_repairs == 1
+    assert REPAIR_TRACKER.retries_avoided() == 1
+
+
+def test_agent_asks_follow_up_in_same_conversation():
+    REPAIR_TRACKER.reset()
+    result = _run_central_bank(["I would lower rates a little.", VALID_ANSWER])
+    assert result.result_central_bank_knobs.target_interest_rate == 0.02
+    assert REPAIR_TRACKER.stats.follow_ups == 1
+    assert REPAIR_TRACKER.retries_avoided() == 1
@@ -0,0 +1,57 @@
+import json
+
+from agentomics.agents.central_bank import (
+    FREE_TEXT_INSTRUCTIONS,
+    make_central_bank_task,
+)
+from agentomics.tools.central_bank_knobs import ResultCentralBankKnobsTool
+from agentomics.tools.econ_vars_tool import ResultEconVarsTool
+from agentomics.tools.structured_output import (
+    JSON_MODE,
+    structured_llm_params,
+    structured_output_instructions,
+    supports_function_calling,
+)
+
+
+def test_supports_function_calling():
+    assert supports_function_calling("gpt-4o-mini")
+    assert supports_function_calling(None)
+    assert not supports_function_calling("groq/llama-3.1-70b-versatile")
+    assert not supports_function_calling("ollama/llama3.1")
+
+
+def test_structured_llm_params():
+    assert structured_llm_params("gpt-4o-mini") is None
+    assert structured_llm_params("groq/llama-3.1-70b-versatile").response_format == JSON_MODE
+
+
+def test_instructions_contain_schema_generated_from_model():
+    instructions = structured_output_instructions(ResultEconVarsTool)
+    schema = json.loads(instructions.split("\n")[-1])
+    assert schema["properties"]["request"]["default"] == "result_econ_vars_tool"
+    fields = schema["definitions"]["ResultEconVars"]["properties"]
+    assert set(fields) == {"gdp_growth_rate", "unemployment_rate", "inflation_rate"}
+
+
+def test_function_calling_model_is_forced_to_use_the_tool():
+    task = make_central_bank_task("gpt-4o-mini", structured_output=True)
+    assert task.agent.llm_function_force == {"name": ResultCentralBankKnobsTool.default_value("request")}
+
+
+def test_other_models_use_json_mode():
+    task = make_central_bank_task("groq/llama-3.1-70b-versatile", structured_output=True)
+    assert task.agent.llm.config.params.response_format == JSON_MODE
+    assert task.agent.llm_function_force is None
+
+    task = make_central_bank_task("groq/llama-3.1-70b-versatile")
+    assert task.agent.llm.config.params is None
+
+
+def test_structured_system_message_drops_the_free_text_protocol():
+    structured = make_central_bank_task("groq/llama-3.1-70b-versatile", structured_output=True)
+    assert "DONE" not in structured.agent.config.system_message
+    assert "TOOL:" not in structured.agent.config.system_message
+
+    free_text = make_central_bank_task("groq/llama-3.1-70b-versatile")
+    assert free_text.agent.config.system_message.endswith(FREE_TEXT_INSTRUCTIONS)
@@ -316,3 +316,47 @@ def test_non_contiguous_blocks():
         expected.reset_index(drop=True),
         check_dtype=False
     )
+
+
+def test_mixed_frequencies():
+    # Test Case: Mixed Frequencies
+    # Purpose:
+    # Verify that weekly and monthly series are resampled to quarters with
+    # their own aggregation rules before the longest common range is found.
+
+    # Weekly series over the first three quarters of 2020 (Wednesdays)
+    weekly_dates = pd.date_range(start="2020-01-01", end="2020-09-30", freq="W-WED")
+    weekly = pd.DataFrame({"date": weekly_dates, "WSHOSHO": range(len(weekly_dates))})
+
+    # Monthly series from February to December 2020, missing in May
+    # Input monthly:
+    # | date       | UNRATE |
+    # |------------|--------|
+    # | 2020-02-01 | 2      |
+    # | ...        | ...    |
+    # | 2020-05-01 | None   |
+    # | ...        | ...    |
+    # | 2020-12-01 | 12     |
+    monthly_dates = pd.date_range(start="2020-02-01", end="2020-12-01", freq="MS")
+    monthly = pd.DataFrame({"date": monthly_dates, "UNRATE": [float(m.month) for m in monthly_dates]})
+    monthly.loc[monthly["date"] == "2020-05-01", "UNRATE"] = None
+
+    # Call the function with a quarterly target frequency
+    result = get_longest_common_date_range(
+        [weekly, monthly], frequency="Q", aggregations={"UNRATE": "mean"})
+
+    # Expected Output: Q1-Q3 2020, where both series have data. UNRATE is
+    # the mean of the months present, WSHOSHO the last week of the quarter
+    # | date       | WSHOSHO | UNRATE |
+    # |------------|---------|--------|
+    # | 2020-01-01 | 12      | 2.5    |
+    # | 2020-04-01 | 25      | 5.0    |
+    # | 2020-07-01 | 39      | 8.0    |
+    last_week = weekly.groupby(weekly["date"].dt.quarter)["WSHOSHO"].last().tolist()
+    expected = pd.DataFrame({
+        "date": pd.to_datetime(["2020-01-01", "2020-04-01", "2020-07-01"]),
+        "WSHOSHO": last_week,
+        "UNRATE": [2.5, 5.0, 8.0]
+    })
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
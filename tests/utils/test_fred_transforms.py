@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agentomics.utils.fred_transforms import (
+    Diff,
+    FredCache,
+    Lag,
+    PctChange,
+    Scale,
+    SeriesSpec,
+    Stencil,
+    _fuse,
+)
+
+
+@pytest.fixture
+def weekly():
+    dates = pd.date_range("2020-01-01", periods=30, freq="W-WED")
+    return pd.DataFrame({"date": dates, "WSHOSHO": np.linspace(100.0, 129.0, 30)})
+
+
+def test_steps_match_pandas(weekly):
+    df = SeriesSpec("WSHOSHO", "change").scale(0.5).pct_change().lag().transform(weekly)
+    expected = (weekly["WSHOSHO"] * 0.5).pct_change().shift(1)
+    np.testing.assert_allclose(df["change"], expected)
+    assert list(df.columns) == ["date", "change"]
+
+    diffed = SeriesSpec("WSHOSHO", "diff").diff(2).transform(weekly)
+    np.testing.assert_allclose(diffed["diff"], weekly["WSHOSHO"].diff(2))
+
+
+@pytest.mark.parametrize("how", ["last", "first", "mean", "sum"])
+def test_resample_weekly_to_quarterly(weekly, how):
+    df = SeriesSpec("WSHOSHO", "holdings").resample("Q", how).transform(weekly)
+    expected = getattr(weekly.set_index("date")["WSHOSHO"].resample("QS"), how)()
+    assert list(df["date"]) == list(expected.index)
+    np.testing.assert_allclose(df["holdings"], expected.to_numpy())
+
+
+def test_consecutive_scalings_are_fused():
+    assert _fuse((Scale(0.1), Scale(0.1))) == [Stencil(((0, pytest.approx(0.01)),), 0, 0)]
+
+
+@pytest.mark.parametrize("steps", [
+    (Scale(0.5), Diff(2), Lag(1)),
+    (Lag(1), Lag(-1), Diff()),
+    (Diff(), Diff(), Scale(2.0), Lag(-2)),
+])
+def test_linear_steps_fuse_into_one_stencil(weekly, steps):
+    dates = weekly["date"].to_numpy()
+    values = weekly["WSHOSHO"].to_numpy() ** 1.5
+    expected = values
+    for step in steps:
+        _, expected = step.apply(dates, expected)
+    fused = _fuse(steps)
+    assert len(fused) == 1
+    _, actual = fused[0].apply(dates, values)
+    np.testing.assert_allclose(actual, expected)
+
+
+def test_percent_changes_end_a_fused_run():
+    fused = _fuse((Scale(0.5), Lag(1), PctChange(), Scale(2.0)))
+    assert [type(step) for step in fused] == [Stencil, PctChange, Stencil]
+
+
+def test_cache_fetches_and_transforms_once(weekly, tmp_path):
+    calls = []
+
+    def fetch(series_id, frequency, observation_start, observation_end, column_name):
+        calls.append(series_id)
+        return weekly.rename(columns={"WSHOSHO": column_name})
+
+    spec = SeriesSpec("WSHOSHO", "Quarterly Securities Held Percent Change", frequency="w").resample().pct_change()
+    first = FredCache(tmp_path, fetch).load(spec, "2020-01-01", "2020-08-01")
+    # Another spec of the same series reuses the raw download
+    FredCache(tmp_path, fetch).load(spec.scale(100.0), "2020-01-01", "2020-08-01")
+    again = FredCache(tmp_path, fetch).load(spec, "2020-01-01", "2020-08-01")
+    assert calls == ["WSHOSHO"]
+    pd.testing.assert_frame_equal(first, again)
+    assert len(first) == 3 and np.isnan(first.iloc[0, 1])
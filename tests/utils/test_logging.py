@@ -0,0 +1,116 @@
+import contextvars
+import gzip
+import json
+import logging
+import threading
+from types import SimpleNamespace
+
+import langroid as lr
+import pytest
+
+from agentomics.utils.logging import (
+    LANGROID_LOGS_DIR,
+    GzipRotatingFileHandler,
+    configure_logging,
+    find_run_logs,
+    langroid_logs_dir,
+    log_context,
+    stop_async_logging,
+    use_run_logs_dir,
+)
+
+
+@pytest.fixture
+def root_logger():
+    # Restore the root logger configured by pytest after each test
+    logger = logging.getLogger()
+    handlers, level = list(logger.handlers), logger.level
+    yield logger
+    stop_async_logging()
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+
+
+def _read_json_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_async_json_logging_with_context(root_logger, tmp_path):
+    log_file = tmp_path / "app.log"
+    listener = configure_logging(log_to_console=False, log_file=log_file, json_format=True, async_logging=True)
+    assert listener is not None
+
+    with log_context(run_id="run-1", quarter=2):
+        logging.getLogger("agentomics.test").info("rate set to %s", 0.03)
+        with log_context(agent="central_bank"):
+            context = contextvars.copy_context()
+            worker = threading.Thread(target=context.run, args=(logging.warning, "from %s", "worker"))
+            worker.start()
+            worker.join()
+    logging.info("outside")
+    stop_async_logging()
+
+    entries = _read_json_lines(log_file)
+    assert entries[1]["message"] == "rate set to 0.03"
+    assert (entries[1]["run_id"], entries[1]["quarter"]) == ("run-1", 2)
+    assert "agent" not in entries[1]
+    assert entries[2]["agent"] == "central_bank"
+    assert entries[2]["message"] == "from worker"
+    assert "run_id" not in entries[3]
+
+
+def test_defaults_to_info_without_forced_rollover(root_logger, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("previous run\n")
+    assert configure_logging(log_to_console=False, log_file=log_file) is None
+    logging.debug("hidden")
+    logging.info("shown")
+
+    lines = log_file.read_text().splitlines()
+    assert lines[0] == "previous run"
+    assert lines[-1].endswith("INFO - shown")
+    assert not (tmp_path / "app.log.1").exists()
+
+
+def test_logs_are_sharded_by_run_and_indexed(root_logger, tmp_path):
+    configure_logging(log_to_console=False, log_file=tmp_path / "agentomics.log", shard_by_run=True)
+    assert langroid_logs_dir() == LANGROID_LOGS_DIR
+    for run_id in ("run-a", "run-b"):
+        with log_context(run_id=run_id):
+            logging.info("quarter of %s", run_id)
+            assert langroid_logs_dir() == find_run_logs(run_id, tmp_path)
+    logging.info("not in a run")
+    configure_logging(log_to_console=False, log_to_file=False)
+
+    assert find_run_logs("missing", tmp_path) is None
+    for run_id in ("run-a", "run-b"):
+        lines = (tmp_path / "runs" / run_id / "agentomics.log").read_text().splitlines()
+        assert [line.rsplit(" - ", 1)[-1] for line in lines] == [f"quarter of {run_id}"]
+    assert (tmp_path / "agentomics.log").read_text().splitlines()[-1].endswith("not in a run")
+
+
+def test_tasks_log_to_the_run_directory(root_logger, tmp_path):
+    configure_logging(log_to_console=False, log_file=tmp_path / "agentomics.log", shard_by_run=True)
+    default_config = lr.TaskConfig()
+    task = SimpleNamespace(config=default_config)
+    with log_context(run_id="run-a"):
+        assert use_run_logs_dir(task) is task
+    configure_logging(log_to_console=False, log_to_file=False)
+
+    assert task.config.logs_dir == find_run_logs("run-a", tmp_path)
+    assert default_config.logs_dir == LANGROID_LOGS_DIR
+
+
+def test_rotated_files_are_gzipped(tmp_path):
+    handler = GzipRotatingFileHandler(tmp_path / "app.log", maxBytes=100, backupCount=2)
+    logger = logging.getLogger("agentomics.test.rotation")
+    logger.propagate = False
+    logger.addHandler(handler)
+    for i in range(10):
+        logger.warning("message %d %s", i, "x" * 40)
+    logger.removeHandler(handler)
+    handler.close()
+
+    rotated = sorted(path.name for path in tmp_path.iterdir())
+    assert rotated == ["app.log", "app.log.1.gz", "app.log.2.gz"]
+    assert gzip.decompress((tmp_path / "app.log.1.gz").read_bytes()).startswith(b"message")